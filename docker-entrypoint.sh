@@ -39,11 +39,25 @@ python manage.py migrate
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
-# Оптимизация изображений (non-blocking)
-if command -v python >/dev/null 2>&1; then
-  echo "Optimizing images..."
-  python /app/optimize_images.py || echo "Image optimization skipped"
-fi
+# Оптимизация изображений (background: only new/changed files, see the manifest)
+echo "Optimizing images in background..."
+(nice -n 10 python /app/optimize_images.py --workers 2 || echo "Image optimization skipped") &
+
+# Размеры и превью изображений (background, only new/changed images)
+echo "Describing images in background..."
+(python manage.py describe_images || echo "Image description skipped") &
+
+# Рекомендации для страниц товаров (background)
+echo "Building recommendations in background..."
+(python manage.py build_recommendations || echo "Recommendations skipped") &
+
+# Покупают вместе: новые заказы раз в час (background, refreshes the recommendations of the products involved)
+echo "Starting co-purchase miner..."
+python manage.py mine_copurchases --every 3600 &
+
+# Снятие просроченных резервов (background, every 5 minutes)
+echo "Starting stock hold releaser..."
+python manage.py release_expired_holds --every 300 &
 
 # Запуск
 echo "Starting Gunicorn..."
@@ -1,47 +1,187 @@
+"""
+Recompresses the site's static JPEG/PNG images and writes WebP/AVIF siblings.
+
+Files are processed in a process pool. A manifest records the SHA-256 of
+every file as it was left, so later runs only touch new or changed files;
+the entrypoint runs it in the background, so startup does not wait for it.
+
+    python optimize_images.py [--workers N] [--manifest PATH] [--no-report]
+"""
+import argparse
+import hashlib
+import json
 import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
 from pathlib import Path
 from PIL import Image
 
+BASE = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE / 'src'))
+
+# Django-free encoding helpers shared with the media derivative pipeline
+from catalog.imaging import format_report, modern_formats, savings_report, sibling_name
+from catalog.imaging import siblings as encode_siblings
+
 ROOTS = [
-    Path(__file__).resolve().parent / 'src' / 'static' / 'images',
-    Path(__file__).resolve().parent / 'src' / 'staticfiles' / 'images'
+    BASE / 'src' / 'static' / 'images',
+    BASE / 'src' / 'staticfiles' / 'images'
 ]
+# Only the collected copy is served by nginx, so WebP/AVIF siblings go there
+SIBLING_ROOTS = [BASE / 'src' / 'staticfiles' / 'images']
+MEDIA_ROOT = BASE / 'src' / 'media'
+# Under src/, the bind mount that outlives the container; the static and media
+# volumes would persist it too, but nginx serves everything on them
+MANIFEST = Path(os.getenv('IMAGE_MANIFEST', BASE / 'src' / '.image-manifest.json'))
+EXTENSIONS = {'.jpg', '.jpeg', '.png'}
 MAX_W = 2000
 MIN_BYTES = 120 * 1024  # skip tiny files
+# A re-encode has to save at least this much, so optimized files are not recompressed again
+MIN_GAIN = 0.05
 
-skipped = 0
-optimized = 0
 
-for root in ROOTS:
-    if not root.exists():
-        continue
-    for path in root.rglob('*'):
-        if path.suffix.lower() not in {'.jpg', '.jpeg', '.png'}:
-            continue
-        if path.stat().st_size < MIN_BYTES:
-            skipped += 1
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_atomic(path, data):
+    """Replaces path in one step, so nginx never serves a half-written file."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def recompress(path, im):
+    """Encoded bytes of a smaller version of the image, or None to keep the file."""
+    # Resize if wider than MAX_W
+    if im.width > MAX_W:
+        im = im.resize((MAX_W, int(im.height * MAX_W / im.width)), Image.LANCZOS)
+    buffer = BytesIO()
+    # Convert PNG with no alpha to palette
+    if path.suffix.lower() == '.png':
+        has_alpha = im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info)
+        if has_alpha:
+            im = im.convert('RGBA')
+            bg = Image.new('RGBA', im.size, (255, 255, 255, 255))
+            bg.paste(im, mask=im.split()[-1])
+            im = bg.convert('RGB')
+        im = im.convert('P', palette=Image.ADAPTIVE, colors=256)
+        im.save(buffer, format='PNG', optimize=True)
+    else:
+        im = im.convert('RGB')
+        im.save(buffer, format='JPEG', quality=82, progressive=True, optimize=True)
+    data = buffer.getvalue()
+    if len(data) > path.stat().st_size * (1 - MIN_GAIN):
+        return None
+    return data
+
+
+def process(path, with_siblings):
+    """Runs in a worker process. Returns (path, sha256 after, optimized, siblings written)."""
+    optimized = False
+    siblings = 0
+    with Image.open(path) as im:
+        im.load()
+    if path.stat().st_size >= MIN_BYTES:
+        data = recompress(path, im)
+        if data is not None:
+            write_atomic(path, data)
+            optimized = True
+            with Image.open(path) as im:
+                im.load()
+    if with_siblings:
+        for fmt, data in encode_siblings(im, path.stat().st_size).items():
+            write_atomic(path.with_name(sibling_name(path.name, fmt)), data)
+            siblings += 1
+    return str(path), file_hash(path), optimized, siblings
+
+
+def load_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(path, json.dumps(manifest, indent=0, sort_keys=True).encode('utf-8'))
+
+
+def pending(manifest):
+    """(path, with_siblings) of files that changed since the manifest was written."""
+    formats = modern_formats()
+    todo = []
+    for root in ROOTS:
+        if not root.exists():
             continue
-        try:
-            im = Image.open(path)
-            # Resize if wider than MAX_W
-            if im.width > MAX_W:
-                im = im.resize((MAX_W, int(im.height * MAX_W / im.width)), Image.LANCZOS)
-            # Convert PNG with no alpha to palette
-            if path.suffix.lower() == '.png':
-                has_alpha = im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info)
-                if has_alpha:
-                    im = im.convert('RGBA')
-                    bg = Image.new('RGBA', im.size, (255, 255, 255, 255))
-                    bg.paste(im, mask=im.split()[-1])
-                    im = bg.convert('RGB')
-                im = im.convert('P', palette=Image.ADAPTIVE, colors=256)
-                im.save(path, format='PNG', optimize=True)
-            else:
-                im = im.convert('RGB')
-                im.save(path, format='JPEG', quality=82, progressive=True, optimize=True)
-            optimized += 1
-            print(f"optimized {path} -> {path.stat().st_size/1024:.1f} KB")
-        except Exception as e:
-            print(f"skip {path}: {e}")
-
-print(f"Done. optimized={optimized}, skipped_small={skipped}")
+        for path in root.rglob('*'):
+            if path.suffix.lower() not in EXTENSIONS or path.name.startswith('.tmp-'):
+                continue
+            entry = manifest.get(str(path))
+            stat = path.stat()
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                continue
+            if entry and entry['sha256'] == file_hash(path) and entry['formats'] == formats:
+                entry['mtime'] = stat.st_mtime  # touched (e.g. by collectstatic) but identical
+                continue
+            todo.append((path, root in SIBLING_ROOTS))
+    return todo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--manifest', type=Path, default=MANIFEST, help='Hashes of already processed files')
+    parser.add_argument('--no-report', action='store_true', help='Skip the bytes-saved report')
+    args = parser.parse_args(argv)
+
+    manifest = load_manifest(args.manifest)
+    todo = pending(manifest)
+    formats = modern_formats()
+    optimized = siblings = failed = 0
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=max(args.workers, 1)) as pool:
+            futures = [(path, pool.submit(process, path, with_siblings)) for path, with_siblings in todo]
+            for path, future in futures:
+                try:
+                    name, sha256, was_optimized, written = future.result()
+                except Exception as e:
+                    # Remembered too, so a broken file is not retried until it changes
+                    print(f"skip {path}: {e}")
+                    name, sha256, was_optimized, written = str(path), file_hash(path), False, 0
+                    failed += 1
+                stat = path.stat()
+                manifest[name] = {'sha256': sha256, 'size': stat.st_size, 'mtime': stat.st_mtime, 'formats': formats}
+                optimized += was_optimized
+                siblings += written
+                if was_optimized:
+                    print(f"optimized {path} -> {stat.st_size/1024:.1f} KB")
+
+    # Forget files that no longer exist
+    manifest = {name: entry for name, entry in manifest.items() if os.path.exists(name)}
+    save_manifest(args.manifest, manifest)
+
+    print(
+        f"Done. processed={len(todo)}, optimized={optimized}, siblings={siblings}, failed={failed}, "
+        f"unchanged={len(manifest) - len(todo)} ({', '.join(formats) or 'no WebP/AVIF support'})"
+    )
+
+    if not args.no_report:
+        # Bytes a browser accepting WebP/AVIF saves, per directory
+        for root in SIBLING_ROOTS + [MEDIA_ROOT]:
+            if root.exists():
+                print(format_report(savings_report(root), f"Savings in {os.path.relpath(root, BASE)}:"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Cart mutations.
+
+Every change is a single conditional UPDATE (or an INSERT guarded by the
+CartItem unique key), so double clicks and parallel tabs can neither lose
+increments nor push a line past the available stock.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from catalog.stock import available_quantity, available_quantity_expression
+from .models import Cart, CartItem
+
+
+def get_cart(request):
+    """Returns the cart of the current user or session, creating it if needed."""
+    if request.user.is_authenticated:
+        cart, _ = Cart.objects.get_or_create(user=request.user)
+    else:
+        session_key = request.session.session_key
+        if not session_key:
+            request.session.save()
+            session_key = request.session.session_key
+        # Unique per session (see Cart.Meta), so concurrent first requests share one cart
+        cart, _ = Cart.objects.get_or_create(session_key=session_key, user=None)
+    return cart
+
+
+def add_item(cart, product, size=''):
+    """
+    Adds one unit of product/size, capped at the available stock.
+    Returns True when the quantity changed.
+    """
+    size = size or ''
+    lines = CartItem.objects.filter(cart=cart, product=product, size=size)
+
+    def increment():
+        return lines.filter(quantity__lt=available_quantity_expression()).update(
+            quantity=F('quantity') + 1, price=product.price,
+        )
+
+    if increment():
+        return True
+    if available_quantity(product, size) <= 0:
+        return False
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(cart=cart, product=product, size=size, quantity=1, price=product.price)
+        return True
+    except IntegrityError:
+        # The line exists: already at the limit, or created by a concurrent request
+        return bool(increment())
+
+
+def increment_item(cart, pk):
+    """Adds one unit to a cart line unless it is at the stock limit."""
+    return CartItem.objects.filter(pk=pk, cart=cart, quantity__lt=available_quantity_expression()).update(
+        quantity=F('quantity') + 1,
+    )
+
+
+def decrement_item(cart, pk):
+    """Takes one unit off a cart line, dropping the line when it reaches zero."""
+    if CartItem.objects.filter(pk=pk, cart=cart, quantity__gt=1).update(quantity=F('quantity') - 1):
+        return 1
+    deleted, _ = CartItem.objects.filter(pk=pk, cart=cart).delete()
+    return deleted
+
+
+def merge_carts(source, target):
+    """Moves the lines of `source` into `target` (e.g. the session cart on login) and deletes it."""
+    with transaction.atomic():
+        for item in source.items.all():
+            merged = CartItem.objects.filter(cart=target, product_id=item.product_id, size=item.size or '').update(
+                quantity=F('quantity') + item.quantity,
+            )
+            if not merged:
+                CartItem.objects.filter(pk=item.pk).update(cart=target, size=item.size or '')
+        source.delete()
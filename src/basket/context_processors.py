@@ -1,6 +1,11 @@
-from .models import Cart
+from .models import CART_QUANTITY_SESSION_KEY, Cart, remember_cart_quantity
 
 def cart_processor(request):
+    quantity = request.session.get(CART_QUANTITY_SESSION_KEY)
+    if quantity is not None:
+        return {'cart_total_quantity': quantity}
+
+    # Sessions that predate the stored count: look the cart up once and remember it
     if request.user.is_authenticated:
         cart = Cart.objects.filter(user=request.user).first()
     else:
@@ -8,7 +13,5 @@ def cart_processor(request):
         if not session_key:
             return {'cart_total_quantity': 0}
         cart = Cart.objects.filter(session_key=session_key).first()
-    
-    if cart:
-        return {'cart_total_quantity': cart.total_quantity}
-    return {'cart_total_quantity': 0}
+
+    return {'cart_total_quantity': remember_cart_quantity(request, cart)}
@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-17 20:46
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """Folds duplicate carts of one owner into the oldest one before the unique constraints apply."""
+    Cart = apps.get_model('basket', 'Cart')
+    CartItem = apps.get_model('basket', 'CartItem')
+
+    def move(item, cart_id):
+        size = item.size or ''
+        merged = CartItem.objects.filter(cart_id=cart_id, product_id=item.product_id, size=size).exclude(pk=item.pk).update(
+            quantity=F('quantity') + item.quantity,
+        )
+        if merged:
+            CartItem.objects.filter(pk=item.pk).delete()
+        else:
+            CartItem.objects.filter(pk=item.pk).update(cart_id=cart_id, size=size)
+
+    # Lines with a NULL size escape the (cart, product, size) unique key: store them as ''
+    for item in CartItem.objects.filter(size__isnull=True):
+        move(item, item.cart_id)
+
+    groups = [
+        ('user_id', Cart.objects.filter(user__isnull=False)),
+        ('session_key', Cart.objects.filter(user__isnull=True).exclude(session_key='')),
+    ]
+    for field, carts in groups:
+        owners = carts.values(field).annotate(n=Count('id')).filter(n__gt=1).values_list(field, flat=True)
+        for owner in list(owners):
+            keep, *duplicates = carts.filter(**{field: owner}).order_by('id')
+            for cart in duplicates:
+                for item in CartItem.objects.filter(cart=cart):
+                    move(item, keep.pk)
+                cart.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('basket', '0002_alter_cartitem_unique_together_cartitem_size_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('user',), name='basket_cart_unique_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True), models.Q(('session_key', ''), _negated=True)), fields=('session_key',), name='basket_cart_unique_session'),
+        ),
+    ]
@@ -2,6 +2,10 @@ import uuid
 
 from django.conf import settings
 from django.db import models
+from django.db.models import Sum
+
+# Session key holding the header badge count (see basket.context_processors)
+CART_QUANTITY_SESSION_KEY = 'cart_total_quantity'
 
 
 class Cart(models.Model):
@@ -13,6 +17,15 @@ class Cart(models.Model):
   class Meta:
     verbose_name = 'Корзина'
     verbose_name_plural = 'Корзины'
+    # One cart per user / per anonymous session, so concurrent get_or_create calls cannot fork it
+    constraints = [
+      models.UniqueConstraint(fields=['user'], condition=models.Q(user__isnull=False), name='basket_cart_unique_user'),
+      models.UniqueConstraint(
+        fields=['session_key'],
+        condition=models.Q(user__isnull=True) & ~models.Q(session_key=''),
+        name='basket_cart_unique_session',
+      ),
+    ]
 
   def __str__(self):
     owner = self.user.email if self.user else self.session_key or 'anonymous'
@@ -20,7 +33,18 @@ class Cart(models.Model):
 
   @property
   def total_quantity(self):
-      return sum(item.quantity for item in self.items.all())
+      return self.items.aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def remember_cart_quantity(request, cart=None, quantity=None):
+  """
+  Stores the cart item count in the session so the header badge costs no queries.
+  Call after every cart mutation; pass `quantity` when it is already known.
+  """
+  if quantity is None:
+    quantity = cart.total_quantity if cart else 0
+  request.session[CART_QUANTITY_SESSION_KEY] = quantity
+  return quantity
 
 
 class CartItem(models.Model):
@@ -1,3 +1,132 @@
-from django.test import TestCase
+import threading
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import Product
+from marais.testing import PLAIN_STATIC
+from .cart import add_item, decrement_item, increment_item, merge_carts
+from .models import CART_QUANTITY_SESSION_KEY, Cart, CartItem
+
+
+@PLAIN_STATIC
+class CartBadgeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(title='Ring', slug='ring', price=1000, stock=5)
+
+    def cart_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [q['sql'] for q in ctx.captured_queries if 'basket_cart' in q['sql']]
+
+    def test_badge_does_not_query_the_cart(self):
+        self.client.post(reverse('basket:add', args=[self.product.slug]))
+        self.client.post(reverse('basket:add', args=[self.product.slug]))
+        self.assertEqual(self.client.session[CART_QUANTITY_SESSION_KEY], 2)
+
+        response, queries = self.cart_queries(reverse('privacy_policy'))
+        self.assertEqual(queries, [])
+        self.assertContains(response, '<span class="floating-cart__badge">2</span>', html=True)
+
+    def test_badge_follows_update_and_remove(self):
+        self.client.post(reverse('basket:add', args=[self.product.slug]))
+        item = Cart.objects.get().items.get()
+
+        self.client.post(reverse('basket:update', args=[item.pk]), {'action': 'increment'})
+        self.assertEqual(self.client.session[CART_QUANTITY_SESSION_KEY], 2)
+
+        self.client.post(reverse('basket:remove', args=[item.pk]))
+        self.assertEqual(self.client.session[CART_QUANTITY_SESSION_KEY], 0)
+
+    def test_sessions_without_stored_count_fall_back_once(self):
+        self.client.post(reverse('basket:add', args=[self.product.slug]))
+        session = self.client.session
+        del session[CART_QUANTITY_SESSION_KEY]
+        session.save()
+
+        _, queries = self.cart_queries(reverse('privacy_policy'))
+        self.assertTrue(queries)
+        _, queries = self.cart_queries(reverse('privacy_policy'))
+        self.assertEqual(queries, [])
+
+
+class CartMutationTests(TestCase):
+    def setUp(self):
+        self.cart = Cart.objects.create(session_key='s1')
+
+    def test_add_is_capped_by_stock(self):
+        product = Product.objects.create(title='Ring', slug='ring', price=1000, stock=2)
+        self.assertTrue(add_item(self.cart, product))
+        self.assertTrue(add_item(self.cart, product))
+        self.assertFalse(add_item(self.cart, product))
+        self.assertEqual(self.cart.items.get().quantity, 2)
+
+    def test_existing_line_is_incremented_with_one_query(self):
+        product = Product.objects.create(title='Ring', slug='ring', price=1000, size_stock={'17': 3})
+        add_item(self.cart, product, '17')
+        with self.assertNumQueries(1):
+            self.assertTrue(add_item(self.cart, product, '17'))
+        self.assertFalse(add_item(self.cart, product, '18'))
+
+        item = self.cart.items.get()
+        with self.assertNumQueries(1):
+            self.assertEqual(increment_item(self.cart, item.pk), 1)
+        self.assertEqual(increment_item(self.cart, item.pk), 0)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 3)
+
+    def test_decrement_drops_the_last_unit(self):
+        product = Product.objects.create(title='Ring', slug='ring', price=1000, stock=5)
+        add_item(self.cart, product)
+        add_item(self.cart, product)
+        item = self.cart.items.get()
+        decrement_item(self.cart, item.pk)
+        decrement_item(self.cart, item.pk)
+        self.assertFalse(self.cart.items.exists())
+
+    def test_merge_adds_up_matching_lines(self):
+        ring = Product.objects.create(title='Ring', slug='ring', price=1000, stock=5)
+        chain = Product.objects.create(title='Chain', slug='chain', price=500, stock=5)
+        target = Cart.objects.create(session_key='s2')
+        add_item(self.cart, ring)
+        add_item(self.cart, chain)
+        add_item(target, ring)
+        merge_carts(self.cart, target)
+        self.assertEqual(
+            dict(target.items.values_list('product__slug', 'quantity')),
+            {'ring': 2, 'chain': 1},
+        )
+        self.assertFalse(Cart.objects.filter(pk=self.cart.pk).exists())
+
+
+class CartConcurrencyTests(TransactionTestCase):
+    def hammer(self, target, threads=8):
+        errors = []
+
+        def run():
+            try:
+                target()
+            except Exception as exc:  # surfaced in the assertion below
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=run) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+
+    def test_parallel_adds_neither_lose_units_nor_oversell(self):
+        product = Product.objects.create(title='Ring', slug='ring', price=1000, stock=5)
+        cart = Cart.objects.create(session_key='s1')
+
+        self.hammer(lambda: add_item(cart, product), threads=8)
+
+        self.assertEqual(CartItem.objects.filter(cart=cart).count(), 1)
+        self.assertEqual(CartItem.objects.get(cart=cart).quantity, 5)
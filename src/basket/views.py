@@ -1,25 +1,18 @@
+from django.http import Http404
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from catalog.models import Product
-from .models import Cart, CartItem
-
-def _get_cart(request):
-    if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user)
-    else:
-        session_key = request.session.session_key
-        if not session_key:
-            request.session.save()
-            session_key = request.session.session_key
-        cart, created = Cart.objects.get_or_create(session_key=session_key, user=None)
-    return cart
+from .cart import add_item, decrement_item, get_cart, increment_item
+from .models import CartItem, remember_cart_quantity
 
 class CartDetailView(View):
     def get(self, request):
-        cart = _get_cart(request)
+        cart = get_cart(request)
         items = cart.items.select_related('product').all()
         total = sum(item.price * item.quantity for item in items)
+        # Items are loaded anyway: resync the header badge for free
+        remember_cart_quantity(request, quantity=sum(item.quantity for item in items))
         
         # 1. Personal Discount
         discount_percent = 0
@@ -66,66 +59,43 @@ class CartDetailView(View):
 class AddToCartView(View):
     def post(self, request, slug):
         product = get_object_or_404(Product, slug=slug)
-        cart = _get_cart(request)
+        cart = get_cart(request)
         size = (request.POST.get('size') or '').strip()
-        size_stock_map = product.size_stock_map
 
         # Enforce size selection when stock is tracked per size
-        if size_stock_map and not size:
+        if product.size_stock_map and not size:
             return redirect(request.META.get('HTTP_REFERER', 'catalog:home'))
 
-        available_qty = None
-        if size_stock_map:
-            available_qty = size_stock_map.get(size, 0)
-        else:
-            available_qty = product.stock
-
-        if available_qty is not None and available_qty <= 0:
-            return redirect(request.META.get('HTTP_REFERER', 'catalog:home'))
-
-        item, created = CartItem.objects.get_or_create(cart=cart, product=product, size=size)
-        desired_qty = item.quantity + 1 if not created else 1
-
-        if available_qty is not None and desired_qty > available_qty:
-            item.quantity = available_qty
-        else:
-            item.quantity = desired_qty
-
-        item.price = product.price # update price if changed
-        item.save()
+        if add_item(cart, product, size):
+            remember_cart_quantity(request, cart)
              
         return redirect(request.META.get('HTTP_REFERER', 'catalog:home'))
 
 class RemoveFromCartView(View):
     def post(self, request, pk):
-        cart = _get_cart(request)
-        item = get_object_or_404(CartItem, pk=pk, cart=cart)
-        item.delete()
+        cart = get_cart(request)
+        deleted, _ = CartItem.objects.filter(pk=pk, cart=cart).delete()
+        if not deleted:
+            raise Http404
+        remember_cart_quantity(request, cart)
         return redirect('basket:detail')
         
 class UpdateCartItemView(View):
     def post(self, request, pk):
-        cart = _get_cart(request)
-        item = get_object_or_404(CartItem, pk=pk, cart=cart)
+        cart = get_cart(request)
         action = request.POST.get('action')
-        
-        if action == 'increment':
-            size_stock_map = item.product.size_stock_map
-            limit = None
-            if size_stock_map:
-                limit = size_stock_map.get(item.size, 0)
-            else:
-                limit = item.product.stock
 
-            if limit is None or item.quantity < limit:
-                item.quantity += 1
-                item.save()
+        if action == 'increment':
+            changed = increment_item(cart, pk)
         elif action == 'decrement':
-            if item.quantity > 1:
-                item.quantity -= 1
-                item.save()
-            else:
-                item.delete()
+            changed = decrement_item(cart, pk)
+        else:
+            changed = 0
+
+        if changed:
+            remember_cart_quantity(request, cart)
+        elif not CartItem.objects.filter(pk=pk, cart=cart).exists():
+            raise Http404
         return redirect('basket:detail')
 
 class ApplyBonusesView(View):
@@ -1,7 +1,8 @@
 from django import forms
 from django.contrib import admin
 
-from .models import Category, Collection, Product, ProductImage, Brand, HomepageBlock, HomepageHeroImage, Review
+from .cache import bump
+from .models import Category, Collection, Product, ProductImage, Brand, HomepageBlock, HomepageHeroImage, Review, MirroredImage
 
 
 class ProductImageInline(admin.TabularInline):
@@ -118,6 +119,13 @@ class BrandAdmin(admin.ModelAdmin):
   search_fields = ('name', 'country', 'description')
 
 
+@admin.register(MirroredImage)
+class MirroredImageAdmin(admin.ModelAdmin):
+  list_display = ('url', 'file', 'size', 'fetched_at', 'error')
+  search_fields = ('url', 'sha256')
+  readonly_fields = ('url', 'file', 'sha256', 'etag', 'content_type', 'size', 'error', 'fetched_at')
+
+
 @admin.register(HomepageBlock)
 class HomepageBlockAdmin(admin.ModelAdmin):
     list_display = ('__str__', 'block_type', 'is_active', 'sort_order')
@@ -143,11 +151,13 @@ class ReviewAdmin(admin.ModelAdmin):
     
     def approve_reviews(self, request, queryset):
         updated = queryset.update(status='approved')
+        bump('homepage')
         self.message_user(request, f'{updated} отзывов одобрено.')
     approve_reviews.short_description = 'Одобрить выбранные отзывы'
     
     def reject_reviews(self, request, queryset):
         updated = queryset.update(status='rejected')
+        bump('homepage')
         self.message_user(request, f'{updated} отзывов отклонено.')
     reject_reviews.short_description = 'Отклонить выбранные отзывы'
 
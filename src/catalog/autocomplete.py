@@ -0,0 +1,132 @@
+"""
+In-process autocomplete for the header search box.
+
+Each worker keeps a sorted array of the words (and their transliterations,
+see catalog.search) in active product titles, articles and brand names,
+next to the ready-made JSON of every suggestion. A keystroke is a couple
+of binary searches, with no database query. The empty query gets a random
+pick from a sample drawn at build time.
+
+The index is built on first use and rebuilt when the 'catalog' cache
+version changes (see catalog.cache), so every worker picks up edits and
+imports on its next lookup. Queries it cannot answer (typos, matches on
+categories or materials) fall through to catalog.search.
+"""
+import heapq
+import random
+import threading
+from bisect import bisect_left
+
+from .cache import version
+from .models import Product
+from .search import switch_layout, variants, words
+
+SAMPLE_SIZE = 50
+
+_index = None
+_lock = threading.Lock()
+
+
+def suggestion(product):
+    """JSON of one product in the suggestions dropdown (brand_ref should be loaded)."""
+    image_url = None
+    is_placeholder = False
+
+    if product.main_image:
+        image_url = product.main_image.url
+    elif product.brand_ref and product.brand_ref.logo:
+        image_url = product.brand_ref.logo.url
+        is_placeholder = True
+    else:
+        image_url = '/static/images/zaglushka.png'
+        is_placeholder = True
+
+    return {
+        'title': product.title,
+        'slug': product.slug,
+        'price': str(int(product.price)),
+        'image': image_url,
+        'is_placeholder': is_placeholder,
+        'brand': product.brand_ref.name if product.brand_ref else None,
+    }
+
+
+class SuggestionIndex:
+    """Prefix index over a list of products, newest first."""
+
+    def __init__(self, products, catalog_version=None):
+        self.version = catalog_version
+        self.items = []
+        self.leading = []  # first title word of each product, ranked first on a match
+        entries = set()
+        for i, product in enumerate(products):
+            self.items.append(suggestion(product))
+            title = words(product.title)
+            self.leading.append(set(variants(title[0])) if title else set())
+            brand = product.brand_ref.name if product.brand_ref else product.brand
+            for word in title + words(product.article) + words(brand):
+                for variant in variants(word):
+                    entries.add((variant, i))
+        entries = sorted(entries)
+        self.keys = [key for key, _ in entries]
+        self.postings = [i for _, i in entries]
+        self.sample = random.sample(self.items, min(SAMPLE_SIZE, len(self.items)))
+
+    def matching(self, prefix):
+        """Indices of the products with a word starting with `prefix`."""
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\uffff', start)
+        return set(self.postings[start:end])
+
+    def lookup(self, query, limit=5):
+        """Suggestions whose words start with every word of `query`, leading title matches first."""
+        for text in dict.fromkeys((query, switch_layout(query))):
+            terms = words(text)
+            if not terms:
+                return []
+            found = None
+            for term in terms:
+                hits = set().union(*(self.matching(variant) for variant in variants(term)))
+                found = hits if found is None else found & hits
+                if not found:
+                    break
+            if found:
+                first = tuple(variants(terms[0]))
+                ranked = heapq.nsmallest(
+                    limit, found, key=lambda i: (not any(w.startswith(first) for w in self.leading[i]), i),
+                )
+                return [self.items[i] for i in ranked]
+        return []
+
+    def random(self, limit=5):
+        return random.sample(self.sample, min(limit, len(self.sample)))
+
+
+def build(catalog_version=None):
+    products = (
+        Product.objects.filter(is_active=True).select_related('brand_ref')
+        .only('title', 'slug', 'price', 'article', 'brand', 'main_image', 'brand_ref__name', 'brand_ref__logo')
+        .order_by('-created_at', '-pk')
+    )
+    return SuggestionIndex(products.iterator(chunk_size=1000), catalog_version)
+
+
+def get_index():
+    """This worker's index, rebuilt once per catalog version."""
+    global _index
+    current = version('catalog')
+    index = _index
+    if index is None or index.version != current:
+        with _lock:
+            if _index is None or _index.version != current:
+                _index = build(current)
+            index = _index
+    return index
+
+
+def lookup(query, limit=5):
+    return get_index().lookup(query, limit)
+
+
+def sample(limit=5):
+    return get_index().random(limit)
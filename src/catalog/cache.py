@@ -0,0 +1,72 @@
+"""
+Versioned cache keys for data derived from catalog models.
+
+Cached values are stored under keys that embed a per-namespace version
+number. Saving or deleting a model bumps the version of the namespaces it
+feeds (see catalog.signals), so readers simply miss and rebuild instead of
+hunting down individual keys. Bulk writes that bypass model signals
+(queryset.update, bulk_create, ...) must call bump() themselves.
+"""
+import time
+
+from django.core.cache import cache
+
+# Namespaces and what they cover:
+#   catalog  - products, categories, brands, collections and their relations
+#   stock    - what can be sold: bumped by catalog.stock and orders.reservations
+#              only when a product or size runs out or comes back
+#   homepage - homepage blocks, hero images and reviews
+#   site     - top banners and site settings
+NAMESPACES = ('catalog', 'stock', 'homepage', 'site')
+
+_MISSING = object()
+
+
+def _version_key(namespace):
+    return f'version:{namespace}'
+
+
+def version(namespace):
+    """Current version of a namespace, initialised on first use."""
+    key = _version_key(namespace)
+    value = cache.get(key)
+    if value is None:
+        # Seed with a timestamp so an evicted version never falls back to a
+        # number that older cached values were stored under.
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def bump(*namespaces):
+    """Invalidates everything cached under the given namespaces."""
+    for namespace in namespaces:
+        key = _version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), timeout=None)
+
+
+def make_key(namespace, name):
+    """`namespace` may be a tuple of namespaces; the key then changes with any of them."""
+    if isinstance(namespace, str):
+        return f'{namespace}:{version(namespace)}:{name}'
+    versions = ':'.join(str(version(ns)) for ns in namespace)
+    return f'{"+".join(namespace)}:{versions}:{name}'
+
+
+def cached(namespace, name, builder, timeout=None):
+    """
+    Returns the cached value for `name`, building and storing it on a miss.
+    `timeout` falls back to the cache backend default.
+    """
+    key = make_key(namespace, name)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = builder()
+        if timeout is None:
+            cache.set(key, value)
+        else:
+            cache.set(key, value, timeout)
+    return value
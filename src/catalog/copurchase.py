@@ -0,0 +1,185 @@
+"""
+Co-purchase index ("bought together") mined from order history.
+
+Both checkouts record what was bought together: orders.OrderItem (the
+current one) and basket.OrderItem (the older basket flow). mine_copurchases
+streams their items in chunks, ordered by order, and folds every pair of
+products in a non-cancelled order into a sparse co-occurrence matrix kept
+in the CoPurchase table (a dict of pair deltas in memory, flushed every
+FLUSH_PAIRS pairs). The top TOP_K neighbours of every touched product are
+then written to BoughtTogether, which catalog.recommendations reads.
+
+Recent orders count for more: an order adds 2 ** (age in half-lives since
+EPOCH) to its pairs, so weights only ever grow and an incremental run never
+rewrites old rows. decayed() turns a stored weight into "orders, each
+halved per HALF_LIFE of age" as of now.
+
+Incremental runs (the default) start after the last order folded from each
+source (CoPurchaseWatermark) and skip orders younger than SETTLE, which may
+still be cancelled. full=True rebuilds everything, e.g. after old orders
+were cancelled or deleted.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import groupby
+from operator import itemgetter
+
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+
+from .models import BoughtTogether, CoPurchase, CoPurchaseWatermark
+
+# source name: (order item model, status of cancelled orders)
+SOURCES = {
+    'orders': ('orders.OrderItem', 'cancelled'),
+    'basket': ('basket.OrderItem', 'cancelled'),
+}
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+HALF_LIFE = timedelta(days=180)
+SETTLE = timedelta(minutes=10)
+
+TOP_K = 20
+CHUNK_SIZE = 2000
+FLUSH_PAIRS = 20000
+# Larger orders (wholesale, test data) would add a pair for every two of their items
+MAX_ORDER_PRODUCTS = 50
+
+
+def order_weight(created_at):
+    return 2 ** ((created_at - EPOCH) / HALF_LIFE)
+
+
+def decayed(weight, now=None):
+    """A stored weight as a decayed order count at `now`."""
+    return weight * 2 ** (-((now or timezone.now()) - EPOCH) / HALF_LIFE)
+
+
+def _items(source, after, settled):
+    label, cancelled = SOURCES[source]
+    OrderItem = apps.get_model(label)
+    return (
+        OrderItem.objects.filter(order_id__gt=after, order__created_at__lte=settled)
+        .exclude(order__status=cancelled).exclude(product=None)
+        .order_by('order_id')
+        .values_list('order_id', 'order__created_at', 'product_id')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def _fold(delta):
+    """Adds the pair deltas {(product, other): [weight, orders]} to CoPurchase."""
+    if not delta:
+        return
+    existing = {}
+    products = sorted({a for a, _ in delta})
+    for start in range(0, len(products), CHUNK_SIZE):
+        for row in CoPurchase.objects.filter(product_id__in=products[start:start + CHUNK_SIZE]):
+            if (row.product_id, row.other_id) in delta:
+                existing[row.product_id, row.other_id] = row
+
+    changed, created = [], []
+    for (a, b), (weight, orders) in delta.items():
+        row = existing.get((a, b))
+        if row is None:
+            created.append(CoPurchase(product_id=a, other_id=b, weight=weight, orders=orders))
+        else:
+            row.weight += weight
+            row.orders += orders
+            changed.append(row)
+    CoPurchase.objects.bulk_update(changed, ['weight', 'orders'], batch_size=500)
+    CoPurchase.objects.bulk_create(created, batch_size=500)
+
+
+def write_neighbors(product_ids, top_k=TOP_K):
+    """Rewrites the BoughtTogether rows of the given products. Returns rows written."""
+    product_ids = sorted(product_ids)
+    written = 0
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        batch = product_ids[start:start + CHUNK_SIZE]
+        neighbors = defaultdict(list)
+        for product_id, other_id, weight in (
+            CoPurchase.objects.filter(product_id__in=batch).order_by('product_id', '-weight', 'other_id')
+            .values_list('product_id', 'other_id', 'weight')
+        ):
+            if len(neighbors[product_id]) < top_k:
+                neighbors[product_id].append([other_id, weight])
+        BoughtTogether.objects.filter(product_id__in=batch).delete()
+        BoughtTogether.objects.bulk_create(
+            [BoughtTogether(product_id=pk, neighbors=rows) for pk, rows in neighbors.items()], batch_size=500,
+        )
+        written += len(neighbors)
+    return written
+
+
+def mine_copurchases(full=False, top_k=TOP_K, settle=SETTLE, now=None):
+    """
+    Folds the orders placed since the last run (every order with full=True)
+    into the co-purchase matrix and rewrites the neighbours of the products
+    involved. Returns (counts, ids of those products); counts are orders,
+    pairs (cells updated) and products.
+    """
+    settled = (now or timezone.now()) - settle
+    counts = {'orders': 0, 'pairs': 0, 'products': 0}
+    touched = set()
+
+    with transaction.atomic():
+        if full:
+            # Products that lose every pair need their recommendations refreshed as well
+            touched.update(BoughtTogether.objects.values_list('product_id', flat=True))
+            CoPurchase.objects.all().delete()
+            BoughtTogether.objects.all().delete()
+            CoPurchaseWatermark.objects.all().delete()
+
+        for source in SOURCES:
+            mark, _ = CoPurchaseWatermark.objects.select_for_update().get_or_create(source=source)
+            delta = defaultdict(lambda: [0.0, 0])
+            for order_id, rows in groupby(_items(source, mark.last_order_id, settled), key=itemgetter(0)):
+                rows = list(rows)
+                mark.last_order_id = order_id
+                counts['orders'] += 1
+                products = {product_id for _, _, product_id in rows}
+                if len(products) < 2 or len(products) > MAX_ORDER_PRODUCTS:
+                    continue
+                weight = order_weight(rows[0][1])
+                for a in products:
+                    for b in products:
+                        if a != b:
+                            cell = delta[a, b]
+                            cell[0] += weight
+                            cell[1] += 1
+                if len(delta) >= FLUSH_PAIRS:
+                    counts['pairs'] += len(delta)
+                    touched.update(a for a, _ in delta)
+                    _fold(delta)
+                    delta.clear()
+            counts['pairs'] += len(delta)
+            touched.update(a for a, _ in delta)
+            _fold(delta)
+            mark.save()
+
+        write_neighbors(touched, top_k)
+    counts['products'] = len(touched)
+    return counts, touched
+
+
+def bought_together(now=None, product_ids=None):
+    """
+    {product id: {other product id: decayed orders with both}} from
+    BoughtTogether, for every product or only the given ones.
+    """
+    now = now or timezone.now()
+    if product_ids is None:
+        batches = [BoughtTogether.objects.all()]
+    else:
+        product_ids = sorted(product_ids)
+        batches = (
+            BoughtTogether.objects.filter(product_id__in=product_ids[start:start + CHUNK_SIZE])
+            for start in range(0, len(product_ids), CHUNK_SIZE)
+        )
+    return {
+        product_id: {other_id: decayed(weight, now) for other_id, weight in neighbors}
+        for rows in batches
+        for product_id, neighbors in rows.values_list('product_id', 'neighbors').iterator(chunk_size=CHUNK_SIZE)
+    }
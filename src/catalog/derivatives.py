@@ -0,0 +1,160 @@
+"""
+Resized copies ("derivatives") of local images for srcset.
+
+For a stored file `products/ring.jpg` the derivatives are
+`derivatives/products/ring-320w.jpg`, `-640w`, `-1280w`; widths at or above
+the original width are not generated (no upscaling). JPEG/PNG originals and
+derivatives also get WebP/AVIF siblings (see catalog.imaging). Everything is
+built when an image is saved (see catalog.signals), after mirroring, and in
+bulk by the build_derivatives command. What exists for a file is cached, so
+templates only touch storage on a cache miss.
+"""
+import os
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from . import imaging
+
+WIDTHS = (320, 640, 1280)
+CACHE_TIMEOUT = 24 * 60 * 60
+
+# Model -> image fields that get derivatives
+IMAGE_FIELDS = {
+    'catalog.Product': ('main_image', 'main_image_mirror'),
+    'catalog.ProductImage': ('image', 'image_mirror'),
+    'catalog.Brand': ('logo', 'banner'),
+    'catalog.Collection': ('hero_image',),
+    'catalog.HomepageBlock': ('image',),
+    'catalog.HomepageHeroImage': ('image',),
+}
+
+
+def derivative_name(name, width):
+    root, ext = os.path.splitext(name)
+    return f'derivatives/{root}-{width}w{ext}'
+
+
+def _info_key(name):
+    return f'derivatives:{name}'
+
+
+def name_from_url(url):
+    """Storage name of a media URL, or None for remote/static URLs."""
+    media_url = settings.MEDIA_URL
+    if not url or not media_url or not str(url).startswith(media_url):
+        return None
+    return unquote(str(url)[len(media_url):])
+
+
+def _save_siblings(storage, name, image=None, size=None):
+    """WebP/AVIF versions of a stored JPEG/PNG, unless they exist or would not be smaller."""
+    if not name.lower().endswith(imaging.SOURCE_EXTENSIONS):
+        return
+    formats = [fmt for fmt in imaging.modern_formats() if not storage.exists(imaging.sibling_name(name, fmt))]
+    if not formats:
+        return
+    if image is None:
+        with storage.open(name, 'rb') as f:
+            image = Image.open(f)
+            image.load()
+        size = storage.size(name)
+    for fmt, data in imaging.siblings(image, size).items():
+        if fmt in formats:
+            storage.save(imaging.sibling_name(name, fmt), ContentFile(data))
+
+
+def build(name, storage=None):
+    """
+    Writes the missing derivatives (and their WebP/AVIF siblings) of a stored
+    image. Returns the info dict ({'width': original width, 'widths':
+    [derivative widths]}) or None when the file is missing or not an image.
+    """
+    storage = storage or default_storage
+    try:
+        with storage.open(name, 'rb') as f:
+            image = Image.open(f)
+            fmt = image.format
+            image = ImageOps.exif_transpose(image)
+            image.load()
+        size = storage.size(name)
+    except (OSError, ValueError):
+        return None
+
+    _save_siblings(storage, name, image, size)
+
+    widths = []
+    for width in WIDTHS:
+        if width >= image.width:
+            break
+        target = derivative_name(name, width)
+        if storage.exists(target):
+            _save_siblings(storage, target)
+        else:
+            resized = image.resize((width, max(round(image.height * width / image.width), 1)), Image.LANCZOS)
+            data = imaging.encode(resized, fmt)
+            storage.save(target, ContentFile(data))
+            _save_siblings(storage, target, resized, len(data))
+        widths.append(width)
+
+    info = {'width': image.width, 'widths': widths}
+    cache.set(_info_key(name), info, CACHE_TIMEOUT)
+    return info
+
+
+def ensure(name):
+    """Builds derivatives unless the cache says they all exist (cheap on repeated saves)."""
+    known = cache.get(_info_key(name))
+    if not known or len(known['widths']) < len([w for w in WIDTHS if w < known['width']]) or not known['width']:
+        build(name)
+
+
+def info(name, storage=None):
+    """What exists for `name`, from the cache or storage (without generating anything)."""
+    key = _info_key(name)
+    value = cache.get(key)
+    if value is None:
+        storage = storage or default_storage
+        try:
+            with storage.open(name, 'rb') as f:
+                width = Image.open(f).width  # reads the header only
+        except (OSError, ValueError):
+            width = 0
+        value = {
+            'width': width,
+            'widths': [w for w in WIDTHS if w < width and storage.exists(derivative_name(name, w))],
+        }
+        cache.set(key, value, CACHE_TIMEOUT)
+    return value
+
+
+def srcset(url):
+    """srcset value for a media URL ('' when it has no derivatives)."""
+    name = name_from_url(url)
+    if not name:
+        return ''
+    data = info(name)
+    if not data['widths']:
+        return ''
+    entries = [f'{default_storage.url(derivative_name(name, w))} {w}w' for w in data['widths']]
+    entries.append(f"{url} {data['width']}w")
+    return ', '.join(entries)
+
+
+def stored_names():
+    """Every stored file referenced by IMAGE_FIELDS."""
+    from django.apps import apps
+
+    names = set()
+    for label, fields in IMAGE_FIELDS.items():
+        model = apps.get_model(label)
+        for field in fields:
+            names.update(
+                model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                .values_list(field, flat=True)
+            )
+    return sorted(names)
@@ -0,0 +1,151 @@
+"""
+Facet index for the catalog sidebar.
+
+Every product keeps a set of normalized (facet, value) rows in ProductFacet,
+so the listing can ask "which metals/materials/... exist for this selection"
+with one indexed query instead of loading every product into Python.
+Sizes live in ProductSize (see catalog.stock) since they carry stock.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .cache import bump
+from .models import Product, ProductFacet
+from .stock import in_stock_sizes
+
+FACETS = ('metal', 'material', 'stone_option', 'material_type', 'coverage', 'color')
+
+# Fields that feed the index; used to load products with .only() when rebuilding.
+SOURCE_FIELDS = ('id', 'metal', 'material', 'stone_option', 'material_type', 'coverage', 'color')
+
+
+def _split(value):
+    return [part.strip() for part in str(value or '').split(',') if part.strip()]
+
+
+def facet_values(product):
+    """
+    Returns the set of (facet, value) pairs for a product:
+    comma-split materials/coverages and the single-valued text fields as-is.
+    """
+    values = set()
+
+    for facet in ('metal', 'stone_option', 'material_type', 'color'):
+        value = (getattr(product, facet) or '').strip()
+        if value:
+            values.add((facet, value[:200]))
+
+    for facet in ('material', 'coverage'):
+        for value in _split(getattr(product, facet)):
+            values.add((facet, value[:200]))
+
+    return values
+
+
+def sync_product_facets(product):
+    """Brings the facet rows of a single saved product in line with its fields."""
+    wanted = facet_values(product)
+    existing = set(ProductFacet.objects.filter(product=product).values_list('facet', 'value'))
+
+    stale = existing - wanted
+    if stale:
+        ProductFacet.objects.filter(
+            reduce(or_, (Q(facet=facet, value=value) for facet, value in stale)), product=product,
+        ).delete()
+
+    missing = wanted - existing
+    if missing:
+        ProductFacet.objects.bulk_create(
+            [ProductFacet(product=product, facet=facet, value=value) for facet, value in missing],
+            ignore_conflicts=True,
+        )
+
+
+def rebuild_facet_index(product_ids=None, chunk_size=500):
+    """
+    Rebuilds facet rows for the given product ids (or the whole catalog).
+    Used by importers that write products in bulk and bypass Product.save.
+    Returns the number of facet rows written.
+    """
+    qs = Product.objects.only(*SOURCE_FIELDS).order_by('pk')
+    if product_ids is not None:
+        qs = qs.filter(pk__in=list(product_ids))
+
+    written = 0
+    batch = []
+    with transaction.atomic():
+        if product_ids is None:
+            ProductFacet.objects.all().delete()
+        for product in qs.iterator(chunk_size=chunk_size):
+            batch.append(product)
+            if len(batch) >= chunk_size:
+                written += _write_batch(batch, clear=product_ids is not None)
+                batch = []
+        if batch:
+            written += _write_batch(batch, clear=product_ids is not None)
+    bump('catalog')
+    return written
+
+
+def _write_batch(products, clear):
+    if clear:
+        ProductFacet.objects.filter(product_id__in=[p.pk for p in products]).delete()
+    rows = [
+        ProductFacet(product_id=p.pk, facet=facet, value=value)
+        for p in products
+        for facet, value in facet_values(p)
+    ]
+    ProductFacet.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+    return len(rows)
+
+
+def _product_ids(products):
+    return products.order_by().values('pk')
+
+
+def _grouped(qs, field, count_field):
+    rows = qs.order_by().values(field).annotate(n=Count(count_field))
+    return {row[field]: row['n'] for row in rows if row[field] not in (None, '')}
+
+
+def facet_counts(scope_for):
+    """
+    Returns {dimension: {value: product count}} for every sidebar dimension.
+
+    scope_for(dimension) must return the product queryset with all active
+    filters applied except the one on `dimension`, so a count answers
+    "how many products would I see after picking this value". Each dimension
+    is one grouped query, so the cost does not depend on catalog size.
+    """
+    counts = {
+        'category': _grouped(scope_for('category'), 'category__slug', 'pk'),
+        'brand': _grouped(scope_for('brand'), 'brand_ref__name', 'pk'),
+        'gender': _grouped(scope_for('gender'), 'gender', 'pk'),
+        'collection': _grouped(
+            Product.collections.through.objects.filter(product_id__in=_product_ids(scope_for('collection'))),
+            'collection__slug', 'product_id',
+        ),
+        'size': _grouped(
+            in_stock_sizes().filter(product_id__in=_product_ids(scope_for('size'))),
+            'size', 'product_id',
+        ),
+    }
+    for facet in FACETS:
+        counts[facet] = _grouped(
+            ProductFacet.objects.filter(facet=facet, product_id__in=_product_ids(scope_for(facet))),
+            'value', 'product_id',
+        )
+    return counts
+
+
+def collection_filter(slugs):
+    """Subquery of product ids belonging to any of the given collection slugs."""
+    return Product.collections.through.objects.filter(collection__slug__in=slugs).values('product_id')
+
+
+def facet_filter(facet, values):
+    """Subquery of product ids having any of the given values for a facet."""
+    return ProductFacet.objects.filter(facet=facet, value__in=values).values('product_id')
@@ -0,0 +1,96 @@
+"""
+Image encoding shared by catalog.derivatives and optimize_images.py.
+
+Next to a JPEG/PNG `photo.jpg` we write `photo.jpg.webp` (and
+`photo.jpg.avif` when Pillow has AVIF support); nginx serves the smallest
+one the browser accepts (see nginx/nginx.conf). Siblings that would not be
+smaller than the source are not written. Keep this module free of Django
+imports: optimize_images.py runs it without settings.
+"""
+import os
+from collections import defaultdict
+from io import BytesIO
+
+from PIL import Image, features
+
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def modern_formats():
+    """Sibling formats this Pillow build can write, best first."""
+    formats = []
+    if 'avif' in features.modules and features.check_module('avif'):
+        formats.append('avif')
+    if features.check_module('webp'):
+        formats.append('webp')
+    return formats
+
+
+def sibling_name(name, fmt):
+    return f'{name}.{fmt}'
+
+
+def encode(image, fmt):
+    """Encodes a PIL image as JPEG/PNG/WEBP/AVIF with the site's quality settings."""
+    fmt = fmt.upper()
+    buffer = BytesIO()
+    if fmt in ('JPEG', 'JPG'):
+        image.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, progressive=True, optimize=True)
+    elif fmt == 'PNG':
+        image.save(buffer, 'PNG', optimize=True)
+    elif fmt == 'WEBP':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=6)
+    elif fmt == 'AVIF':
+        image.save(buffer, 'AVIF', quality=AVIF_QUALITY)
+    else:
+        image.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def siblings(image, source_size):
+    """{fmt: bytes} of the modern encodings that beat `source_size` bytes."""
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    result = {}
+    for fmt in modern_formats():
+        data = encode(image, fmt)
+        if len(data) < source_size:
+            result[fmt] = data
+    return result
+
+
+def savings_report(root):
+    """
+    {directory: (source bytes, served bytes)} for the JPEG/PNG files under
+    `root`, where served bytes count the smallest sibling when there is one.
+    """
+    report = defaultdict(lambda: [0, 0])
+    for dirpath, _, filenames in os.walk(root):
+        present = set(filenames)
+        for filename in filenames:
+            if not filename.lower().endswith(SOURCE_EXTENSIONS):
+                continue
+            size = os.path.getsize(os.path.join(dirpath, filename))
+            sizes = [size] + [
+                os.path.getsize(os.path.join(dirpath, sibling_name(filename, fmt)))
+                for fmt in ('avif', 'webp') if sibling_name(filename, fmt) in present
+            ]
+            entry = report[os.path.relpath(dirpath, root)]
+            entry[0] += size
+            entry[1] += min(sizes)
+    return {directory: tuple(sizes) for directory, sizes in sorted(report.items())}
+
+
+def format_report(report, title):
+    lines = [title]
+    total_source = total_served = 0
+    for directory, (source, served) in report.items():
+        total_source += source
+        total_served += served
+        lines.append(f'  {directory}: {source / 1024:.0f} KB -> {served / 1024:.0f} KB (saved {(source - served) / 1024:.0f} KB)')
+    lines.append(f'  total: saved {(total_source - total_served) / 1024:.0f} KB of {total_source / 1024:.0f} KB')
+    return '\n'.join(lines)
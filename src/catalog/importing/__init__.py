@@ -0,0 +1 @@
+"""Catalog import tooling shared by the sheet/JSON importers."""
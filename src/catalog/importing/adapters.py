@@ -0,0 +1,169 @@
+"""
+Source adapters: each turns one kind of input into ProductRow objects.
+
+- SheetAdapter: the catalog sheet as CSV, from the Google Sheets export
+  URL, a local file or stdin (see sources.open_source)
+- JSONAdapter: products.json written by extract_json.py and the parsed
+  catalog/fixtures/products_data.json
+"""
+import json
+
+from .parsing import (
+    clean_price, clean_stock, convert_gdrive_link, detect_image_indices, get_cell, get_slug,
+    header_index, map_gender, map_material_type, map_stone_option, normalize_category,
+    normalize_header, split_list, split_title,
+)
+from .rows import ProductRow
+from .sources import open_source, read_rows, sample
+
+
+class SourceError(Exception):
+    """The source cannot be imported at all (unreadable, missing required columns)."""
+
+
+class SheetAdapter:
+    # Column -> accepted header spellings
+    COLUMNS = {
+        'category': ('Категория',),
+        'article': ('Артикул',),
+        'brand': ('Бренд',),
+        'size': ('Размер',),
+        'note': ('Размер описание', 'Размер (описание)'),
+        'title': ('Название', 'Наименование'),
+        'description': ('Описание', 'Description'),
+        'metal': ('Металл',),
+        'material': ('Материал',),
+        'material_type': ('Материал фильтр', 'Материал (фильтр)'),
+        'coverage': ('Покрытие',),
+        'stones': ('Камень', 'Камни'),
+        'stone_option': ('Камень фильтр', 'Камни фильтр'),
+        'price': ('Цена', 'Price'),
+        'quantity': ('Количество', 'Остаток', 'Кол-во'),
+        'collections': ('Коллекции', 'Коллекция'),
+        'gender': ('Пол', 'Gender'),
+    }
+
+    def __init__(self, source):
+        self.source = source
+
+    def rows(self):
+        """Yields (line number, ProductRow or the exception raised while parsing that line)."""
+        with open_source(self.source) as stream:
+            header, rows = read_rows(stream)
+            if not header:
+                raise SourceError('Empty spreadsheet')
+            headers = [normalize_header(h) for h in header]
+            idx = {name: header_index(headers, *names) for name, names in self.COLUMNS.items()}
+            if idx['article'] is None:
+                raise SourceError('Missing required column: Артикул')
+
+            # Unnamed photo columns are guessed from rows read ahead of the stream
+            head, rows = sample(rows)
+            image_columns = detect_image_indices(header, head)
+
+            for line, row in enumerate(rows, start=2):
+                if not any(cell.strip() for cell in row):
+                    continue
+                try:
+                    parsed = self.parse(row, idx, image_columns)
+                except Exception as e:
+                    yield line, e
+                    continue
+                if parsed:
+                    yield line, parsed
+
+    def parse(self, row, idx, image_columns):
+        cell = lambda name: get_cell(row, idx[name])
+        article = cell('article')
+        if not article:
+            return None
+
+        title, description = cell('title'), cell('description')
+        if not title:
+            title, description = split_title(description)
+
+        size, quantity = cell('size'), clean_stock(cell('quantity'))
+        return ProductRow(
+            article=article,
+            title=title,
+            description=description,
+            category=normalize_category(cell('category')),
+            brand=cell('brand'),
+            collections=split_list(cell('collections')),
+            price=clean_price(cell('price')),
+            sizes=[size] if size else [],
+            size_stock={size: quantity} if size else {},
+            stock=0 if size else quantity,
+            metal=cell('metal'),
+            material=cell('material'),
+            material_type=map_material_type(cell('material_type')),
+            coverage=cell('coverage'),
+            stones=cell('stones'),
+            stone_option=map_stone_option(cell('stone_option')),
+            gender=map_gender(cell('gender')),
+            note=cell('note'),
+            images=[convert_gdrive_link(get_cell(row, i)) for i in image_columns if get_cell(row, i)],
+        )
+
+
+class JSONAdapter:
+    def __init__(self, source):
+        self.source = source
+
+    def rows(self):
+        with open_source(self.source) as stream:
+            try:
+                items = json.load(stream)
+            except ValueError as e:
+                raise SourceError(f'Invalid JSON: {e}')
+        for number, item in enumerate(items, start=1):
+            try:
+                yield number, self.parse(item)
+            except Exception as e:
+                yield number, e
+
+    def parse(self, item):
+        title = str(item.get('title') or '').strip()
+        description = str(item.get('description') or '').strip()
+        if not title:
+            title, description = split_title(description)
+        brand = str(item.get('brand') or '').strip()
+        # The parsed fixture has no articles; brand + title identify a product there
+        article = str(item.get('article') or '').strip() or get_slug(f'{brand}-{title}')
+
+        images = list(item.get('images') or [])
+        if not images:
+            images = [item.get('main_photo')] + list(item.get('extra_photos') or [])
+        sizes = [str(size).strip() for size in item.get('sizes') or split_list(item.get('size'))]
+        stock = clean_stock(item.get('total_stock') or item.get('stock'))
+
+        return ProductRow(
+            article=article,
+            title=title,
+            description=description,
+            category=normalize_category(item.get('category')),
+            brand=brand,
+            collections=list(item.get('collections') or []),
+            price=clean_price(item.get('price')),
+            # Stock is only known per product here, so sizes stay untracked
+            sizes=sizes,
+            stock=stock,
+            metal=str(item.get('metal') or '').strip(),
+            material=str(item.get('material') or '').strip(),
+            coverage=str(item.get('coverage') or '').strip(),
+            stones=str(item.get('stones') or '').strip(),
+            images=[convert_gdrive_link(url) for url in images if url],
+        )
+
+
+ADAPTERS = {
+    'csv': SheetAdapter,
+    'json': JSONAdapter,
+}
+
+
+def adapter_for(source, kind=None):
+    """Picks the adapter from `kind` or the source's extension (CSV by default)."""
+    if kind is None:
+        kind = 'json' if str(source).lower().endswith('.json') else 'csv'
+    return ADAPTERS[kind](source)
@@ -0,0 +1,60 @@
+"""
+The import engine: reads rows from a source adapter, folds rows of the
+same article together and hands the result to the batched writer.
+"""
+from dataclasses import dataclass, field
+
+from .rows import ProductRow
+from .writer import phase, write_products
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deactivated: int = 0
+    # (line or item number, message) of rows that could not be parsed
+    errors: list = field(default_factory=list)
+    # Seconds per phase: read, diff, lookups, products, collections, images, indexes, ...
+    timings: dict = field(default_factory=dict)
+    dry_run: bool = False
+
+    def summary(self):
+        return (
+            f'Created: {self.created}, updated: {self.updated}, unchanged: {self.unchanged}, '
+            f'deactivated: {self.deactivated}, errors: {len(self.errors)}.'
+        )
+
+    def profile(self):
+        total = sum(self.timings.values())
+        parts = [f'{name} {seconds:.2f}s' for name, seconds in self.timings.items()]
+        return f"Timings: {', '.join(parts)} (total {total:.2f}s)"
+
+
+def aggregate(adapter, result):
+    """Returns {article: ProductRow}, merging rows that repeat an article (one row per size)."""
+    rows = {}
+    for number, row in adapter.rows():
+        if not isinstance(row, ProductRow):
+            result.errors.append((number, str(row)))
+            continue
+        if row.article in rows:
+            rows[row.article].merge(row)
+        else:
+            rows[row.article] = row
+    return rows
+
+
+def run_import(adapter, deactivate_missing=False, dry_run=False):
+    """
+    Imports everything `adapter` yields. Raises adapters.SourceError when the
+    source cannot be read at all; per-row problems end up in result.errors.
+    """
+    result = ImportResult(dry_run=dry_run)
+    with phase(result.timings, 'read'):
+        rows = aggregate(adapter, result)
+    counts = write_products(rows, deactivate_missing=deactivate_missing, dry_run=dry_run, timings=result.timings)
+    for name, value in counts.items():
+        setattr(result, name, value)
+    return result
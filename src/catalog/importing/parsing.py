@@ -0,0 +1,158 @@
+"""
+Cell-level parsing shared by every catalog source.
+
+These used to be copied (with drift) into each importer script; keep them
+free of Django imports so standalone scripts such as extract_json.py can
+use them too.
+"""
+import hashlib
+import re
+
+from slugify import slugify  # transliterates Cyrillic to ASCII
+
+# Category spellings found in the sheets -> catalog category name
+CATEGORY_MAP = {
+    'кольцо': 'Кольца',
+    'кольца': 'Кольца',
+    'браслет': 'Браслеты',
+    'браслеты': 'Браслеты',
+    'серьга': 'Серьги',
+    'серьги': 'Серьги',
+    'сертификат': 'Сертификаты',
+    'сертификаты': 'Сертификаты',
+    'колье': 'Колье',
+    # Keep other categories as-is
+    '2в1': '2в1',
+    'другое': 'Другое',
+    'заколка': 'Заколка',
+    'слейв': 'Слейв',
+}
+
+
+def convert_gdrive_link(url):
+    """Converts a Google Drive sharing link to a direct image link."""
+    url = str(url or '').strip()
+    if not url or 'drive.google.com' not in url:
+        return url
+
+    match = re.search(r'/d/([a-zA-Z0-9_-]+)', url) or re.search(r'id=([a-zA-Z0-9_-]+)', url)
+    if match:
+        # lh3.googleusercontent.com serves the file directly (no cookies/auth interstitial)
+        return f"https://lh3.googleusercontent.com/d/{match.group(1)}"
+    return url
+
+
+def clean_price(value):
+    """'12 000 ₸' -> 12000; anything without digits -> 0."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    value = re.sub(r'[.,]\d{1,2}\s*$', '', str(value or '').strip())  # drop kopecks/tiyn
+    digits = re.sub(r'\D', '', value)
+    return int(digits) if digits else 0
+
+
+def clean_stock(value):
+    """Quantity cell -> non-negative int."""
+    if isinstance(value, (int, float)):
+        return max(int(value), 0)
+    digits = re.sub(r'\D', '', str(value or ''))
+    return int(digits) if digits else 0
+
+
+def normalize_category(value):
+    value = str(value or '').strip()
+    if not value:
+        return ''
+    return CATEGORY_MAP.get(value.lower(), value.capitalize())
+
+
+def get_slug(text):
+    """ASCII slug with transliteration and a stable fallback for unsluggable text."""
+    text = str(text or '').strip()
+    slugified = slugify(text)
+    if not slugified:
+        slugified = hashlib.md5(text.encode()).hexdigest()[:10]
+    return slugified[:200]
+
+
+def split_title(description):
+    """First line of a description is the product title; the rest stays the description."""
+    lines = str(description or '').strip().split('\n')
+    return lines[0].strip()[:200], '\n'.join(lines[1:]).strip()
+
+
+def normalize_header(value):
+    return re.sub(r'\s+', ' ', str(value or '').strip()).lower()
+
+
+def header_index(headers, *names):
+    normalized = {h: i for i, h in enumerate(headers)}
+    for name in names:
+        key = normalize_header(name)
+        if key in normalized:
+            return normalized[key]
+    return None
+
+
+def get_cell(row, idx):
+    if idx is None or idx >= len(row):
+        return ''
+    return str(row[idx]).strip()
+
+
+def map_gender(value):
+    v = str(value or '').strip().lower()
+    if not v:
+        return None
+    if 'муж' in v or v in ('m', 'male'):
+        return 'male'
+    if 'жен' in v or v in ('f', 'female'):
+        return 'female'
+    return None
+
+
+def map_material_type(value):
+    v = str(value or '').strip().lower()
+    if 'ювелир' in v:
+        return 'jewelry'
+    if 'друг' in v:
+        return 'other'
+    return None
+
+
+def map_stone_option(value):
+    v = str(value or '').strip().lower()
+    if not v:
+        return None
+    if 'без' in v:
+        return 'without_stones'
+    if 'с камн' in v or v.startswith('с '):
+        return 'with_stones'
+    return None
+
+
+def split_list(value):
+    return [p.strip() for p in re.split(r'[,\n;]+', str(value or '')) if p.strip()]
+
+
+def is_image_link(value):
+    v = str(value or '').strip().lower()
+    return v.startswith(('http://', 'https://')) or 'drive.google.com' in v or 'googleusercontent.com' in v
+
+
+def detect_image_indices(headers_raw, sample_rows):
+    """Photo columns: headed 'Фото...' or unnamed columns holding links in the sample."""
+    indices = {i for i, h in enumerate(headers_raw) if 'фото' in normalize_header(h)}
+    blank = [i for i, h in enumerate(headers_raw) if not str(h).strip()]
+    for i in blank:
+        if any(i < len(row) and is_image_link(row[i]) for row in sample_rows):
+            indices.add(i)
+    return sorted(indices)
+
+
+def size_sort_key(value):
+    # Same order as Product.save uses for the size string
+    try:
+        return (0, float(str(value).replace(',', '.')), '')
+    except ValueError:
+        return (1, 0, str(value))
@@ -0,0 +1,70 @@
+"""The normalized product row every source adapter produces."""
+import hashlib
+import json
+from dataclasses import asdict, dataclass, field
+
+from .parsing import size_sort_key
+
+
+@dataclass
+class ProductRow:
+    article: str
+    title: str = ''
+    description: str = ''
+    category: str = ''
+    brand: str = ''
+    collections: list = field(default_factory=list)
+    price: int = 0
+    sizes: list = field(default_factory=list)
+    # Per-size quantities when the source has them; otherwise only `stock` is known
+    size_stock: dict = field(default_factory=dict)
+    stock: int = 0
+    metal: str = ''
+    material: str = ''
+    material_type: str = None
+    coverage: str = ''
+    stones: str = ''
+    stone_option: str = None
+    gender: str = None
+    note: str = ''
+    images: list = field(default_factory=list)
+
+    # Text fields where the first non-empty value wins when an article spans several rows
+    FILL_FIELDS = (
+        'title', 'description', 'category', 'brand', 'price', 'metal', 'material', 'material_type',
+        'coverage', 'stones', 'stone_option', 'gender', 'note',
+    )
+
+    def merge(self, other):
+        """Folds another row of the same article (usually another size) into this one."""
+        for name in self.FILL_FIELDS:
+            if not getattr(self, name) and getattr(other, name):
+                setattr(self, name, getattr(other, name))
+        for name in other.collections:
+            if name not in self.collections:
+                self.collections.append(name)
+        for url in other.images:
+            if url not in self.images:
+                self.images.append(url)
+        for size in other.sizes:
+            if size not in self.sizes:
+                self.sizes.append(size)
+        for size, qty in other.size_stock.items():
+            self.size_stock[size] = self.size_stock.get(size, 0) + qty
+        self.stock += other.stock
+
+    @property
+    def size(self):
+        """Product.size string: every size, in the order Product.save uses."""
+        return ', '.join(sorted(self.sizes, key=size_sort_key))
+
+    @property
+    def total_stock(self):
+        return sum(self.size_stock.values()) if self.size_stock else self.stock
+
+    def fingerprint(self):
+        """Stable hash of the row; stored on Product.import_hash to skip unchanged products."""
+        data = asdict(self)
+        data['collections'] = sorted(data['collections'])
+        data['sizes'] = sorted(data['sizes'])
+        return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
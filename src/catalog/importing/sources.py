@@ -0,0 +1,49 @@
+"""
+Streaming sources for the catalog importers.
+
+A source is a URL (streamed over HTTP), a local file path or '-' for
+stdin. Rows are read straight from the stream, so memory does not depend
+on the size of the sheet.
+"""
+import csv
+import io
+import sys
+from contextlib import contextmanager
+from itertools import chain, islice
+
+import requests
+
+# Rows read ahead to guess unnamed image columns
+SAMPLE_ROWS = 200
+
+
+def is_url(source):
+    return str(source).startswith(('http://', 'https://'))
+
+
+@contextmanager
+def open_source(source, timeout=60):
+    """Yields a text stream over the CSV source, decoded as it is read."""
+    if is_url(source):
+        with requests.get(source, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True  # let urllib3 undo gzip transfer encoding
+            response.raw.auto_close = False  # TextIOWrapper reads until EOF itself
+            yield io.TextIOWrapper(response.raw, encoding='utf-8-sig', newline='')
+    elif source == '-':
+        yield io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+    else:
+        with open(source, encoding='utf-8-sig', newline='') as f:
+            yield f
+
+
+def read_rows(stream):
+    """Returns (header, rows iterator); header is [] for an empty source."""
+    reader = csv.reader(stream)
+    return next(reader, []), reader
+
+
+def sample(rows, size=SAMPLE_ROWS):
+    """Reads the first `size` rows ahead; returns them and an iterator that still yields every row."""
+    head = list(islice(rows, size))
+    return head, chain(head, rows)
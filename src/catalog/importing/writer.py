@@ -0,0 +1,232 @@
+"""
+Batched writer: stores aggregated ProductRows with set-based queries.
+
+Lookups are preloaded into dicts, only products whose fingerprint changed
+are written, and products/collection links/images go out in bulk chunks
+inside one transaction. The size, facet and search indexes are rebuilt
+once for the written products, since bulk writes bypass Product.save. So
+are their recommendations, after the commit.
+"""
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+
+from catalog.cache import bump
+from catalog.facets import rebuild_facet_index
+from catalog.mirror import mirrored_files
+from catalog.models import Brand, Category, Collection, Product, ProductImage
+from catalog.placeholders import FIELDS as IMAGE_FIELDS, UNKNOWN as UNKNOWN_IMAGE, described
+from catalog.recommendations import update_recommendations
+from catalog.search import rebuild_search_index
+from catalog.stock import rebuild_size_index
+
+from .parsing import get_slug
+
+CHUNK_SIZE = 500
+
+
+def chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+@contextmanager
+def phase(timings, name):
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0) + time.monotonic() - started
+
+
+def unique_slug(base, used):
+    slug = base
+    n = 2
+    while slug in used:
+        slug = f'{base}-{n}'
+        n += 1
+    used.add(slug)
+    return slug
+
+
+def ensure_named(model, names):
+    """
+    Returns {lowercased name: obj} for all rows of `model`, bulk-creating the
+    missing `names` first. Matching is case-insensitive like the old per-row lookups.
+    """
+    by_name = {obj.name.lower(): obj for obj in model.objects.all()}
+    used_slugs = {obj.slug for obj in by_name.values()}
+    missing = {}
+    for name in names:
+        key = name.lower()
+        if name and key not in by_name and key not in missing:
+            missing[key] = model(name=name, slug=unique_slug(get_slug(name), used_slugs))
+    if missing:
+        model.objects.bulk_create(missing.values(), batch_size=CHUNK_SIZE)
+        by_name = {obj.name.lower(): obj for obj in model.objects.all()}
+    return by_name
+
+
+def image_fields(url, known):
+    """Image metadata of `url` when some row already described it, otherwise cleared for describe_images."""
+    meta = known.get(url)
+    if meta:
+        return {field: meta[field] for field in IMAGE_FIELDS}
+    return dict(UNKNOWN_IMAGE, image_key='')
+
+
+def product_fields(row, categories, brands, mirrors, known):
+    """Field values of the Product for an aggregated row (everything but article and slug)."""
+    size_stock = {size: qty for size, qty in row.size_stock.items() if size}
+    return {
+        'category': categories.get(row.category.lower()) if row.category else None,
+        'brand_ref': brands.get(row.brand.lower()) if row.brand else None,
+        'brand': row.brand,
+        'title': row.title or f'{row.category} {row.brand} {row.article}'.strip(),
+        'description': row.description,
+        'price': row.price,
+        'metal': row.metal,
+        'material': row.material,
+        'material_type': row.material_type,
+        'coverage': row.coverage,
+        'stones': row.stones,
+        'stone_option': row.stone_option,
+        'gender': row.gender,
+        'note': row.note,
+        'size': row.size[:50],
+        'size_stock': size_stock,
+        'stock': row.total_stock,
+        'main_image_url': row.images[0] if row.images else '',
+        'main_image_mirror': mirrors.get(row.images[0], '') if row.images else '',
+        **image_fields(row.images[0] if row.images else '', known),
+        'is_active': True,
+    }
+
+
+def write_products(rows, deactivate_missing=False, dry_run=False, timings=None):
+    """
+    Writes {article: ProductRow}. Products whose stored import_hash matches
+    the row fingerprint are left alone. With `deactivate_missing`, imported
+    products absent from `rows` are hidden (not deleted, so carts and orders
+    keep pointing at them). A dry run does every write and rolls it back.
+
+    Returns counts of created/updated/unchanged/deactivated products.
+    """
+    timings = {} if timings is None else timings
+    counts = {'created': 0, 'updated': 0, 'unchanged': 0, 'deactivated': 0}
+
+    with phase(timings, 'diff'):
+        existing = {}
+        for batch in chunks(rows):
+            for article, pk, import_hash, is_active in (
+                Product.objects.filter(article__in=batch).order_by('pk')
+                .values_list('article', 'pk', 'import_hash', 'is_active')
+            ):
+                existing.setdefault(article, (pk, import_hash, is_active))
+
+        changed = {}
+        for article, row in rows.items():
+            fingerprint = row.fingerprint()
+            known = existing.get(article)
+            if known and known[1] == fingerprint and known[2]:
+                counts['unchanged'] += 1
+            else:
+                changed[article] = (row, fingerprint)
+
+        removed = []
+        if deactivate_missing:
+            removed = [
+                pk for pk, article in
+                Product.objects.filter(is_active=True).exclude(import_hash='').values_list('pk', 'article')
+                if article not in rows
+            ]
+
+    if not changed and not removed:
+        return counts
+
+    with transaction.atomic():
+        with phase(timings, 'lookups'):
+            categories = ensure_named(Category, [row.category for row, _ in changed.values()])
+            brands = ensure_named(Brand, [row.brand for row, _ in changed.values()])
+            collections = ensure_named(Collection, [name for row, _ in changed.values() for name in row.collections])
+            # Images that were mirrored before keep their local copy
+            urls = {url for row, _ in changed.values() for url in row.images}
+            mirrors = mirrored_files(urls)
+            # So do their sizes and previews (see catalog.placeholders)
+            known = described(urls)
+
+        with phase(timings, 'products'):
+            written_pks = {existing[a][0] for a in changed if a in existing}
+            used_slugs = {slug for pk, slug in Product.objects.values_list('pk', 'slug') if pk not in written_pks}
+
+            to_create, to_update = [], []
+            now = timezone.now()
+            for article, (row, fingerprint) in changed.items():
+                fields = product_fields(row, categories, brands, mirrors, known)
+                fields['slug'] = unique_slug(get_slug(f"{fields['title']}-{article}"), used_slugs)
+                fields['import_hash'] = fingerprint
+                fields['updated_at'] = now  # bulk_update skips auto_now
+                if article in existing:
+                    to_update.append(Product(pk=existing[article][0], article=article, **fields))
+                else:
+                    to_create.append(Product(article=article, **fields))
+
+            Product.objects.bulk_create(to_create, batch_size=CHUNK_SIZE)
+            if to_update:
+                Product.objects.bulk_update(to_update, list(fields), batch_size=CHUNK_SIZE)
+            products = {p.article: p.pk for p in to_update}
+            for batch in chunks(a for a in changed if a not in products):
+                for article, pk in Product.objects.filter(article__in=batch).values_list('article', 'pk'):
+                    products.setdefault(article, pk)
+            product_ids = list(products.values())
+            counts['created'], counts['updated'] = len(to_create), len(to_update)
+
+        with phase(timings, 'collections'):
+            Through = Product.collections.through
+            for batch in chunks(product_ids):
+                Through.objects.filter(product_id__in=batch).delete()
+            Through.objects.bulk_create([
+                Through(product_id=products[article], collection_id=collections[name.lower()].pk)
+                for article, (row, _) in changed.items()
+                for name in sorted(row.collections)
+                if name.lower() in collections
+            ], batch_size=CHUNK_SIZE, ignore_conflicts=True)
+
+        with phase(timings, 'images'):
+            for batch in chunks(product_ids):
+                ProductImage.objects.filter(product_id__in=batch).delete()
+            ProductImage.objects.bulk_create([
+                ProductImage(
+                    product_id=products[article], image_url=url, image_mirror=mirrors.get(url, ''), sort_order=i,
+                    **image_fields(url, known),
+                )
+                for article, (row, _) in changed.items()
+                for i, url in enumerate(row.images[1:])
+            ], batch_size=CHUNK_SIZE)
+
+        with phase(timings, 'indexes'):
+            rebuild_size_index(product_ids)
+            rebuild_facet_index(product_ids)
+            rebuild_search_index(product_ids)
+
+        if removed:
+            with phase(timings, 'deactivate'):
+                for batch in chunks(removed):
+                    counts['deactivated'] += Product.objects.filter(pk__in=batch).update(is_active=False)
+
+        def recommend():
+            # The written and hidden products, and the products listing them
+            with phase(timings, 'recommendations'):
+                update_recommendations([*product_ids, *removed])
+
+        transaction.on_commit(recommend)
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    if not dry_run:
+        bump('catalog')
+    return counts
@@ -0,0 +1,62 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.models import Product
+from catalog.search import backend, icontains_ids, search_ids, switch_layout, transliterate, words
+
+
+def sample_queries():
+    """A few as-you-type queries built from the catalog itself."""
+    product = Product.objects.filter(is_active=True).exclude(title='').select_related('brand_ref').order_by('pk').first()
+    if product is None:
+        return []
+    title = words(product.title)
+    queries = [title[0][:3], ' '.join(title[:2]), transliterate(title[0]), switch_layout(title[0])]
+    if product.brand_ref:
+        queries.append(product.brand_ref.name)
+    if product.article:
+        queries.append(product.article)
+    return list(dict.fromkeys(q for q in queries if q))
+
+
+def timed(func, query, limit, repeat):
+    """(median ms, p95 ms, results) of `repeat` calls."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        ids = func(query, limit)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1 if len(timings) > 1 else 0], len(ids)
+
+
+class Command(BaseCommand):
+    help = 'Compare the latency of the search index with the old title/brand icontains lookup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', help='Queries to time (default: built from the catalog)')
+        parser.add_argument('--repeat', type=int, default=50, help='Runs per query')
+        parser.add_argument('--limit', type=int, default=5, help='Results per query (the suggestions box shows 5)')
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or sample_queries()
+        repeat = max(options['repeat'], 1)
+        self.stdout.write(f'Search backend: {backend()}, {Product.objects.count()} products, {repeat} runs per query')
+        self.stdout.write(f'{"query":<24} {"index ms (p50/p95)":>20} {"hits":>5} {"icontains ms (p50/p95)":>24} {"hits":>5}')
+
+        totals = [0, 0]
+        for query in queries:
+            index = timed(search_ids, query, options['limit'], repeat)
+            legacy = timed(icontains_ids, query, options['limit'], repeat)
+            totals[0] += index[0]
+            totals[1] += legacy[0]
+            self.stdout.write(
+                f'{query[:24]:<24} {index[0]:>11.2f} / {index[1]:>6.2f} {index[2]:>5} '
+                f'{legacy[0]:>15.2f} / {legacy[1]:>6.2f} {legacy[2]:>5}'
+            )
+        if queries:
+            self.stdout.write(self.style.SUCCESS(
+                f'Median sum: index {totals[0]:.2f} ms, icontains {totals[1]:.2f} ms.'
+            ))
@@ -0,0 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from catalog.derivatives import WIDTHS, build, stored_names
+
+
+class Command(BaseCommand):
+    help = 'Build the resized copies (srcset widths) of every stored catalog image'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Images resized in parallel')
+
+    def handle(self, *args, **options):
+        names = stored_names()
+        self.stdout.write(f'Building {", ".join(map(str, WIDTHS))}px copies of {len(names)} images...')
+        # Pillow releases the GIL while decoding and resizing, so threads are enough
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            results = list(pool.map(build, names))
+        failed = results.count(None)
+        self.stdout.write(self.style.SUCCESS(f'Done. Images: {len(names) - failed}, unreadable: {failed}.'))
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the related and "Complete the Look" products of every product page'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = build_recommendations()
+        self.stdout.write(self.style.SUCCESS(
+            f'Recommendations built for {written} products in {time.monotonic() - started:.2f}s.'
+        ))
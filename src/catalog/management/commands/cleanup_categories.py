@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from catalog.cache import bump
 from catalog.models import Category, Product
 
 class Command(BaseCommand):
@@ -41,4 +42,5 @@ class Command(BaseCommand):
                     dup.delete()
                     self.stdout.write(self.style.WARNING(f'  Deleted duplicate: {dup.name}'))
         
+        bump('catalog')
         self.stdout.write(self.style.SUCCESS('Category cleanup complete!'))
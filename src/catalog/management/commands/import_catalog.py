@@ -0,0 +1,50 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importing.adapters import ADAPTERS, SourceError, adapter_for
+from catalog.importing.engine import run_import
+
+
+class Command(BaseCommand):
+    help = 'Imports products from a catalog sheet (CSV URL/file) or a products JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='CSV export URL, local CSV/JSON file or - for stdin')
+        parser.add_argument(
+            '--format', choices=sorted(ADAPTERS), default=None,
+            help='Source format (default: json for *.json, csv otherwise)',
+        )
+        parser.add_argument(
+            '--deactivate-missing', action='store_true',
+            help='Hide imported products that are no longer in the source',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Run every write, then roll it back')
+        parser.add_argument('--profile', action='store_true', help='Print the time spent in each phase')
+        parser.add_argument(
+            '--mirror-images', action='store_true',
+            help='Copy new remote images into media storage after the import (see mirror_images)',
+        )
+
+    def handle(self, *args, **options):
+        adapter = adapter_for(options['source'], options['format'])
+        try:
+            result = run_import(
+                adapter,
+                deactivate_missing=options['deactivate_missing'],
+                dry_run=options['dry_run'],
+            )
+        except (SourceError, OSError) as e:
+            raise CommandError(str(e))
+        report(self, result, options['profile'])
+        if options['mirror_images'] and not result.dry_run:
+            call_command('mirror_images', stdout=self.stdout)
+
+
+def report(command, result, profile=False):
+    """Prints an ImportResult the same way from every import command."""
+    for number, message in result.errors:
+        command.stdout.write(command.style.ERROR(f'Row {number}: {message}'))
+    if profile:
+        command.stdout.write(result.profile())
+    prefix = 'Dry run finished (rolled back).' if result.dry_run else 'Import finished.'
+    command.stdout.write(command.style.SUCCESS(f'{prefix} {result.summary()}'))
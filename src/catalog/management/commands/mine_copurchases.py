@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from catalog.copurchase import TOP_K, mine_copurchases
+from catalog.recommendations import update_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Fold new orders into the "bought together" index and refresh the recommendations of the products it changes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild from every order instead of the new ones')
+        parser.add_argument('--top-k', type=int, default=TOP_K, help='Neighbours kept per product')
+        parser.add_argument(
+            '--every', type=int, default=0,
+            help='Keep running and fold new orders every N seconds',
+        )
+
+    def handle(self, *args, **options):
+        every = options['every']
+        full = options['full']
+        while True:
+            close_old_connections()
+            started = time.monotonic()
+            counts, product_ids = mine_copurchases(full=full, top_k=options['top_k'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Folded {counts['orders']} orders into {counts['pairs']} pairs, "
+                f"{counts['products']} products updated in {time.monotonic() - started:.2f}s."
+            ))
+            if product_ids:
+                # Pairs are symmetric, so both sides of every changed pair are in product_ids
+                written = update_recommendations(product_ids, neighbours=False)
+                self.stdout.write(f'Recommendations refreshed for {written} products.')
+            if not every:
+                break
+            full = False
+            time.sleep(every)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from catalog.mirror import WORKERS, mirror_images
+
+
+class Command(BaseCommand):
+    help = 'Copy remote product images into media storage and serve them locally'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=WORKERS, help='Parallel downloads')
+        parser.add_argument('--timeout', type=int, default=30, help='Seconds per request')
+        parser.add_argument(
+            '--refresh', action='store_true',
+            help='Revalidate already mirrored URLs (conditional requests by ETag)',
+        )
+
+    def handle(self, *args, **options):
+        counts = mirror_images(workers=options['workers'], refresh=options['refresh'], timeout=options['timeout'])
+        self.stdout.write(self.style.SUCCESS(
+            'Images mirrored. Downloaded: {downloaded}, reused: {reused}, not modified: {not_modified}, '
+            'skipped: {skipped}, failed: {failed}, linked: {linked}.'.format(**counts)
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalog.facets import rebuild_facet_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the catalog facet index (sizes, metals, materials, ...) from product fields'
+
+    def handle(self, *args, **options):
+        written = rebuild_facet_index()
+        self.stdout.write(self.style.SUCCESS(f'Facet index rebuilt: {written} rows.'))
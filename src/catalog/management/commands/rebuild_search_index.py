@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalog.search import backend, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index (title, brand, article, category, collections, materials)'
+
+    def handle(self, *args, **options):
+        written = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt ({backend()}): {written} products.'))
@@ -0,0 +1,73 @@
+# Generated by Django 6.0 on 2026-10-17 20:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _split(value):
+    return [part.strip() for part in str(value or '').split(',') if part.strip()]
+
+
+def backfill_facets(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    ProductFacet = apps.get_model('catalog', 'ProductFacet')
+
+    rows = []
+    for product in Product.objects.all().iterator():
+        values = set()
+        size_stock = product.size_stock if isinstance(product.size_stock, dict) else {}
+        if size_stock:
+            for size, qty in size_stock.items():
+                size = str(size).strip()
+                try:
+                    qty = int(qty) if qty is not None else None
+                except (TypeError, ValueError):
+                    continue
+                if size and (qty is None or qty > 0):
+                    values.add(('size', size))
+        else:
+            values.update(('size', s) for s in _split(product.size))
+        for facet in ('metal', 'stone_option', 'material_type', 'color'):
+            value = (getattr(product, facet) or '').strip()
+            if value:
+                values.add((facet, value[:200]))
+        for facet in ('material', 'coverage'):
+            values.update((facet, v[:200]) for v in _split(getattr(product, facet)))
+        rows.extend(ProductFacet(product_id=product.pk, facet=f, value=v) for f, v in values)
+
+    ProductFacet.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0027_homepageheroimage_link_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('size', 'Размер'), ('metal', 'Металл'), ('material', 'Материал'), ('stone_option', 'Камни'), ('material_type', 'Материалы'), ('coverage', 'Покрытие'), ('color', 'Цвет')], max_length=20)),
+                ('value', models.CharField(max_length=200)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='catalog.product')),
+            ],
+            options={
+                'verbose_name': 'Фасет товара',
+                'verbose_name_plural': 'Фасеты товаров',
+            },
+        ),
+        migrations.DeleteModel(
+            name='HeroBlock',
+        ),
+        migrations.AddIndex(
+            model_name='productfacet',
+            index=models.Index(fields=['facet', 'value'], name='catalog_facet_value_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productfacet',
+            unique_together={('product', 'facet', 'value')},
+        ),
+        migrations.RunPython(backfill_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 6.0 on 2026-10-17 20:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_sizes(apps, schema_editor):
+    Product = apps.get_model('catalog', 'Product')
+    ProductSize = apps.get_model('catalog', 'ProductSize')
+    ProductFacet = apps.get_model('catalog', 'ProductFacet')
+
+    rows = []
+    for product in Product.objects.only('id', 'size', 'size_stock').iterator():
+        sizes = {}
+        size_stock = product.size_stock if isinstance(product.size_stock, dict) else {}
+        if size_stock:
+            for size, qty in size_stock.items():
+                size = str(size).strip()[:50]
+                try:
+                    qty = max(int(qty), 0) if qty is not None else None
+                except (TypeError, ValueError):
+                    continue
+                if size:
+                    sizes[size] = qty
+        else:
+            for size in str(product.size or '').split(','):
+                size = size.strip()[:50]
+                if size:
+                    sizes[size] = None
+        rows.extend(ProductSize(product_id=product.pk, size=s, quantity=q) for s, q in sizes.items())
+
+    ProductSize.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+    # Sizes are no longer part of the generic facet index.
+    ProductFacet.objects.filter(facet='size').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0028_product_facet'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productfacet',
+            name='facet',
+            field=models.CharField(choices=[('metal', 'Металл'), ('material', 'Материал'), ('stone_option', 'Камни'), ('material_type', 'Материалы'), ('coverage', 'Покрытие'), ('color', 'Цвет')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ProductSize',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(max_length=50)),
+                ('quantity', models.PositiveIntegerField(blank=True, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sizes', to='catalog.product')),
+            ],
+            options={
+                'verbose_name': 'Размер товара',
+                'verbose_name_plural': 'Размеры товаров',
+                'indexes': [models.Index(fields=['size', 'quantity'], name='catalog_size_quantity_idx')],
+                'unique_together': {('product', 'size')},
+            },
+        ),
+        migrations.RunPython(backfill_sizes, migrations.RunPython.noop),
+    ]
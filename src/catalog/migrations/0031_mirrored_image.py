@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-17 20:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0030_product_import_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MirroredImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500, unique=True)),
+                ('file', models.FileField(blank=True, max_length=200, upload_to='')),
+                ('sha256', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('etag', models.CharField(blank=True, max_length=200)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('fetched_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Копия фото',
+                'verbose_name_plural': 'Копии фото',
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='main_image_mirror',
+            field=models.FileField(blank=True, editable=False, max_length=200, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_mirror',
+            field=models.FileField(blank=True, editable=False, max_length=200, upload_to=''),
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 6.0 on 2026-10-17 22:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+POSTGRES_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE catalog_productsearch ADD COLUMN vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', names), 'A') || setweight(to_tsvector('simple', details), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX catalog_search_vector_idx ON catalog_productsearch USING gin (vector)",
+    "CREATE INDEX catalog_search_names_trgm_idx ON catalog_productsearch USING gin (names gin_trgm_ops)",
+]
+POSTGRES_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS catalog_search_names_trgm_idx",
+    "DROP INDEX IF EXISTS catalog_search_vector_idx",
+    "ALTER TABLE catalog_productsearch DROP COLUMN IF EXISTS vector",
+]
+
+# FTS5 copy of catalog_productsearch (rowid = product id), maintained by triggers
+SQLITE_SQL = [
+    """
+    CREATE VIRTUAL TABLE catalog_productsearch_fts
+    USING fts5(names, details, tokenize = 'unicode61 remove_diacritics 2')
+    """,
+    """
+    CREATE TRIGGER catalog_productsearch_ai AFTER INSERT ON catalog_productsearch BEGIN
+        INSERT INTO catalog_productsearch_fts (rowid, names, details) VALUES (new.product_id, new.names, new.details);
+    END
+    """,
+    """
+    CREATE TRIGGER catalog_productsearch_ad AFTER DELETE ON catalog_productsearch BEGIN
+        DELETE FROM catalog_productsearch_fts WHERE rowid = old.product_id;
+    END
+    """,
+    """
+    CREATE TRIGGER catalog_productsearch_au AFTER UPDATE ON catalog_productsearch BEGIN
+        DELETE FROM catalog_productsearch_fts WHERE rowid = old.product_id;
+        INSERT INTO catalog_productsearch_fts (rowid, names, details) VALUES (new.product_id, new.names, new.details);
+    END
+    """,
+]
+SQLITE_REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS catalog_productsearch_au",
+    "DROP TRIGGER IF EXISTS catalog_productsearch_ad",
+    "DROP TRIGGER IF EXISTS catalog_productsearch_ai",
+    "DROP TABLE IF EXISTS catalog_productsearch_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(sql)
+    return run
+
+
+def backfill_search(apps, schema_editor):
+    from catalog.search import document
+
+    Product = apps.get_model('catalog', 'Product')
+    ProductSearch = apps.get_model('catalog', 'ProductSearch')
+
+    rows = []
+    for product in Product.objects.select_related('brand_ref', 'category').prefetch_related('collections').iterator(chunk_size=500):
+        names, details = document(
+            title=product.title,
+            brand=product.brand_ref.name if product.brand_ref else product.brand,
+            article=product.article,
+            category=product.category.name if product.category else '',
+            collections=sorted(c.name for c in product.collections.all()),
+            metal=product.metal,
+            material=product.material,
+        )
+        rows.append(ProductSearch(product_id=product.pk, names=names, details=details))
+    ProductSearch.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0032_image_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearch',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search', serialize=False, to='catalog.product')),
+                ('names', models.TextField(blank=True)),
+                ('details', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Поисковый индекс товара',
+                'verbose_name_plural': 'Поисковый индекс товаров',
+            },
+        ),
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_SQL, 'sqlite': SQLITE_SQL}),
+            _run({'postgresql': POSTGRES_REVERSE_SQL, 'sqlite': SQLITE_REVERSE_SQL}),
+        ),
+        migrations.RunPython(backfill_search, migrations.RunPython.noop),
+    ]
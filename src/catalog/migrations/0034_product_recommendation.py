@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-17 22:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0033_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation', serialize=False, to='catalog.product')),
+                ('related', models.JSONField(blank=True, default=list)),
+                ('complementary', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Рекомендации товара',
+                'verbose_name_plural': 'Рекомендации товаров',
+            },
+        ),
+    ]
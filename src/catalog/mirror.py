@@ -0,0 +1,169 @@
+"""
+Mirrors remote product images (Product.main_image_url, ProductImage.image_url)
+into media storage so pages stop hotlinking Google Drive.
+
+Downloads run in a thread pool; the workers only do HTTP and hashing, every
+database write and storage save happens in the calling thread. Files are
+stored under the SHA-256 of their content, so identical images fetched from
+different URLs share one file; each new file gets its srcset sizes built
+(catalog.derivatives). URLs that already have a mirror are skipped; with
+refresh=True they are revalidated with If-None-Match instead.
+"""
+import hashlib
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from . import derivatives
+from .cache import bump
+from .models import MirroredImage, Product, ProductImage
+
+WORKERS = 8
+# Larger responses are not product photos
+MAX_BYTES = 20 * 1024 * 1024
+CHUNK_SIZE = 500
+
+
+def remote_urls():
+    """Every distinct http(s) image URL the catalog points at."""
+    urls = set(Product.objects.exclude(main_image_url='').values_list('main_image_url', flat=True))
+    urls.update(ProductImage.objects.exclude(image_url='').values_list('image_url', flat=True))
+    return {url for url in urls if url.startswith(('http://', 'https://'))}
+
+
+def mirrored_files(urls):
+    """{url: stored file name} of the given URLs that have a local copy."""
+    urls = list(urls)
+    files = {}
+    for start in range(0, len(urls), CHUNK_SIZE):
+        files.update(
+            MirroredImage.objects.filter(url__in=urls[start:start + CHUNK_SIZE])
+            .exclude(file='').values_list('url', 'file')
+        )
+    return files
+
+
+def storage_name(sha256, content_type):
+    ext = mimetypes.guess_extension(content_type) or ''
+    return f'mirror/{sha256[:2]}/{sha256}{ext}'
+
+
+def fetch(url, etag='', timeout=30):
+    """
+    Downloads one image (in a worker thread, no database access). Returns a
+    dict with the body and its hash, or {'not_modified': True} on a 304.
+    """
+    headers = {'If-None-Match': etag} if etag else {}
+    with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return {'not_modified': True}
+        response.raise_for_status()
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith('image/'):
+            raise ValueError(f'Not an image: {content_type or "no Content-Type"}')
+
+        digest = hashlib.sha256()
+        body = bytearray()
+        for chunk in response.iter_content(64 * 1024):
+            body.extend(chunk)
+            if len(body) > MAX_BYTES:
+                raise ValueError(f'Larger than {MAX_BYTES} bytes')
+            digest.update(chunk)
+
+    return {
+        'not_modified': False,
+        'body': bytes(body),
+        'sha256': digest.hexdigest(),
+        'etag': response.headers.get('ETag', ''),
+        'content_type': content_type,
+    }
+
+
+def store(result):
+    """Saves a fetched body under its content hash; returns (name, written)."""
+    name = storage_name(result['sha256'], result['content_type'])
+    if default_storage.exists(name):
+        return name, False
+    saved = default_storage.save(name, ContentFile(result['body']))
+    return saved, True
+
+
+def mirror_images(urls=None, workers=WORKERS, refresh=False, timeout=30):
+    """
+    Mirrors `urls` (default: every remote catalog image) and points the
+    products at their local copies. Returns counts per outcome.
+    """
+    counts = {'downloaded': 0, 'reused': 0, 'not_modified': 0, 'skipped': 0, 'failed': 0, 'linked': 0}
+    urls = remote_urls() if urls is None else set(urls)
+    known = {m.url: m for m in MirroredImage.objects.all()}
+
+    todo = []
+    for url in sorted(urls):
+        record = known.get(url)
+        if record and record.file and not refresh:
+            counts['skipped'] += 1
+        else:
+            todo.append(url)
+
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            futures = {}
+            for url in todo:
+                record = known.get(url)
+                etag = record.etag if record and record.file else ''
+                futures[pool.submit(fetch, url, etag, timeout)] = url
+
+            for future in as_completed(futures):
+                # Dropped once handled: a finished future holds the whole downloaded body
+                url = futures.pop(future)
+                record = known.get(url) or MirroredImage(url=url)
+                record.fetched_at = timezone.now()
+                try:
+                    result = future.result()
+                except Exception as e:
+                    record.error = str(e)[:1000]
+                    record.save()
+                    counts['failed'] += 1
+                    continue
+
+                if result['not_modified']:
+                    counts['not_modified'] += 1
+                else:
+                    name, written = store(result)
+                    counts['downloaded' if written else 'reused'] += 1
+                    derivatives.ensure(name)
+                    record.file = name
+                    record.sha256 = result['sha256']
+                    record.etag = result['etag'][:200]
+                    record.content_type = result['content_type']
+                    record.size = len(result['body'])
+                record.error = ''
+                record.save()
+
+    counts['linked'] = link_mirrors()
+    if counts['linked']:
+        bump('catalog')
+    return counts
+
+
+def link_mirrors():
+    """Points Product/ProductImage rows at the mirror of their current URL; returns rows changed."""
+    files = dict(MirroredImage.objects.exclude(file='').values_list('url', 'file'))
+    changed = 0
+    for model, url_field, file_field in (
+        (Product, 'main_image_url', 'main_image_mirror'),
+        (ProductImage, 'image_url', 'image_mirror'),
+    ):
+        stale = [
+            model(pk=pk, **{file_field: files.get(url, '')})
+            for pk, url, current in
+            model.objects.exclude(**{url_field: '', file_field: ''}).values_list('pk', url_field, file_field)
+            if (current or '') != files.get(url, '')
+        ]
+        model.objects.bulk_update(stale, [file_field], batch_size=CHUNK_SIZE)
+        changed += len(stale)
+    return changed
@@ -35,7 +35,25 @@ class Collection(models.Model):
     return self.name
 
 
-class Product(models.Model):
+class ImageMetadata(models.Model):
+  """
+  What catalog.placeholders learned about the image a row renders: its
+  intrinsic size, dominant colour, a tiny blurred preview as a data URI and
+  whether it could be loaded at all (None until checked). `image_key` is the
+  URL or file name it describes, so a changed image gets described again.
+  """
+  image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+  image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+  image_color = models.CharField(max_length=7, blank=True, editable=False)
+  image_placeholder = models.TextField(blank=True, editable=False)
+  image_ok = models.BooleanField(null=True, editable=False)
+  image_key = models.CharField(max_length=500, blank=True, editable=False)
+
+  class Meta:
+    abstract = True
+
+
+class Product(ImageMetadata):
   category = models.ForeignKey(Category, related_name='products', on_delete=models.SET_NULL, null=True, blank=True)
   collections = models.ManyToManyField(Collection, related_name='products', blank=True)
   brand_ref = models.ForeignKey('Brand', related_name='products', on_delete=models.SET_NULL, null=True, blank=True)
@@ -77,14 +95,22 @@ class Product(models.Model):
   is_active = models.BooleanField(default=True)
   main_image = models.ImageField(upload_to='products/', blank=True, null=True, verbose_name='Главное фото (файл)')
   main_image_url = models.URLField(max_length=500, blank=True, verbose_name='Главное фото (ссылка)', help_text='Или укажите URL изображения вместо загрузки файла')
+  # Local copy of main_image_url, filled by catalog.mirror
+  main_image_mirror = models.FileField(max_length=200, blank=True, editable=False)
   related_colors = models.ManyToManyField('self', blank=True, symmetrical=False, verbose_name="Варианты (другие цвета)")
   created_at = models.DateTimeField(auto_now_add=True)
   updated_at = models.DateTimeField(auto_now=True)
+  # Hash of the sheet row this product was last imported from (see import_google_sheet)
+  import_hash = models.CharField(max_length=64, blank=True, editable=False)
 
   class Meta:
     verbose_name = 'Товар'
     verbose_name_plural = 'Товары'
     ordering = ['-created_at']
+    indexes = [
+      # Catalog listing order; keyset pages (catalog.pagination) are range scans on it
+      models.Index(fields=['is_active', '-created_at', '-id'], name='catalog_product_feed_idx'),
+    ]
 
   def __str__(self):
     return self.title
@@ -109,6 +135,13 @@ class Product(models.Model):
         pass
     super().save(*args, **kwargs)
 
+    from .facets import sync_product_facets
+    from .search import sync_product_search
+    from .stock import sync_product_sizes
+    sync_product_sizes(self)
+    sync_product_facets(self)
+    sync_product_search(self)
+
   @property
   def size_stock_map(self):
     """
@@ -131,8 +164,10 @@ class Product(models.Model):
 
   @property
   def get_main_image_url(self):
-    """Returns the main image URL - from URL field or uploaded file"""
+    """Returns the main image URL - from URL field (its local mirror when there is one) or uploaded file"""
     if self.main_image_url:
+      if self.main_image_mirror:
+        return self.main_image_mirror.url
       return self.main_image_url
     try:
       if self.main_image:
@@ -169,10 +204,153 @@ class Product(models.Model):
     return self.price
 
 
-class ProductImage(models.Model):
+class ProductSize(models.Model):
+  """
+  Per-size stock row, kept in sync with Product.size_stock by catalog.stock.
+  quantity is None for legacy sizes listed in Product.size without tracked stock.
+  """
+  product = models.ForeignKey(Product, related_name='sizes', on_delete=models.CASCADE)
+  size = models.CharField(max_length=50)
+  quantity = models.PositiveIntegerField(null=True, blank=True)
+
+  class Meta:
+    verbose_name = 'Размер товара'
+    verbose_name_plural = 'Размеры товаров'
+    unique_together = ('product', 'size')
+    indexes = [
+      models.Index(fields=['size', 'quantity'], name='catalog_size_quantity_idx'),
+    ]
+
+  def __str__(self):
+    return f'{self.product_id}: {self.size}={self.quantity}'
+
+
+class ProductFacet(models.Model):
+  """Normalized facet value of a product, maintained by catalog.facets."""
+  FACET_CHOICES = (
+    ('metal', 'Металл'),
+    ('material', 'Материал'),
+    ('stone_option', 'Камни'),
+    ('material_type', 'Материалы'),
+    ('coverage', 'Покрытие'),
+    ('color', 'Цвет'),
+  )
+
+  product = models.ForeignKey(Product, related_name='facets', on_delete=models.CASCADE)
+  facet = models.CharField(max_length=20, choices=FACET_CHOICES)
+  value = models.CharField(max_length=200)
+
+  class Meta:
+    verbose_name = 'Фасет товара'
+    verbose_name_plural = 'Фасеты товаров'
+    unique_together = ('product', 'facet', 'value')
+    indexes = [
+      models.Index(fields=['facet', 'value'], name='catalog_facet_value_idx'),
+    ]
+
+  def __str__(self):
+    return f'{self.facet}={self.value}'
+
+
+class ProductSearch(models.Model):
+  """
+  Search document of a product, maintained by catalog.search. The database
+  specific index on top of it (tsvector + trigram on PostgreSQL, FTS5 on
+  SQLite) is created by migration 0033.
+  """
+  product = models.OneToOneField(Product, related_name='search', on_delete=models.CASCADE, primary_key=True)
+  # Title, brand and article: ranked above the rest
+  names = models.TextField(blank=True)
+  # Category, collections, metal, material
+  details = models.TextField(blank=True)
+
+  class Meta:
+    verbose_name = 'Поисковый индекс товара'
+    verbose_name_plural = 'Поисковый индекс товаров'
+
+  def __str__(self):
+    return self.names
+
+
+class ProductRecommendation(models.Model):
+  """
+  Ranked product ids for the detail page, built by catalog.recommendations:
+  `related` share the category, `complementary` ("Complete the Look") come
+  from other categories.
+  """
+  product = models.OneToOneField(Product, related_name='recommendation', on_delete=models.CASCADE, primary_key=True)
+  related = models.JSONField(default=list, blank=True)
+  complementary = models.JSONField(default=list, blank=True)
+  updated_at = models.DateTimeField(auto_now=True)
+
+  class Meta:
+    verbose_name = 'Рекомендации товара'
+    verbose_name_plural = 'Рекомендации товаров'
+
+  def __str__(self):
+    return f'{self.product_id}: {len(self.related)} + {len(self.complementary)}'
+
+
+class CoPurchase(models.Model):
+  """
+  One cell of the co-purchase matrix built by catalog.copurchase: orders
+  that contained both products (one row per direction). Each order adds
+  2 ** (its age in half-lives since copurchase.EPOCH) to `weight`, so newer
+  orders count for more without old rows ever being rewritten.
+  """
+  product = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+  other = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+  weight = models.FloatField(default=0)
+  orders = models.PositiveIntegerField(default=0)
+
+  class Meta:
+    verbose_name = 'Совместная покупка'
+    verbose_name_plural = 'Совместные покупки'
+    constraints = [
+      models.UniqueConstraint(fields=['product', 'other'], name='catalog_copurchase_unique_pair'),
+    ]
+    indexes = [
+      models.Index(fields=['product', '-weight'], name='catalog_copurchase_rank_idx'),
+    ]
+
+  def __str__(self):
+    return f'{self.product_id} + {self.other_id}: {self.orders}'
+
+
+class BoughtTogether(models.Model):
+  """The strongest CoPurchase neighbours of a product: [[product id, weight], ...], best first."""
+  product = models.OneToOneField(Product, related_name='bought_together', on_delete=models.CASCADE, primary_key=True)
+  neighbors = models.JSONField(default=list, blank=True)
+  updated_at = models.DateTimeField(auto_now=True)
+
+  class Meta:
+    verbose_name = 'Покупают вместе'
+    verbose_name_plural = 'Покупают вместе'
+
+  def __str__(self):
+    return f'{self.product_id}: {len(self.neighbors)}'
+
+
+class CoPurchaseWatermark(models.Model):
+  """The last order of each source folded into CoPurchase (incremental runs start after it)."""
+  source = models.CharField(max_length=50, unique=True)
+  last_order_id = models.PositiveBigIntegerField(default=0)
+  updated_at = models.DateTimeField(auto_now=True)
+
+  class Meta:
+    verbose_name = 'Отметка совместных покупок'
+    verbose_name_plural = 'Отметки совместных покупок'
+
+  def __str__(self):
+    return f'{self.source}: {self.last_order_id}'
+
+
+class ProductImage(ImageMetadata):
   product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE)
   image = models.ImageField(upload_to='products/gallery/', blank=True, null=True, verbose_name='Фото (файл)')
   image_url = models.URLField(max_length=500, blank=True, verbose_name='Фото (ссылка)', help_text='Или укажите URL изображения вместо загрузки файла')
+  # Local copy of image_url, filled by catalog.mirror
+  image_mirror = models.FileField(max_length=200, blank=True, editable=False)
   alt = models.CharField(max_length=200, blank=True)
   sort_order = models.PositiveIntegerField(default=0)
 
@@ -186,8 +364,10 @@ class ProductImage(models.Model):
 
   @property
   def get_image_url(self):
-    """Returns the image URL - from URL field or uploaded file"""
+    """Returns the image URL - from URL field (its local mirror when there is one) or uploaded file"""
     if self.image_url:
+      if self.image_mirror:
+        return self.image_mirror.url
       return self.image_url
     try:
       if self.image:
@@ -202,6 +382,29 @@ class ProductImage(models.Model):
     return bool(self.image_url or self.image)
 
 
+class MirroredImage(models.Model):
+  """
+  A remote product image copied into media storage by catalog.mirror.
+  Files are named by the SHA-256 of their content, so URLs serving the same
+  bytes share one file.
+  """
+  url = models.URLField(max_length=500, unique=True)
+  file = models.FileField(max_length=200, blank=True)
+  sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+  etag = models.CharField(max_length=200, blank=True)
+  content_type = models.CharField(max_length=100, blank=True)
+  size = models.PositiveIntegerField(default=0)
+  error = models.TextField(blank=True)
+  fetched_at = models.DateTimeField(null=True, blank=True)
+
+  class Meta:
+    verbose_name = 'Копия фото'
+    verbose_name_plural = 'Копии фото'
+
+  def __str__(self):
+    return self.url
+
+
 class Brand(models.Model):
   name = models.CharField(max_length=200, unique=True)
   slug = models.SlugField(max_length=220, unique=True, blank=True)
@@ -231,7 +434,7 @@ class Brand(models.Model):
     return self.products.filter(is_active=True)
 
 
-class HomepageBlock(models.Model):
+class HomepageBlock(ImageMetadata):
     BLOCK_TYPES = (
         ('hero', 'Главный Hero'),
         ('brand', 'Блок Бренда'),
@@ -259,7 +462,7 @@ class HomepageBlock(models.Model):
         return f"{self.get_block_type_display()}: {self.title or self.brand}"
 
 
-class HomepageHeroImage(models.Model):
+class HomepageHeroImage(ImageMetadata):
     block = models.ForeignKey(
         HomepageBlock,
         on_delete=models.CASCADE,
@@ -0,0 +1,73 @@
+"""
+Keyset (cursor) pagination of product listings, newest first.
+
+A cursor is the (created_at, id) of the last product already shown; the
+next page is the products strictly after it in ('-created_at', '-id')
+order. Each page is one indexed range query of `size + 1` rows, the extra
+row only telling whether there is more. Unlike Paginator there is no
+COUNT(*) and no OFFSET, so page 100 costs the same as page 1.
+
+    products, cursor = keyset_page(queryset, request.GET.get('cursor'), 12)
+
+Numbered pages (the catalog page without JavaScript) still use Django's
+Paginator; CountedPaginator takes a count that is already known, e.g.
+from the cache, instead of running COUNT(*) again.
+"""
+import base64
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+ORDERING = ('-created_at', '-id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(product):
+    raw = f'{product.created_at.isoformat()}|{product.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) of a cursor made by encode_cursor; raises InvalidCursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        created_at = datetime.fromisoformat(created_at)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(cursor) from e
+    if created_at.tzinfo is None:
+        raise InvalidCursor(cursor)
+    return created_at, pk
+
+
+def after(queryset, cursor):
+    """Products of `queryset` that come after the cursor, in ORDERING."""
+    queryset = queryset.order_by(*ORDERING)
+    if not cursor:
+        return queryset
+    created_at, pk = decode_cursor(cursor)
+    return queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+
+def keyset_page(queryset, cursor=None, size=12):
+    """(products, cursor of the next page or None)."""
+    products = list(after(queryset, cursor)[:size + 1])
+    if len(products) <= size:
+        return products, None
+    products = products[:size]
+    return products, encode_cursor(products[-1])
+
+
+class CountedPaginator(Paginator):
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._count = count
+
+    @property
+    def count(self):
+        return self._count
@@ -0,0 +1,195 @@
+"""
+Image metadata for layout and placeholders (see models.ImageMetadata).
+
+For every image a listing renders we store its intrinsic width/height (so
+the <img> reserves its box), the dominant colour and a 16px preview as a
+data URI (painted as the background until the real image arrives), and
+whether it could be loaded at all (templates skip known-broken URLs instead
+of waiting for `onerror`). Local files are described when a row is saved
+(see catalog.signals); remote URLs and everything else by the
+describe_images command, which fetches in a thread pool.
+"""
+import base64
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import requests
+from django.apps import apps
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from .cache import bump
+from .mirror import WORKERS, fetch
+
+PREVIEW_SIZE = 16
+CHUNK_SIZE = 500
+
+# Model -> (remote URL field, mirror field, file field); the URL wins when set
+SOURCES = {
+    'catalog.Product': ('main_image_url', 'main_image_mirror', 'main_image'),
+    'catalog.ProductImage': ('image_url', 'image_mirror', 'image'),
+    'catalog.HomepageBlock': (None, None, 'image'),
+    'catalog.HomepageHeroImage': (None, None, 'image'),
+}
+FIELDS = ('image_width', 'image_height', 'image_color', 'image_placeholder', 'image_ok', 'image_key')
+UNKNOWN = {'image_width': None, 'image_height': None, 'image_color': '', 'image_placeholder': '', 'image_ok': None}
+
+
+def source(label, values):
+    """
+    (key, local file name, remote URL) of the image a row shows, from a dict
+    of its SOURCES fields. The key is '' when there is no image.
+    """
+    url_field, mirror_field, file_field = SOURCES[label]
+    url = (values.get(url_field) or '') if url_field else ''
+    if url:
+        mirror = str(values.get(mirror_field) or '')
+        return url, mirror or None, None if mirror else url
+    name = str(values.get(file_field) or '')
+    return name, name or None, None
+
+
+def instance_source(instance):
+    label = instance._meta.label
+    return source(label, {field: getattr(instance, field) for field in SOURCES[label] if field})
+
+
+def describe_image(image):
+    """Metadata of an open PIL image (orientation from EXIF applied)."""
+    image = ImageOps.exif_transpose(image)
+    width, height = image.size
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        rgba = image.convert('RGBA')
+        image = Image.new('RGB', image.size, (255, 255, 255))
+        image.paste(rgba, mask=rgba.split()[-1])
+    else:
+        image = image.convert('RGB')
+    image.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE), Image.BOX)
+
+    palette = image.quantize(colors=4)
+    _, index = max(palette.getcolors())
+    r, g, b = palette.getpalette()[index * 3:index * 3 + 3]
+
+    buffer = BytesIO()
+    if features.check_module('webp'):
+        image.save(buffer, 'WEBP', quality=30)
+        mime = 'image/webp'
+    else:
+        image.save(buffer, 'JPEG', quality=40)
+        mime = 'image/jpeg'
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_color': f'#{r:02x}{g:02x}{b:02x}',
+        'image_placeholder': f'data:{mime};base64,{base64.b64encode(buffer.getvalue()).decode("ascii")}',
+        'image_ok': True,
+    }
+
+
+def describe(key, name=None, url=None, timeout=10):
+    """
+    Metadata for a stored file `name` or a remote `url` (read over HTTP, so
+    only call this off the request path for URLs). Safe to run in a worker
+    thread: no database access. Missing or unreadable images get
+    image_ok=False; network trouble (timeouts, 5xx) leaves them unknown, so
+    the next run tries again instead of hiding a working image.
+    """
+    if not key:
+        return dict(UNKNOWN, image_key='')
+    try:
+        if name:
+            with default_storage.open(name, 'rb') as f:
+                with Image.open(f) as image:
+                    image.load()
+                    meta = describe_image(image)
+        else:
+            result = fetch(url, timeout=timeout)
+            with Image.open(BytesIO(result['body'])) as image:
+                image.load()
+                meta = describe_image(image)
+    except (requests.ConnectionError, requests.Timeout):
+        return dict(UNKNOWN, image_key='')
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code >= 500:
+            return dict(UNKNOWN, image_key='')
+        meta = dict(UNKNOWN, image_ok=False)
+    except Exception:
+        meta = dict(UNKNOWN, image_ok=False)
+    meta['image_key'] = key
+    return meta
+
+
+def refresh(instance):
+    """
+    Brings a saved row's metadata up to date when its image changed. Local
+    files are described right away; a new remote URL only has the old values
+    cleared (describe_images fetches it). Returns True when anything changed.
+    """
+    key, name, url = instance_source(instance)
+    if instance.image_key == key and (instance.image_ok is not None or not key):
+        return False
+    if name or not key:
+        meta = describe(key, name)
+    else:
+        meta = dict(UNKNOWN, image_key='')
+    if all(getattr(instance, field) == value for field, value in meta.items()):
+        return False
+    for field, value in meta.items():
+        setattr(instance, field, value)
+    # update() instead of save(): no second round of post_save handlers
+    type(instance).objects.filter(pk=instance.pk).update(**meta)
+    return True
+
+
+def pending(label, everything=False):
+    """{(key, name, url): [pk, ...]} of the rows of a model whose metadata is missing or stale."""
+    model = apps.get_model(label)
+    fields = [field for field in SOURCES[label] if field]
+    todo = {}
+    for row in model.objects.values('pk', 'image_key', 'image_ok', *fields).iterator(chunk_size=CHUNK_SIZE):
+        src = source(label, row)
+        if not src[0]:
+            continue
+        if everything or row['image_key'] != src[0] or row['image_ok'] is None:
+            todo.setdefault(src, []).append(row['pk'])
+    return todo
+
+
+def describe_images(workers=WORKERS, everything=False, timeout=10):
+    """
+    Describes every image whose metadata is missing or stale (all of them
+    with `everything`), each distinct file/URL once. Returns counts.
+    """
+    counts = {'described': 0, 'broken': 0, 'unreachable': 0, 'rows': 0}
+    todo = {label: pending(label, everything) for label in SOURCES}
+    sources = sorted({src for rows in todo.values() for src in rows})
+    if not sources:
+        return counts
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        results = dict(zip(sources, pool.map(lambda src: describe(*src, timeout=timeout), sources)))
+    for meta in results.values():
+        counts[{True: 'described', False: 'broken', None: 'unreachable'}[meta['image_ok']]] += 1
+
+    for label, rows in todo.items():
+        model = apps.get_model(label)
+        objs = [model(pk=pk, **results[src]) for src, pks in rows.items() for pk in pks]
+        model.objects.bulk_update(objs, FIELDS, batch_size=CHUNK_SIZE)
+        counts['rows'] += len(objs)
+    bump('catalog', 'homepage')
+    return counts
+
+
+def described(keys):
+    """{key: metadata} already known for image URLs/names (importers reuse it for rewritten rows)."""
+    keys = list(keys)
+    known = {}
+    for label in ('catalog.Product', 'catalog.ProductImage'):
+        model = apps.get_model(label)
+        for start in range(0, len(keys), CHUNK_SIZE):
+            for row in (
+                model.objects.filter(image_key__in=keys[start:start + CHUNK_SIZE], image_ok__isnull=False)
+                .values(*FIELDS)
+            ):
+                known.setdefault(row['image_key'], row)
+    return known
@@ -0,0 +1,166 @@
+"""
+Canonical catalog listing queries (CatalogView, CatalogProductsView).
+
+CatalogQuery.from_params reads the sidebar filters from a query string. It
+drops the empty and 'None' values url_replace can leave behind, removes
+duplicates, sorts what is left and normalizes prices, so
+"?metal=Золото&brand=A&brand=A" and "?brand=A&metal=Золото" are one query.
+Equal queries compare and hash alike and share `key`, which the views put
+in catalog.cache keys. Every visitor who picks the same filters then reads
+one cached result page, facet block and price range until the next catalog
+change, or a product running out or coming back, bumps a version.
+
+    query = CatalogQuery.from_params(request.GET)
+    summary = cached(CACHE_NAMESPACES, query.cache_name('summary'), query.summary)
+"""
+import hashlib
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Max, Min, Q
+from django.utils.functional import cached_property
+from django.utils.http import urlencode
+
+from .facets import collection_filter, facet_counts, facet_filter
+from .models import Product
+from .pagination import ORDERING
+from .stock import in_stock_filter, size_filter
+
+# Multi-valued GET parameters of the catalog sidebar and the Q each one builds.
+# Multi-valued relations are applied as id subqueries so the queryset never
+# needs .distinct() and facet counts can drop one dimension at a time.
+# Dimensions counted from ProductFacet are filtered through it as well, so
+# a filter matches exactly the normalized values its count was taken from.
+FILTERS = (
+    ('category', lambda values: Q(category__slug__in=values)),
+    ('brand', lambda values: Q(brand_ref__name__in=values)),
+    # Collections are filtered by slug
+    ('collection', lambda values: Q(id__in=collection_filter(values))),
+    ('gender', lambda values: Q(gender__in=values)),
+    ('size', lambda values: Q(id__in=size_filter(values))),
+    ('metal', lambda values: Q(id__in=facet_filter('metal', values))),
+    ('material', lambda values: Q(id__in=facet_filter('material', values))),
+    ('material_type', lambda values: Q(id__in=facet_filter('material_type', values))),
+    ('stone_option', lambda values: Q(id__in=facet_filter('stone_option', values))),
+    ('coverage', lambda values: Q(id__in=facet_filter('coverage', values))),
+    ('color', lambda values: Q(id__in=facet_filter('color', values))),
+)
+DIMENSIONS = tuple(dimension for dimension, _ in FILTERS)
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+# Listings show what is in stock, so their cache keys follow both versions
+CACHE_NAMESPACES = ('catalog', 'stock')
+
+
+def _clean(values):
+    """Sorted distinct values, without the empty and 'None' ones url_replace can leave."""
+    return tuple(sorted({v for v in values if v and v != 'None'}))
+
+
+def _price(raw):
+    """A price bound as a plain decimal string ('1000', '99.5'), or None when missing or invalid."""
+    try:
+        value = Decimal(str(raw or '').strip())
+    except InvalidOperation:
+        return None
+    # Product.price has 12 digits; anything beyond that is noise (or "1e999999")
+    if not value.is_finite() or abs(value.adjusted()) > 12:
+        return None
+    return format(value.normalize(), 'f')
+
+
+class CatalogQuery:
+    """The filters of one catalog listing, in canonical form."""
+
+    def __init__(self, values=None, in_stock=False, min_price=None, max_price=None):
+        values = values or {}
+        # Only the dimensions with a selection, in FILTERS order
+        cleaned = ((dimension, _clean(values.get(dimension) or ())) for dimension in DIMENSIONS)
+        self.values = {dimension: selected for dimension, selected in cleaned if selected}
+        self.in_stock = bool(in_stock)
+        self.min_price = _price(min_price)
+        self.max_price = _price(max_price)
+
+    @classmethod
+    def from_params(cls, params):
+        return cls(
+            values={dimension: params.getlist(dimension) for dimension in DIMENSIONS},
+            in_stock=str(params.get('in_stock')).lower() in TRUE_VALUES,
+            min_price=params.get('min_price'),
+            max_price=params.get('max_price'),
+        )
+
+    def canonical(self):
+        """((parameter, values), ...) with everything that affects the result, in a fixed order."""
+        items = list(self.values.items())
+        if self.in_stock:
+            items.append(('in_stock', ('1',)))
+        for name in ('min_price', 'max_price'):
+            if getattr(self, name) is not None:
+                items.append((name, (getattr(self, name),)))
+        return tuple(items)
+
+    def __eq__(self, other):
+        return isinstance(other, CatalogQuery) and self.canonical() == other.canonical()
+
+    def __hash__(self):
+        return hash(self.canonical())
+
+    def __repr__(self):
+        return f'<CatalogQuery {self.querystring() or "(all)"}>'
+
+    def querystring(self):
+        return urlencode(self.canonical(), doseq=True)
+
+    @cached_property
+    def key(self):
+        """Stable digest of the canonical query string, safe for any cache backend."""
+        return hashlib.sha1(self.querystring().encode()).hexdigest()
+
+    def cache_name(self, *parts):
+        return ':'.join(('listing', self.key, *parts))
+
+    def selected(self, dimension):
+        return self.values.get(dimension, ())
+
+    @cached_property
+    def filters(self):
+        """{sidebar dimension: Q} of the active filters."""
+        filters = {dimension: build(self.values[dimension]) for dimension, build in FILTERS if dimension in self.values}
+        if self.in_stock:
+            filters['in_stock'] = in_stock_filter()
+        price = Q()
+        if self.min_price is not None:
+            price &= Q(price__gte=Decimal(self.min_price))
+        if self.max_price is not None:
+            price &= Q(price__lte=Decimal(self.max_price))
+        if price:
+            filters['price'] = price
+        return filters
+
+    def queryset(self, without=None):
+        """Active products matching every filter except the one on dimension `without`, in one WHERE."""
+        conditions = [q for dimension, q in self.filters.items() if dimension != without]
+        return Product.objects.filter(*conditions, is_active=True)
+
+    def products(self):
+        """The listing itself: ordered, with what the product cards render loaded."""
+        return self.queryset().select_related('brand_ref').prefetch_related('collections').order_by(*ORDERING)
+
+    def summary(self):
+        """
+        What the sidebar and pagination need, as plain data for the cache:
+        per-value facet counts (each respecting the other filters), the price
+        range before the price filter itself, and the number of results.
+        """
+        price_range = self.queryset('price').aggregate(Min('price'), Max('price'))
+        price_min = price_max = None
+        if price_range['price__min'] is not None:
+            price_min = int(price_range['price__min'] or 0)
+            price_max = int(price_range['price__max'] or 0)
+        return {
+            'counts': facet_counts(self.queryset),
+            'price_min': price_min,
+            'price_max': price_max,
+            'total': self.queryset().count(),
+        }
@@ -0,0 +1,246 @@
+"""
+Precomputed recommendations for the product page (ProductRecommendation).
+
+For every active product we rank other active products by what they share
+with it: brand, collections, metal and materials, price band (prices
+within a factor of two), and how often the two were ordered together
+(the co-purchase index, see catalog.copurchase).
+Candidates from the same category become `related`; candidates from other
+categories become `complementary` ("Complete the Look"). Each list is
+filled up with the newest products when the shared traits run out. The
+detail page then reads one row by primary key instead of scanning the
+catalog.
+
+build_recommendations rebuilds everything (the build_recommendations
+command). update_recommendations recomputes a few products after they were
+saved (catalog.signals), imported or bought together with something new.
+It ranks them against a narrow candidate pool instead of the whole
+catalog: the newest POOL_SIZE active products of each of their categories,
+brands and collections, the newest products overall (the fill-up) and
+their co-purchases. It also recomputes the products whose lists include
+them and the ones in their new lists, so the change shows up on both sides.
+"""
+import math
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+
+from .copurchase import bought_together
+from .models import Product, ProductRecommendation
+
+LIMIT = 15
+CHUNK_SIZE = 500
+# Newest active products taken per category, brand and collection by update_recommendations
+POOL_SIZE = 500
+# Orders with the same pair (decayed, see catalog.copurchase) count up to this many times
+MAX_BOUGHT_TOGETHER = 3
+
+WEIGHTS = {
+    'related': {'brand': 3, 'collection': 2, 'metal': 1, 'material': 1, 'band': 2, 'bought': 5},
+    'complementary': {'brand': 2, 'collection': 3, 'metal': 2, 'material': 1, 'band': 1, 'bought': 5},
+}
+
+
+def _split(value):
+    return [part.strip().lower() for part in str(value or '').split(',') if part.strip()]
+
+
+def price_band(price):
+    """Prices in the same band are within a factor of two of each other."""
+    price = float(price or 0)
+    return int(math.log2(price)) if price >= 1 else 0
+
+
+def _batches(queryset, field, ids):
+    """`queryset` filtered on `field`__in the ids, CHUNK_SIZE at a time; all of it when ids is None."""
+    if ids is None:
+        return [queryset]
+    ids = sorted(ids)
+    return [queryset.filter(**{f'{field}__in': ids[start:start + CHUNK_SIZE]}) for start in range(0, len(ids), CHUNK_SIZE)]
+
+
+class Snapshot:
+    """
+    Traits of every active product, or of the active ones among
+    `product_ids`, loaded with a few queries, newest first.
+    """
+
+    def __init__(self, product_ids=None):
+        rows = sorted(
+            (
+                row
+                for batch in _batches(Product.objects.filter(is_active=True), 'pk', product_ids)
+                for row in batch.values_list('pk', 'created_at', 'category_id', 'brand_ref_id', 'metal', 'material', 'price')
+            ),
+            key=lambda row: (row[1], row[0]), reverse=True,
+        )
+        self.order = [row[0] for row in rows]
+        self.position = {pk: i for i, pk in enumerate(self.order)}
+        self.category = {row[0]: row[2] for row in rows}
+        self.traits = defaultdict(list)
+        for pk, _, _, brand_id, metal, material, price in rows:
+            if brand_id:
+                self.traits[pk].append(('brand', brand_id))
+            self.traits[pk].extend(('metal', value) for value in _split(metal))
+            self.traits[pk].extend(('material', value) for value in _split(material))
+            self.traits[pk].append(('band', price_band(price)))
+        links = Product.collections.through.objects.filter(product__is_active=True)
+        for batch in _batches(links, 'product_id', product_ids):
+            for pk, collection_id in batch.values_list('product_id', 'collection_id'):
+                self.traits[pk].append(('collection', collection_id))
+
+        self.postings = defaultdict(list)
+        self.by_category = defaultdict(list)
+        for pk in self.order:
+            for trait in self.traits[pk]:
+                self.postings[trait].append(pk)
+            self.by_category[self.category[pk]].append(pk)
+        self.bought = bought_together(product_ids=product_ids)
+
+    def rank(self, pk, kind):
+        """Ids recommended for product `pk`: kind is 'related' or 'complementary'."""
+        weights = WEIGHTS[kind]
+        category = self.category.get(pk)
+        wanted = (lambda other: self.category[other] == category) if kind == 'related' else \
+            (lambda other: self.category[other] != category)
+
+        scores = Counter()
+        for trait in self.traits.get(pk, ()):
+            weight = weights[trait[0]]
+            for other in self.postings[trait]:
+                scores[other] += weight
+        for other, n in self.bought.get(pk, {}).items():
+            if other in self.category:
+                scores[other] += weights['bought'] * min(n, MAX_BOUGHT_TOGETHER)
+        scores.pop(pk, None)
+
+        ranked = sorted(
+            (other for other in scores if wanted(other)), key=lambda other: (-scores[other], self.position[other]),
+        )
+        ranked = ranked[:LIMIT]
+        if len(ranked) < LIMIT:
+            # Newest products fill the rest
+            chosen = set(ranked)
+            pool = self.by_category[category] if kind == 'related' else self.order
+            for other in pool:
+                if len(ranked) >= LIMIT:
+                    break
+                if other != pk and other not in chosen and wanted(other):
+                    ranked.append(other)
+        return ranked
+
+    def row(self, pk):
+        return ProductRecommendation(
+            product_id=pk, related=self.rank(pk, 'related'), complementary=self.rank(pk, 'complementary'),
+        )
+
+
+def build_recommendations():
+    """Rebuilds the recommendations of every active product. Returns rows written."""
+    snapshot = Snapshot()
+    with transaction.atomic():
+        ProductRecommendation.objects.all().delete()
+        for start in range(0, len(snapshot.order), CHUNK_SIZE):
+            rows = [snapshot.row(pk) for pk in snapshot.order[start:start + CHUNK_SIZE]]
+            ProductRecommendation.objects.bulk_create(rows, batch_size=CHUNK_SIZE)
+    return len(snapshot.order)
+
+
+def candidates(product_ids):
+    """
+    Ids the given products are ranked against: the products themselves, the
+    newest POOL_SIZE active products sharing a category, brand or collection
+    with one of them, the newest POOL_SIZE overall and their co-purchases.
+    """
+    pool = set(product_ids)
+    targets = Product.objects.filter(pk__in=pool, is_active=True)
+    newest = Product.objects.filter(is_active=True).order_by('-created_at', '-pk').values_list('pk', flat=True)
+    pool.update(newest[:POOL_SIZE])
+    for category_id in set(targets.values_list('category_id', flat=True)):
+        pool.update(newest.filter(category_id=category_id)[:POOL_SIZE])
+    for brand_id in set(targets.exclude(brand_ref=None).values_list('brand_ref_id', flat=True)):
+        pool.update(newest.filter(brand_ref_id=brand_id)[:POOL_SIZE])
+    for collection_id in set(targets.exclude(collections=None).values_list('collections', flat=True)):
+        pool.update(newest.filter(collections=collection_id)[:POOL_SIZE])
+    for others in bought_together(product_ids=product_ids).values():
+        pool.update(others)
+    return pool
+
+
+def _listing_sql(expression, product_ids):
+    """SQL for the ids of ProductRecommendation rows whose lists contain any of the product ids."""
+    table = ProductRecommendation._meta.db_table
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    exists = ' OR '.join(
+        f'EXISTS (SELECT 1 FROM {expression.format(column=column)} WHERE value IN ({placeholders}))'
+        for column in ('related', 'complementary')
+    )
+    return f'SELECT product_id FROM {table} WHERE {exists}', [*product_ids, *product_ids]
+
+
+def listing(product_ids):
+    """Ids of the products whose recommendation lists include any of the given products."""
+    product_ids = sorted(product_ids)
+    found = set()
+    if connection.vendor in ('postgresql', 'sqlite'):
+        expression = {
+            'postgresql': '(SELECT value::int AS value FROM jsonb_array_elements_text({column})) elements',
+            'sqlite': 'json_each({column})',
+        }[connection.vendor]
+        with connection.cursor() as cursor:
+            for start in range(0, len(product_ids), CHUNK_SIZE):
+                cursor.execute(*_listing_sql(expression, product_ids[start:start + CHUNK_SIZE]))
+                found.update(row[0] for row in cursor.fetchall())
+        return found
+    wanted = set(product_ids)
+    for pk, related, complementary in (
+        ProductRecommendation.objects.values_list('product_id', 'related', 'complementary').iterator(chunk_size=2000)
+    ):
+        if wanted.intersection(related, complementary):
+            found.add(pk)
+    return found
+
+
+def _recompute(product_ids):
+    """{product id: fresh ProductRecommendation} of the active ones among the given products."""
+    if not product_ids:
+        return {}
+    snapshot = Snapshot(candidates(product_ids))
+    return {pk: snapshot.row(pk) for pk in product_ids if pk in snapshot.category}
+
+
+def update_recommendations(product_ids, neighbours=True):
+    """
+    Recomputes the given products against their candidates (inactive or
+    deleted ones lose their row). With `neighbours`, so are the products
+    whose lists include them and every product in their new lists (the ones
+    most likely to rank them now). Returns rows written.
+    """
+    product_ids = set(product_ids)
+    rows = _recompute(product_ids | (listing(product_ids) if neighbours else set()))
+    if neighbours:
+        members = {other for pk in product_ids if pk in rows for other in (*rows[pk].related, *rows[pk].complementary)}
+        rows.update(_recompute(members - set(rows)))
+
+    with transaction.atomic():
+        for batch in _batches(ProductRecommendation.objects.all(), 'product_id', product_ids | set(rows)):
+            batch.delete()
+        ProductRecommendation.objects.bulk_create(rows.values(), batch_size=CHUNK_SIZE)
+    return len(rows)
+
+
+def recommended(product, queryset=None):
+    """
+    (related, complementary) lists of active products for the detail page,
+    or None when the product has no precomputed row yet.
+    """
+    row = ProductRecommendation.objects.filter(product_id=product.pk).values_list('related', 'complementary').first()
+    if row is None:
+        return None
+    related, complementary = row
+    queryset = Product.objects.all() if queryset is None else queryset
+    products = queryset.filter(is_active=True).in_bulk(related + complementary)
+    return (
+        [products[pk] for pk in related if pk in products],
+        [products[pk] for pk in complementary if pk in products],
+    )
@@ -0,0 +1,72 @@
+"""
+Random product picks without ORDER BY RANDOM().
+
+Each worker keeps the ids of the products in a pool (all active products by
+default, or any filter such as one brand) and draws from that array in
+Python; only the drawn rows are fetched, by primary key. The arrays belong
+to the current 'catalog' cache version (see catalog.cache), so the next
+draw after an edit or import reloads them with one id-only query. A draw
+costs the same whether the catalog holds a hundred products or a hundred
+thousand.
+
+    random_products(4, queryset=Product.objects.prefetch_related('collections'))
+    random_products(8, within={'brand_ref_id': brand.pk}, exclude=[product.pk])
+"""
+import random
+import threading
+
+from .cache import version
+from .models import Product
+
+# Pools kept per worker; the least recently used is dropped beyond this
+MAX_POOLS = 64
+
+_pools = {}
+_pools_version = None
+_lock = threading.Lock()
+
+
+def _pool_key(within):
+    return tuple(sorted((within or {}).items()))
+
+
+def pool(within=None):
+    """Ids of the active products matching the `within` filter, for this catalog version."""
+    global _pools_version
+    key = _pool_key(within)
+    current = version('catalog')
+    with _lock:
+        if _pools_version != current:
+            _pools.clear()
+            _pools_version = current
+        ids = _pools.pop(key, None)
+    if ids is None:
+        ids = tuple(Product.objects.filter(is_active=True, **dict(key)).order_by().values_list('pk', flat=True))
+    with _lock:
+        if _pools_version == current:
+            _pools[key] = ids  # re-inserted last: dicts keep the recently used at the end
+            while len(_pools) > MAX_POOLS:
+                del _pools[next(iter(_pools))]
+    return ids
+
+
+def sample_ids(n, within=None, exclude=()):
+    """Up to `n` distinct random ids from a pool, none of them in `exclude`."""
+    ids = pool(within)
+    exclude = set(exclude)
+    picked = random.sample(ids, min(n + len(exclude), len(ids)))
+    return [pk for pk in picked if pk not in exclude][:n]
+
+
+def random_products(n, within=None, exclude=(), queryset=None):
+    """
+    Up to `n` random active products, in random order. `queryset` carries
+    select_related/prefetch_related for the caller's template.
+    """
+    ids = sample_ids(n, within, exclude)
+    if not ids:
+        return []
+    queryset = Product.objects.all() if queryset is None else queryset
+    # is_active again: a product hidden since the pool was loaded is skipped
+    products = queryset.filter(is_active=True).in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
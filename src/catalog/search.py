@@ -0,0 +1,210 @@
+"""
+Product search behind the header search box (SearchSuggestionsView).
+
+Every product has a ProductSearch row with two normalized texts: `names`
+(title, brand, article) and `details` (category, collections, metal,
+material). Each word is followed by its Latin transliteration, so
+"кольцо" is found by "koltso" too and Cyrillic queries reach Latin brand
+names. The rows are kept up to date like the facet index: on Product.save,
+by the signals for brands/categories/collections and in bulk by importers.
+
+Matching happens in the database, on the index migration 0033 creates:
+
+- PostgreSQL: a generated tsvector column (names weighted above details)
+  with a GIN index for ranked prefix queries, plus a trigram index on
+  `names` so misspelt words still match.
+- SQLite (development): an FTS5 table kept in sync by triggers, ranked
+  with bm25.
+- Anything else: icontains over the documents.
+
+Every query word is a prefix, so results update as the user types. When a
+query finds nothing it is retried as if typed in the other keyboard layout
+("rjkmwj" -> "кольцо").
+"""
+import re
+from functools import lru_cache
+
+from django.db import connection, transaction
+from slugify import slugify
+
+from .models import Product, ProductSearch
+
+CHUNK_SIZE = 500
+
+WORD_RE = re.compile(r'[^\W_]+')
+
+_LATIN = "qwertyuiop[]asdfghjkl;'zxcvbnm,.`"
+_CYRILLIC = 'йцукенгшщзхъфывапролджэячсмитьбюё'
+LAYOUT = str.maketrans(_LATIN + _CYRILLIC, _CYRILLIC + _LATIN)
+
+# Fields that feed the index; used to load products with .values() when rebuilding.
+SOURCE_FIELDS = ('pk', 'title', 'brand', 'brand_ref__name', 'article', 'category__name', 'metal', 'material')
+
+
+def words(text):
+    """Lowercased words of a text (ё folded into е); punctuation separates words."""
+    return WORD_RE.findall(str(text or '').lower().replace('ё', 'е'))
+
+
+@lru_cache(maxsize=10000)
+def transliterate(word):
+    """Latin spelling of a word ('кольцо' -> 'koltso'); Latin words come back unchanged."""
+    return slugify(word, separator='') or word
+
+
+def variants(word):
+    return list(dict.fromkeys((word, transliterate(word))))
+
+
+def _text(*values):
+    seen = dict.fromkeys(variant for value in values for word in words(value) for variant in variants(word))
+    return ' '.join(seen)
+
+
+def document(title='', brand='', article='', category='', collections=(), metal='', material=''):
+    """(names, details) of a product's search row."""
+    return _text(title, brand, article), _text(category, *collections, metal, material)
+
+
+def switch_layout(text):
+    """The text as if typed in the other keyboard layout (Latin <-> Cyrillic ЙЦУКЕН)."""
+    return str(text).lower().translate(LAYOUT)
+
+
+def sync_product_search(product):
+    """Rewrites the search row of a single saved product."""
+    rebuild_search_index([product.pk])
+
+
+def rebuild_search_index(product_ids=None):
+    """
+    Rebuilds the search rows of the given product ids (or the whole
+    catalog). Returns the number of rows written.
+    """
+    qs = Product.objects.order_by('pk')
+    if product_ids is not None:
+        qs = qs.filter(pk__in=list(product_ids))
+
+    written = 0
+    with transaction.atomic():
+        if product_ids is None:
+            ProductSearch.objects.all().delete()
+        batch = []
+        for values in qs.values(*SOURCE_FIELDS).iterator(chunk_size=CHUNK_SIZE):
+            batch.append(values)
+            if len(batch) >= CHUNK_SIZE:
+                written += _write_batch(batch, clear=product_ids is not None)
+                batch = []
+        if batch:
+            written += _write_batch(batch, clear=product_ids is not None)
+    return written
+
+
+def _write_batch(products, clear):
+    ids = [values['pk'] for values in products]
+    collections = {}
+    for product_id, name in (
+        Product.collections.through.objects.filter(product_id__in=ids).values_list('product_id', 'collection__name')
+    ):
+        collections.setdefault(product_id, []).append(name)
+
+    if clear:
+        ProductSearch.objects.filter(product_id__in=ids).delete()
+    rows = []
+    for values in products:
+        names, details = document(
+            title=values['title'],
+            brand=values['brand_ref__name'] or values['brand'],
+            article=values['article'],
+            category=values['category__name'],
+            collections=sorted(collections.get(values['pk'], ())),
+            metal=values['metal'],
+            material=values['material'],
+        )
+        rows.append(ProductSearch(product_id=values['pk'], names=names, details=details))
+    ProductSearch.objects.bulk_create(rows, batch_size=CHUNK_SIZE)
+    return len(rows)
+
+
+def backend():
+    """'postgresql', 'sqlite' (FTS5) or 'fallback'."""
+    if connection.vendor in ('postgresql', 'sqlite'):
+        return connection.vendor
+    return 'fallback'
+
+
+def _postgres_ids(terms, limit):
+    tsquery = ' & '.join('(' + ' | '.join(f'{variant}:*' for variant in group) + ')' for group in terms)
+    text = ' '.join(group[0] for group in terms)
+    search, product = ProductSearch._meta.db_table, Product._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT s.product_id FROM {search} s JOIN {product} p ON p.id = s.product_id
+            WHERE p.is_active AND (s.vector @@ to_tsquery('simple', %s) OR %s <%% s.names)
+            ORDER BY ts_rank(s.vector, to_tsquery('simple', %s)) + word_similarity(%s, s.names) DESC, p.id DESC
+            LIMIT %s
+            """,
+            [tsquery, text, tsquery, text, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _sqlite_ids(terms, limit):
+    match = ' AND '.join('(' + ' OR '.join(f'"{variant}"*' for variant in group) + ')' for group in terms)
+    fts, product = f'{ProductSearch._meta.db_table}_fts', Product._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT f.rowid FROM {fts} f JOIN {product} p ON p.id = f.rowid
+            WHERE {fts} MATCH %s AND p.is_active
+            ORDER BY bm25({fts}, 10.0, 1.0), p.id DESC
+            LIMIT %s
+            """,
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_ids(terms, limit):
+    from django.db.models import Q
+
+    qs = ProductSearch.objects.filter(product__is_active=True)
+    for group in terms:
+        q = Q()
+        for variant in group:
+            q |= Q(names__icontains=variant) | Q(details__icontains=variant)
+        qs = qs.filter(q)
+    return list(qs.order_by('-product_id').values_list('product_id', flat=True)[:limit])
+
+
+SEARCHERS = {'postgresql': _postgres_ids, 'sqlite': _sqlite_ids, 'fallback': _fallback_ids}
+
+
+def search_ids(query, limit=20):
+    """Ids of active products matching every word of `query`, best first."""
+    for text in dict.fromkeys((query, switch_layout(query))):
+        terms = [variants(word) for word in words(text)]
+        if not terms:
+            return []
+        ids = SEARCHERS[backend()](terms, limit)
+        if ids:
+            return ids
+    return []
+
+
+def search(query, limit=20):
+    """Active products matching `query`, best first (brands loaded)."""
+    ids = search_ids(query, limit)
+    products = Product.objects.select_related('brand_ref').in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
+
+
+def icontains_ids(query, limit=20):
+    """The pre-index lookup (title or brand icontains); kept for benchmark_search."""
+    from django.db.models import Q
+
+    return list(
+        Product.objects.filter(Q(title__icontains=query) | Q(brand_ref__name__icontains=query), is_active=True)
+        .values_list('pk', flat=True)[:limit]
+    )
@@ -0,0 +1,94 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from main.models import TopBanner
+from . import derivatives, placeholders
+from .recommendations import update_recommendations
+from .search import rebuild_search_index, sync_product_search
+from .cache import bump
+from .models import (
+    Brand, Category, Collection, HomepageBlock, HomepageHeroImage, Product, ProductImage, Review, SiteSettings,
+)
+
+# Which cache namespaces (see catalog.cache) each model feeds.
+INVALIDATES = {
+    Product: ('catalog',),
+    ProductImage: ('catalog',),
+    Category: ('catalog',),
+    Brand: ('catalog', 'homepage'),
+    Collection: ('catalog',),
+    HomepageBlock: ('homepage',),
+    HomepageHeroImage: ('homepage',),
+    Review: ('homepage',),
+    TopBanner: ('site',),
+    SiteSettings: ('site',),
+}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_on_change(sender, **kwargs):
+    namespaces = INVALIDATES.get(sender)
+    if namespaces:
+        bump(*namespaces)
+
+
+@receiver(m2m_changed, sender=Product.collections.through)
+@receiver(m2m_changed, sender=Product.related_colors.through)
+def invalidate_on_m2m_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump('catalog')
+
+
+@receiver(post_save)
+def build_image_derivatives(sender, instance, raw=False, **kwargs):
+    fields = derivatives.IMAGE_FIELDS.get(sender._meta.label)
+    if not fields or raw:
+        return
+    for name in fields:
+        file = getattr(instance, name)
+        if file:
+            derivatives.ensure(file.name)
+
+
+@receiver(post_save)
+def describe_image(sender, instance, raw=False, **kwargs):
+    if raw or sender._meta.label not in placeholders.SOURCES:
+        return
+    if placeholders.refresh(instance):
+        bump(*INVALIDATES[sender])
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Collection)
+def reindex_products_of(sender, instance, raw=False, **kwargs):
+    # Their names are part of the products' search rows
+    if not raw:
+        rebuild_search_index(instance.products.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Product.collections.through)
+def reindex_on_collections_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        sync_product_search(instance)
+    elif pk_set:
+        rebuild_search_index(pk_set)
+    else:
+        rebuild_search_index()
+
+
+@receiver(post_save, sender=Product)
+def recommend_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # After commit: the lists are built from what other connections can see
+        transaction.on_commit(lambda: update_recommendations([instance.pk]))
+
+
+@receiver(m2m_changed, sender=Product.collections.through)
+def recommend_on_collections_change(sender, instance, action, reverse, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and not reverse:
+        transaction.on_commit(lambda: update_recommendations([instance.pk]))
@@ -0,0 +1,261 @@
+"""
+Per-size stock rows (ProductSize).
+
+Product.size_stock stays the editable source in the admin and importers;
+Product.save mirrors it into ProductSize so size filtering, cart limits and
+checkout decrements work on indexed rows instead of the JSON blob.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Exists, IntegerField, OuterRef, Q, Subquery, When
+from django.db.models.functions import Coalesce
+
+from .cache import bump
+from .models import Product, ProductSize
+
+SIZE_MAX_LENGTH = 50
+
+
+class InsufficientStock(Exception):
+    """Raised by take_stock when some lines cannot be fulfilled; nothing is decremented."""
+
+    def __init__(self, shortages):
+        # [(product, size, requested, available), ...]
+        self.shortages = shortages
+        super().__init__(', '.join(f'{p.title} {size}: {want} > {have}'.strip() for p, size, want, have in shortages))
+
+
+def size_rows(product):
+    """
+    Returns {size: quantity} for a product.
+    Tracked sizes come from size_stock; otherwise the comma separated
+    Product.size values are listed with quantity None (not tracked).
+    """
+    size_stock = product.size_stock if isinstance(product.size_stock, dict) else {}
+    rows = {}
+    if size_stock:
+        for size, qty in size_stock.items():
+            size = str(size).strip()[:SIZE_MAX_LENGTH]
+            if not size:
+                continue
+            try:
+                rows[size] = max(int(qty), 0) if qty is not None else None
+            except (TypeError, ValueError):
+                continue
+    else:
+        for size in str(product.size or '').split(','):
+            size = size.strip()[:SIZE_MAX_LENGTH]
+            if size:
+                rows[size] = None
+    return rows
+
+
+def sync_product_sizes(product):
+    """Brings the ProductSize rows of a saved product in line with its size fields."""
+    wanted = size_rows(product)
+    existing = dict(ProductSize.objects.filter(product=product).values_list('size', 'quantity'))
+
+    stale = [size for size in existing if size not in wanted]
+    if stale:
+        ProductSize.objects.filter(product=product, size__in=stale).delete()
+
+    changed = [
+        ProductSize(product=product, size=size, quantity=qty)
+        for size, qty in wanted.items()
+        if size not in existing or existing[size] != qty
+    ]
+    if changed:
+        ProductSize.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=['product', 'size'],
+            update_fields=['quantity'],
+        )
+
+
+def rebuild_size_index(product_ids, chunk_size=500):
+    """
+    Rewrites the ProductSize rows of products written in bulk (bypassing
+    Product.save), chunk by chunk. Returns the number of rows written.
+    """
+    product_ids = list(product_ids)
+    written = 0
+    with transaction.atomic():
+        for start in range(0, len(product_ids), chunk_size):
+            chunk = product_ids[start:start + chunk_size]
+            ProductSize.objects.filter(product_id__in=chunk).delete()
+            rows = [
+                ProductSize(product_id=product.pk, size=size, quantity=qty)
+                for product in Product.objects.filter(pk__in=chunk).only('id', 'size', 'size_stock')
+                for size, qty in size_rows(product).items()
+            ]
+            ProductSize.objects.bulk_create(rows, batch_size=1000)
+            written += len(rows)
+    bump('stock')
+    return written
+
+
+def in_stock_sizes():
+    """Size rows that can be sold: untracked ones or with quantity left."""
+    return ProductSize.objects.filter(Q(quantity__isnull=True) | Q(quantity__gt=0))
+
+
+def size_filter(sizes):
+    """Subquery of product ids offering any of the given sizes in stock."""
+    return in_stock_sizes().filter(size__in=sizes).values('product_id')
+
+
+def _reservations():
+    # orders builds on catalog, so the hold helpers are imported lazily
+    from orders import reservations
+    return reservations
+
+
+def available_quantity(product, size):
+    """
+    Units that can still be put in a cart: stock minus active order holds.
+    Products tracked per size need a size; otherwise the aggregate stock applies.
+    """
+    held = _reservations().held_quantities([product.pk])
+    if product.size_stock_map:
+        if not size:
+            return 0
+        qty = ProductSize.objects.filter(product=product, size=size).values_list('quantity', flat=True).first()
+        return max((qty or 0) - held[(product.pk, size)], 0)
+    return max(product.stock - sum(held.values()), 0)
+
+
+def available_quantity_expression(product_ref='product_id', size_ref='size'):
+    """
+    SQL counterpart of available_quantity() for rows that reference a product
+    and a size (cart items), so limits can be enforced inside a single UPDATE.
+    """
+    held_expression = _reservations().held_expression
+    tracked = ProductSize.objects.filter(product_id=OuterRef(product_ref), quantity__isnull=False)
+    size_qty = tracked.filter(size=OuterRef(size_ref)).values('quantity')[:1]
+    stock = Product.objects.filter(pk=OuterRef(product_ref)).order_by().values('stock')[:1]
+    return Case(
+        When(Exists(tracked), then=Coalesce(Subquery(size_qty), 0) - held_expression(product_ref, size_ref)),
+        default=Subquery(stock) - held_expression(product_ref),
+        output_field=IntegerField(),
+    )
+
+
+def in_stock_filter():
+    """Q for products with units left to sell once active holds are taken out."""
+    return Q(stock__gt=_reservations().held_expression('pk'))
+
+
+def _wanted(lines):
+    wanted = Counter()
+    for product_id, size, quantity in lines:
+        wanted[(product_id, size or '')] += quantity
+    return wanted
+
+
+def _lock(wanted):
+    """Locks the product and tracked size rows touched by `wanted` for the current transaction."""
+    product_ids = {product_id for product_id, _ in wanted}
+    products = {
+        p.pk: p
+        for p in Product.objects.select_for_update().filter(pk__in=product_ids).only('id', 'title', 'stock', 'size_stock')
+    }
+    size_rows = {
+        (row.product_id, row.size): row
+        for row in ProductSize.objects.select_for_update().filter(product_id__in=product_ids, quantity__isnull=False)
+    }
+    return products, size_rows
+
+
+def _shortages(wanted, products, size_rows, held):
+    """Lines of `wanted` not covered by stock minus `held` ({(product_id, size): units})."""
+    tracked = {product_id for product_id, _ in size_rows}
+    held_by_product = Counter()
+    for (product_id, _), quantity in held.items():
+        held_by_product[product_id] += quantity
+
+    shortages = []
+    untracked = Counter()
+    for (product_id, size), quantity in wanted.items():
+        product = products.get(product_id)
+        if product is None:
+            continue
+        if product_id in tracked:
+            row = size_rows.get((product_id, size))
+            available = max((row.quantity if row else 0) - held[(product_id, size)], 0)
+            if quantity > available:
+                shortages.append((product, size, quantity, available))
+        else:
+            untracked[product_id] += quantity
+
+    for product_id, quantity in untracked.items():
+        product = products[product_id]
+        available = max(product.stock - held_by_product[product_id], 0)
+        if quantity > available:
+            shortages.append((product, '', quantity, available))
+    return shortages
+
+
+def check_stock(lines):
+    """
+    Locks the rows of `lines` ((product_id, size, quantity) tuples) and raises
+    InsufficientStock unless stock minus active holds covers all of them.
+    Must run inside transaction.atomic().
+    """
+    wanted = _wanted(lines)
+    if not wanted:
+        return
+    products, size_rows = _lock(wanted)
+    held = _reservations().held_quantities(products.keys())
+    shortages = _shortages(wanted, products, size_rows, held)
+    if shortages:
+        raise InsufficientStock(shortages)
+
+
+def take_stock(lines, clamp=False):
+    """
+    Decrements stock for a whole order at once: `lines` is an iterable of
+    (product_id, size, quantity). Must run inside transaction.atomic().
+
+    The affected product and size rows are locked, every line is checked and
+    either all of them are decremented (one bulk UPDATE per table) or
+    InsufficientStock is raised. With clamp=True short lines are taken down
+    to zero instead (the order is already confirmed). The number of queries
+    does not depend on the number of lines.
+    """
+    wanted = _wanted(lines)
+    if not wanted:
+        return
+    products, size_rows = _lock(wanted)
+    if not clamp:
+        shortages = _shortages(wanted, products, size_rows, Counter())
+        if shortages:
+            raise InsufficientStock(shortages)
+
+    tracked = {product_id for product_id, _ in size_rows}
+    changed_rows = []
+    sold_out = False  # some product or size ran out: listings must drop it
+    for (product_id, size), quantity in wanted.items():
+        if product_id not in products:
+            continue
+        if product_id in tracked:
+            row = size_rows.get((product_id, size))
+            if row:
+                sold_out |= row.quantity > 0 and row.quantity <= quantity
+                row.quantity = max(row.quantity - quantity, 0)
+                changed_rows.append(row)
+        else:
+            sold_out |= products[product_id].stock > 0 and products[product_id].stock <= quantity
+            products[product_id].stock = max(products[product_id].stock - quantity, 0)
+    if changed_rows:
+        ProductSize.objects.bulk_update(changed_rows, ['quantity'])
+
+    for product_id in tracked & products.keys():
+        product = products[product_id]
+        product.size_stock = {size: row.quantity for (pid, size), row in size_rows.items() if pid == product_id}
+        product.stock = sum(product.size_stock.values())
+    if products:
+        Product.objects.bulk_update(list(products.values()), ['stock', 'size_stock'])
+    if sold_out:
+        bump('stock')
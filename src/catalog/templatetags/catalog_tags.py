@@ -1,4 +1,7 @@
 from django import template
+from django.utils.html import format_html
+
+from catalog import derivatives
 
 register = template.Library()
 
@@ -15,3 +18,41 @@ def url_replace(context, **kwargs):
         else:
             query[key] = value
     return query.urlencode()
+
+
+@register.filter
+def facet_count(counts, key):
+    """Looks up a facet value count: {{ facet_counts.size|facet_count:s }}."""
+    try:
+        return counts.get(key, 0)
+    except AttributeError:
+        return 0
+
+
+@register.simple_tag
+def srcset(url, sizes='100vw'):
+    """
+    srcset/sizes attributes for a local image URL, built from its derivatives:
+    <img src="{{ url }}" {% srcset url '(max-width: 768px) 50vw, 25vw' %}>.
+    Renders nothing for remote images or images without derivatives.
+    """
+    value = derivatives.srcset(url)
+    if not value:
+        return ''
+    return format_html(' srcset="{}" sizes="{}"', value, sizes)
+
+
+@register.simple_tag
+def placeholder(obj):
+    """
+    width/height and a dominant colour + blurred preview background for a
+    model with ImageMetadata: <img src="..." {% placeholder product %}>, so the
+    box is reserved and painted before the image loads. Renders nothing until
+    catalog.placeholders has described the image.
+    """
+    if not getattr(obj, 'image_ok', None):
+        return ''
+    return format_html(
+        ' width="{}" height="{}" style="background: {} url({}) center / cover no-repeat;"',
+        obj.image_width, obj.image_height, obj.image_color, obj.image_placeholder,
+    )
@@ -1,3 +1,1188 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.facets import facet_counts, facet_values, rebuild_facet_index
+from catalog import cache as catalog_cache
+from catalog import derivatives
+from catalog.models import Brand, Category, Collection, MirroredImage, Product, ProductFacet, ProductImage, SiteSettings
+from catalog.stock import InsufficientStock, available_quantity, size_filter, take_stock
+from marais.testing import PLAIN_STATIC
+
+
+def make_product(title, **kwargs):
+    kwargs.setdefault('slug', title.lower().replace(' ', '-'))
+    return Product.objects.create(title=title, **kwargs)
+
+
+class FacetIndexTests(TestCase):
+    def test_facet_values_parse_lists(self):
+        product = Product(
+            title='Ring',
+            metal='Серебро',
+            material='Серебро, Эмаль',
+            coverage='Позолота,',
+            stone_option='with_stones',
+        )
+        self.assertEqual(facet_values(product), {
+            ('metal', 'Серебро'),
+            ('material', 'Серебро'),
+            ('material', 'Эмаль'),
+            ('coverage', 'Позолота'),
+            ('stone_option', 'with_stones'),
+        })
+
+    def test_save_keeps_index_in_sync(self):
+        product = make_product('Ring', metal='Золото', coverage='Родий')
+        self.assertEqual(
+            set(product.facets.values_list('facet', 'value')),
+            {('metal', 'Золото'), ('coverage', 'Родий')},
+        )
+
+        product.coverage = ''
+        product.save()
+        self.assertEqual(set(product.facets.values_list('facet', 'value')), {('metal', 'Золото')})
+
+    def test_stale_rows_are_deleted_in_one_query(self):
+        from catalog.facets import sync_product_facets
+
+        product = make_product('Ring', metal='Золото', material='Серебро, Эмаль', coverage='Родий')
+        product.metal, product.material, product.coverage = '', '', ''
+        with CaptureQueriesContext(connection) as ctx:
+            sync_product_facets(product)
+        self.assertEqual(sum(q['sql'].startswith('DELETE') for q in ctx.captured_queries), 1)
+        self.assertFalse(product.facets.exists())
+
+    def test_rebuild_restores_rows_written_around_save(self):
+        product = make_product('Ring', metal='Золото')
+        ProductFacet.objects.all().delete()
+        rebuild_facet_index()
+        self.assertEqual(list(product.facets.values_list('facet', 'value')), [('metal', 'Золото')])
+
+    def test_facet_counts_drop_only_their_own_dimension(self):
+        rings = Category.objects.create(name='Кольца', slug='rings')
+        chains = Category.objects.create(name='Цепи', slug='chains')
+        make_product('Gold ring', category=rings, metal='Золото', size_stock={'17': 1})
+        make_product('Silver ring', category=rings, metal='Серебро', size_stock={'17': 1, '18': 2})
+        make_product('Gold chain', category=chains, metal='Золото')
+
+        filters = {'category': Q(category__slug='rings'), 'metal': Q(metal='Золото')}
+
+        def scope_for(dimension):
+            qs = Product.objects.all()
+            for key, q in filters.items():
+                if key != dimension:
+                    qs = qs.filter(q)
+            return qs
+
+        counts = facet_counts(scope_for)
+        self.assertEqual(counts['category'], {'rings': 1, 'chains': 1})
+        self.assertEqual(counts['metal'], {'Золото': 1, 'Серебро': 1})
+        self.assertEqual(counts['size'], {'17': 1})
+        self.assertEqual(counts['coverage'], {})
+
+
+class ProductSizeTests(TestCase):
+    def test_size_rows_follow_size_stock(self):
+        product = make_product('Ring', size_stock={'17': 2, '18': 0, ' ': 5})
+        self.assertEqual(dict(product.sizes.values_list('size', 'quantity')), {'17': 2, '18': 0})
+
+        product.size_stock = {'18': 1}
+        product.save()
+        self.assertEqual(dict(product.sizes.values_list('size', 'quantity')), {'18': 1})
+
+    def test_untracked_sizes_come_from_size_string(self):
+        product = make_product('Chain', size='40 см, 45 см')
+        self.assertEqual(dict(product.sizes.values_list('size', 'quantity')), {'40 см': None, '45 см': None})
+
+    def test_size_filter_matches_exact_in_stock_sizes(self):
+        make_product('Ring 1', size_stock={'1': 1})
+        make_product('Ring 17', size_stock={'17': 1})
+        make_product('Sold out', size_stock={'1': 0, '18': 1})
+        titles = Product.objects.filter(id__in=size_filter(['1'])).values_list('title', flat=True)
+        self.assertEqual(list(titles), ['Ring 1'])
+
+    def test_take_stock_updates_rows_and_aggregates(self):
+        product = make_product('Ring', size_stock={'17': 2, '18': 1})
+        with self.assertRaises(InsufficientStock):
+            take_stock([(product.pk, '17', 5)])
+        product.refresh_from_db()
+        self.assertEqual(product.size_stock, {'17': 2, '18': 1})
+
+        take_stock([(product.pk, '17', 1), (product.pk, '17', 1)])
+        product.refresh_from_db()
+        self.assertEqual(product.size_stock, {'17': 0, '18': 1})
+        self.assertEqual(product.stock, 1)
+        self.assertEqual(available_quantity(product, '17'), 0)
+        self.assertEqual(available_quantity(product, '18'), 1)
+        self.assertEqual(available_quantity(product, ''), 0)
+
+    def test_take_stock_clamps_confirmed_orders_at_zero(self):
+        ring = make_product('Ring', size_stock={'17': 2})
+        brooch = make_product('Brooch', stock=3)
+        take_stock([(ring.pk, '17', 5), (brooch.pk, '', 2)], clamp=True)
+        ring.refresh_from_db()
+        brooch.refresh_from_db()
+        self.assertEqual((ring.size_stock, ring.stock), ({'17': 0}, 0))
+        self.assertEqual(brooch.stock, 1)
+
+        take_stock([(brooch.pk, '', 4)], clamp=True)
+        brooch.refresh_from_db()
+        self.assertEqual(brooch.stock, 0)
+
+
+@PLAIN_STATIC
+class CatalogViewFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_facet_building_does_not_scale_with_catalog(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('catalog:home'))
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+
+        make_product('Ring 1', size_stock={'16': 1}, material='Серебро')
+        count_queries()  # warm up one-off rows such as SiteSettings
+        baseline = count_queries()
+        for i in range(2, 30):
+            make_product(f'Ring {i}', size_stock={str(i): 1}, material=f'Материал {i}')
+        count_queries()  # the saves above invalidated the cached menus
+        self.assertEqual(count_queries(), baseline)
+
+    def test_sidebar_shows_counts(self):
+        rings = Category.objects.create(name='Кольца', slug='rings')
+        make_product('Ring 1', category=rings, size_stock={'17': 1})
+        make_product('Ring 2', category=rings, size_stock={'17': 1, '18': 1})
+        response = self.client.get(reverse('catalog:home'), {'category': 'rings', 'size': '18'})
+        self.assertEqual([p.title for p in response.context['products']], ['Ring 2'])
+        self.assertEqual(response.context['facet_counts']['size'], {'17': 2, '18': 1})
+        self.assertContains(response, 'Кольца <span class="filter-count">(1)</span>', html=False)
+
+    def test_single_valued_filters_match_their_counts(self):
+        make_product('Padded', metal=' Серебро ')
+        make_product('Silver', metal='Серебро')
+        response = self.client.get(reverse('catalog:home'), {'metal': 'Серебро'})
+        self.assertEqual(response.context['facet_counts']['metal'], {'Серебро': 2})
+        self.assertEqual(sorted(p.title for p in response.context['products']), ['Padded', 'Silver'])
+
+    def test_material_filter_uses_exact_facet_values(self):
+        make_product('Silver', material='Серебро, Эмаль')
+        make_product('Gold', material='Золото')
+        response = self.client.get(reverse('catalog:home'), {'material': 'Эмаль'})
+        self.assertEqual([p.title for p in response.context['products']], ['Silver'])
+
+
+@PLAIN_STATIC
+class CatalogFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.rings = Category.objects.create(name='Кольца', slug='rings')
+        for i in range(30):
+            make_product(f'Ring {i}', category=self.rings if i % 3 else None)
+        # Products imported in one go share a timestamp; the id breaks the tie
+        Product.objects.filter(title__in=['Ring 10', 'Ring 11', 'Ring 13', 'Ring 14']).update(
+            created_at=Product.objects.get(title='Ring 10').created_at,
+        )
+
+    def feed(self, **params):
+        response = self.client.get(reverse('catalog:products'), params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return data['html'].count('class="product-card"'), data['next']
+
+    def test_load_more_continues_the_catalog_page(self):
+        expected = list(
+            Product.objects.filter(category=self.rings).order_by('-created_at', '-id').values_list('title', flat=True)
+        )
+        response = self.client.get(reverse('catalog:home'), {'category': 'rings'})
+        shown = [p.title for p in response.context['products']]
+        cursor = response.context['next_cursor']
+        self.assertContains(response, 'data-load-more')
+
+        while cursor:
+            response = self.client.get(reverse('catalog:products'), {'category': 'rings', 'cursor': cursor})
+            data = response.json()
+            shown += [title for title in expected if f'>{title}</h3>' in data['html']]
+            cursor = data['next']
+        self.assertEqual(sorted(shown), sorted(expected))
+        self.assertEqual(len(shown), len(set(shown)))
+
+    def test_pages_without_count_or_offset(self):
+        cursor = self.feed()[1]
+        with CaptureQueriesContext(connection) as ctx:
+            count, cursor = self.feed(cursor=cursor)
+        self.assertEqual(count, 12)
+        sql = ' '.join(q['sql'].upper() for q in ctx.captured_queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+        self.assertEqual(self.feed(cursor=cursor), (6, None))
+        self.assertEqual(self.feed(category='rings', cursor=cursor)[1], None)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('catalog:products'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+@PLAIN_STATIC
+class CatalogQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def query(self, querystring):
+        from django.http import QueryDict
+        from catalog.query import CatalogQuery
+
+        return CatalogQuery.from_params(QueryDict(querystring))
+
+    def test_equivalent_query_strings_share_one_key(self):
+        query = self.query('metal=Silver&brand=B&brand=A&brand=A&color=None&min_price=1000.0&in_stock=on&page=2')
+        same = self.query('brand=A&brand=B&in_stock=1&min_price=1e3&metal=Silver&color=')
+        self.assertEqual(query, same)
+        self.assertEqual(hash(query), hash(same))
+        self.assertEqual(query.key, same.key)
+        self.assertEqual(query.querystring(), 'brand=A&brand=B&metal=Silver&in_stock=1&min_price=1000')
+
+        self.assertNotEqual(query, self.query('brand=A&metal=Silver&in_stock=1&min_price=1000'))
+        self.assertEqual(self.query('min_price=abc&max_price=1e999999'), self.query(''))
+        self.assertEqual(len({query, same, self.query('')}), 2)
+
+    def test_filters_compile_to_one_queryset(self):
+        rings = Category.objects.create(name='Кольца', slug='rings')
+        make_product('Gold ring', category=rings, metal='Золото', price=500, size_stock={'17': 1})
+        make_product('Silver ring', category=rings, metal='Серебро', price=900, size_stock={'17': 1})
+        make_product('Gold chain', metal='Золото', price=700)
+        query = self.query('category=rings&metal=Золото&size=17&max_price=800')
+        self.assertEqual([p.title for p in query.products()], ['Gold ring'])
+        # The outer filter plus the size and metal subqueries
+        self.assertEqual(str(query.queryset().query).count('WHERE'), 3)
+        # The price range ignores the price filter itself
+        self.assertEqual(query.summary()['price_min'], 500)
+        self.assertEqual(query.summary()['price_max'], 500)
+        self.assertEqual(self.query('max_price=800').summary()['total'], 2)
+
+    def test_same_filters_hit_one_cached_page(self):
+        make_product('Gold ring', metal='Золото')
+        make_product('Silver ring', metal='Серебро')
+
+        def get(params):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('catalog:home'), params)
+            return [p.title for p in response.context['products']], len(ctx.captured_queries)
+
+        titles, cold = get({'metal': ['Золото', 'None'], 'page': '1'})
+        self.assertEqual(titles, ['Gold ring'])
+        titles, warm = get({'metal': 'Золото'})
+        self.assertEqual(titles, ['Gold ring'])
+        self.assertLess(warm, cold)
+
+        # Catalog edits bump the version, so the cached page is not served again
+        make_product('Gold chain', metal='Золото')
+        self.assertEqual(get({'metal': 'Золото'})[0], ['Gold chain', 'Gold ring'])
+
+
+class CacheInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_rebuilds_after_model_change(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            return Brand.objects.count()
+
+        self.assertEqual(catalog_cache.cached('catalog', 'brand-count', build), 0)
+        self.assertEqual(catalog_cache.cached('catalog', 'brand-count', build), 0)
+        self.assertEqual(len(calls), 1)
+
+        Brand.objects.create(name='La2L')
+        self.assertEqual(catalog_cache.cached('catalog', 'brand-count', build), 1)
+        self.assertEqual(len(calls), 2)
+
+    def test_signals_bump_only_their_namespaces(self):
+        catalog_version = catalog_cache.version('catalog')
+        site_version = catalog_cache.version('site')
+        SiteSettings.load()
+        self.assertEqual(catalog_cache.version('catalog'), catalog_version)
+        self.assertGreater(catalog_cache.version('site'), site_version)
+
+    def test_collection_membership_change_bumps_catalog(self):
+        product = make_product('Ring')
+        collection = Collection.objects.create(name='Spring', slug='spring')
+        before = catalog_cache.version('catalog')
+        product.collections.add(collection)
+        self.assertGreater(catalog_cache.version('catalog'), before)
+
+    def test_evicted_version_does_not_reuse_old_keys(self):
+        with mock.patch('catalog.cache.time.time', return_value=1000.0):
+            key = catalog_cache.make_key('catalog', 'x')
+        cache.delete('version:catalog')
+        with mock.patch('catalog.cache.time.time', return_value=1001.0):
+            self.assertNotEqual(catalog_cache.make_key('catalog', 'x'), key)
+
+
+SHEET_HEADER = 'Категория,Артикул,Бренд,Размер,Описание,Материал,Покрытие,Камень,Цена,Количество,Коллекции,Фото (ссылка),Фото (ссылка) 2'
+
+
+def csv_file(test, content):
+    """Writes a CSV export to a temporary file removed after the test."""
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+    test.addCleanup(os.remove, path)
+    return path
+
+
+def sheet(*rows):
+    return '\n'.join((SHEET_HEADER,) + rows) + '\n'
+
+
+class GoogleSheetImportTests(TestCase):
+    ROWS = (
+        'кольцо,A1,La2L,17,Кольцо Луна,Серебро,,,"12 000",3,Весна,https://drive.google.com/file/d/img1/view,https://x.test/2.jpg',
+        'серьги,A2,La2L,,Серьги Солнце,Золото,,,5000,1,,,',
+    )
+
+    def run_import(self, content, *args):
+        out = StringIO()
+        call_command('import_google_sheet', '--source', csv_file(self, content), *args, stdout=out)
+        return out.getvalue()
+
+    def test_first_import_creates_products(self):
+        out = self.run_import(sheet(*self.ROWS))
+        self.assertIn('Created: 2, updated: 0, unchanged: 0', out)
+        ring = Product.objects.get(article='A1')
+        self.assertEqual(ring.title, 'Кольцо Луна')
+        self.assertEqual(ring.price, 12000)
+        self.assertEqual(ring.category.name, 'Кольца')
+        self.assertEqual(ring.main_image_url, 'https://lh3.googleusercontent.com/d/img1')
+        self.assertEqual(list(ring.collections.values_list('name', flat=True)), ['Весна'])
+        self.assertEqual(ProductImage.objects.filter(product=ring).count(), 1)
+
+    def test_unchanged_sheet_does_not_write(self):
+        self.run_import(sheet(*self.ROWS))
+        with CaptureQueriesContext(connection) as ctx:
+            out = self.run_import(sheet(*self.ROWS))
+        self.assertIn('unchanged: 2', out)
+        writes = [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith('SELECT')]
+        self.assertEqual(writes, [])
+
+    def test_changed_and_removed_rows(self):
+        self.run_import(sheet(*self.ROWS))
+        ring = Product.objects.get(article='A1')
+
+        out = self.run_import(sheet(self.ROWS[0].replace('"12 000",3', '"13 000",3')))
+        self.assertIn('Created: 0, updated: 1, unchanged: 0, deactivated: 1', out)
+        updated = Product.objects.get(article='A1')
+        self.assertEqual(updated.pk, ring.pk)
+        self.assertEqual(updated.price, 13000)
+        self.assertFalse(Product.objects.get(article='A2').is_active)
+
+        # Coming back to the sheet reactivates the same row (A1 is changed back as well)
+        out = self.run_import(sheet(*self.ROWS))
+        self.assertIn('updated: 2, unchanged: 0', out)
+        self.assertTrue(Product.objects.get(article='A2').is_active)
+
+    def test_clear_keeps_the_old_full_reload(self):
+        self.run_import(sheet(*self.ROWS))
+        first = Product.objects.get(article='A1').pk
+        self.run_import(sheet(*self.ROWS), '--clear')
+        self.assertNotEqual(Product.objects.get(article='A1').pk, first)
+
+
+class BulkImportProductsTests(TestCase):
+    HEADER = 'Категория,Артикул,Бренд,Размер,Название,Описание,Материал,Цена,Количество,Коллекции,Фото,Фото 2'
+
+    def run_import(self, lines):
+        import import_products
+
+        path = csv_file(self, '\n'.join([self.HEADER] + lines) + '\n')
+        with mock.patch('builtins.print'), CaptureQueriesContext(connection) as ctx:
+            import_products.import_data(path)
+        return len(ctx.captured_queries)
+
+    def rows(self, count, price=1000):
+        return [
+            f'кольцо,R{i},La2L,{size},Кольцо {i},,Серебро,{price},{qty},"Весна, Лето",https://x.test/{i}.jpg,https://x.test/{i}-2.jpg'
+            for i in range(count)
+            for size, qty in (('16', 1), ('17', 2))
+        ]
+
+    def test_import_aggregates_sizes_and_links(self):
+        self.run_import(self.rows(2))
+        ring = Product.objects.get(article='R1')
+        self.assertEqual(ring.size_stock, {'16': 1, '17': 2})
+        self.assertEqual(ring.stock, 3)
+        self.assertEqual(ring.size, '16, 17')
+        self.assertEqual(ring.category.name, 'Кольца')
+        self.assertEqual(sorted(ring.collections.values_list('name', flat=True)), ['Весна', 'Лето'])
+        self.assertEqual(list(ring.images.values_list('image_url', flat=True)), ['https://x.test/1-2.jpg'])
+        self.assertEqual(dict(ring.sizes.values_list('size', 'quantity')), {'16': 1, '17': 2})
+        self.assertTrue(ring.facets.filter(facet='material', value='Серебро').exists())
+
+    def test_reimport_updates_in_place(self):
+        self.run_import(self.rows(2))
+        pk = Product.objects.get(article='R1').pk
+        self.run_import(self.rows(2, price=2000))
+        ring = Product.objects.get(article='R1')
+        self.assertEqual(ring.pk, pk)
+        self.assertEqual(ring.price, 2000)
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertEqual(ring.images.count(), 1)
+
+    def test_query_count_does_not_grow_per_article(self):
+        self.run_import(self.rows(1))  # categories, brands and collections exist from here on
+        Product.objects.all().delete()
+        small = self.run_import(self.rows(5))
+        Product.objects.all().delete()
+        # SQLite caps query parameters, so wide inserts may be split into a couple more batches
+        self.assertLessEqual(self.run_import(self.rows(60)), small + 2)
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+class ImportEngineTests(TestCase):
+    def run_import(self, source, *args):
+        out = StringIO()
+        call_command('import_catalog', source, *args, stdout=out)
+        return out.getvalue()
+
+    def test_sheet_rows_are_folded_by_article(self):
+        out = self.run_import(os.path.join(FIXTURES, 'import_sample.csv'))
+        self.assertIn('Import finished. Created: 2, updated: 0', out)
+
+        ring = Product.objects.get(article='R1')
+        self.assertEqual(ring.title, 'Кольцо Луна')
+        self.assertEqual(ring.size_stock, {'16': 1, '17': 2})
+        self.assertEqual(ring.size, '16, 17')
+        self.assertEqual(ring.gender, 'female')
+        self.assertEqual(ring.stone_option, 'without_stones')
+        self.assertEqual(ring.main_image_url, 'https://lh3.googleusercontent.com/d/ring1')
+        self.assertEqual(list(ring.images.values_list('image_url', flat=True)), ['https://x.test/r1-2.jpg'])
+        self.assertEqual(sorted(ring.collections.values_list('name', flat=True)), ['Весна', 'Лето'])
+        self.assertEqual(dict(ring.sizes.values_list('size', 'quantity')), {'16': 1, '17': 2})
+
+        # No title column value: the description's first line is the title
+        earrings = Product.objects.get(article='E1')
+        self.assertEqual((earrings.title, earrings.description), ('Серьги Солнце', 'Позолота'))
+        self.assertEqual(earrings.category.name, 'Серьги')
+        self.assertEqual(earrings.stock, 4)
+
+    def test_json_sources(self):
+        out = self.run_import(os.path.join(FIXTURES, 'import_sample.json'))
+        self.assertIn('Created: 2', out)
+
+        # The parsed fixture has no articles, so one is derived from brand and title
+        snake = Product.objects.get(title='Пусеты Змейки')
+        self.assertEqual(snake.article, 'la2l-pusety-zmeiki')
+        self.assertEqual(snake.metal, 'Латунь')
+        self.assertEqual(snake.size, '1 см')
+        self.assertEqual(snake.main_image_url, 'https://lh3.googleusercontent.com/d/snake1')
+
+        ring = Product.objects.get(article='K7')
+        self.assertEqual((ring.stock, ring.size, ring.size_stock), (5, '16, 17', {}))
+        self.assertEqual(list(ring.images.values_list('image_url', flat=True)), ['https://x.test/k7-2.jpg'])
+
+        self.assertIn('unchanged: 2', self.run_import(os.path.join(FIXTURES, 'import_sample.json')))
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        path = csv_file(self, '[{"article": "A1", "title": "Ring"}, "oops"]')
+        out = self.run_import(path, '--format', 'json')
+        self.assertIn('Row 2:', out)
+        self.assertIn('Created: 1, updated: 0, unchanged: 0, deactivated: 0, errors: 1.', out)
+
+    def test_dry_run_rolls_back(self):
+        Product.objects.create(title='Old', slug='old', article='OLD', import_hash='x')
+        out = self.run_import(os.path.join(FIXTURES, 'import_sample.csv'), '--dry-run', '--deactivate-missing')
+        self.assertIn('Dry run finished (rolled back). Created: 2, updated: 0, unchanged: 0, deactivated: 1', out)
+        self.assertEqual(list(Product.objects.values_list('article', 'is_active')), [('OLD', True)])
+        self.assertFalse(Category.objects.exists())
+
+    def test_profile_reports_phases(self):
+        out = self.run_import(os.path.join(FIXTURES, 'import_sample.csv'), '--profile')
+        for name in ('read', 'diff', 'lookups', 'products', 'images', 'indexes'):
+            self.assertIn(f'{name} ', out)
+        self.assertIn('total', out)
+
+
+class ImportSourceTests(TestCase):
+    def test_rows_stream_with_multiline_cells_and_bom(self):
+        from catalog.importing.sources import open_source, read_rows, sample
+
+        path = csv_file(self, '\ufeffАртикул,Описание\nA1,"Кольцо\nс камнем"\nA2,Серьги\n')
+        with open_source(path) as stream:
+            header, rows = read_rows(stream)
+            head, rows = sample(rows, size=1)
+            self.assertEqual(header, ['Артикул', 'Описание'])
+            self.assertEqual(head, [['A1', 'Кольцо\nс камнем']])
+            self.assertEqual([row[0] for row in rows], ['A1', 'A2'])
+
+    def test_url_source_is_streamed(self):
+        import functools
+        import http.server
+        import threading
+
+        from catalog.importing.sources import open_source, read_rows
+
+        path = csv_file(self, 'Артикул\nA1\nA2\n')
+        handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=os.path.dirname(path))
+        handler.log_message = lambda *args: None
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        url = f'http://127.0.0.1:{server.server_port}/{os.path.basename(path)}'
+        with open_source(url) as stream:
+            header, rows = read_rows(stream)
+            self.assertEqual(header, ['Артикул'])
+            self.assertEqual(list(rows), [['A1'], ['A2']])
+
+
+def image_server(test, files):
+    """
+    Serves {path: (content type, body)} on localhost with ETags; returns
+    (base url, list of requested paths).
+    """
+    import hashlib
+    import http.server
+    import threading
+
+    hits = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            if self.path not in files:
+                self.send_error(404)
+                return
+            content_type, body = files[self.path]
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test.addCleanup(server.server_close)
+    test.addCleanup(server.shutdown)
+    return f'http://127.0.0.1:{server.server_port}', hits
+
+
+def temp_media(test):
+    """Points MEDIA_ROOT at a temporary directory for the test; returns its path."""
+    media = tempfile.TemporaryDirectory()
+    test.addCleanup(media.cleanup)
+    settings_override = override_settings(MEDIA_ROOT=media.name)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+    return media.name
+
+
+class ImageMirrorTests(TestCase):
+    PNG = b'\x89PNG\r\n\x1a\n' + b'ring' * 10
+
+    def setUp(self):
+        self.media = temp_media(self)
+
+        self.base, self.hits = image_server(self, {
+            '/ring.png': ('image/png', self.PNG),
+            '/ring-copy.png': ('image/png', self.PNG),
+            '/page.html': ('text/html', b'<html></html>'),
+        })
+        self.ring = make_product('Ring', main_image_url=f'{self.base}/ring.png')
+        self.ring.images.create(image_url=f'{self.base}/ring-copy.png')
+        self.broken = make_product('Broken', main_image_url=f'{self.base}/page.html')
+
+    def mirror(self, *args):
+        out = StringIO()
+        call_command('mirror_images', '--workers', '3', *args, stdout=out)
+        return out.getvalue()
+
+    def test_images_are_stored_once_by_content(self):
+        out = self.mirror()
+        self.assertIn('Downloaded: 1, reused: 1, not modified: 0, skipped: 0, failed: 1, linked: 2.', out)
+
+        self.ring.refresh_from_db()
+        gallery = self.ring.images.get()
+        self.assertEqual(self.ring.main_image_mirror.name, gallery.image_mirror.name)
+        self.assertTrue(self.ring.get_main_image_url.startswith('/media/mirror/'))
+        self.assertEqual(gallery.get_image_url, self.ring.get_main_image_url)
+        with open(os.path.join(self.media, self.ring.main_image_mirror.name), 'rb') as f:
+            self.assertEqual(f.read(), self.PNG)
+
+        self.broken.refresh_from_db()
+        self.assertEqual(self.broken.get_main_image_url, f'{self.base}/page.html')
+        self.assertIn('Not an image', MirroredImage.objects.get(url=f'{self.base}/page.html').error)
+
+        # Mirrored URLs are not requested again; the failed one is retried
+        self.hits.clear()
+        self.assertIn('skipped: 2, failed: 1, linked: 0', self.mirror())
+        self.assertEqual(self.hits, ['/page.html'])
+
+    def test_refresh_revalidates_by_etag(self):
+        self.mirror()
+        self.assertIn('Downloaded: 0, reused: 0, not modified: 2', self.mirror('--refresh'))
+
+    def test_reimport_keeps_the_local_copy(self):
+        self.mirror()
+        path = csv_file(self, sheet(f'кольцо,A1,La2L,,Кольцо,,,,100,1,,{self.base}/ring.png,'))
+        call_command('import_catalog', path, stdout=StringIO())
+        self.assertTrue(Product.objects.get(article='A1').get_main_image_url.startswith('/media/mirror/'))
+
+
+def image_bytes(width, height, fmt='PNG'):
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), (200, 160, 90)).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+class DerivativeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = temp_media(self)
+
+    def upload(self, width, fmt='JPEG'):
+        from django.core.files.base import ContentFile
+
+        product = make_product(f'Ring {width}')
+        product.main_image.save(f'ring-{width}.{fmt.lower()}', ContentFile(image_bytes(width, width // 2, fmt)))
+        return product
+
+    def render(self, url):
+        from django.template import Context, Template
+
+        return Template("{% load catalog_tags %}<img{% srcset url '50vw' %}>").render(Context({'url': url}))
+
+    def test_upload_builds_every_smaller_width(self):
+        from PIL import Image
+
+        product = self.upload(1500)
+        name = product.main_image.name
+        for width in (320, 640, 1280):
+            path = os.path.join(self.media, derivatives.derivative_name(name, width))
+            with Image.open(path) as image:
+                self.assertEqual(image.size, (width, round(750 * width / 1500)))
+
+        html = self.render(product.get_main_image_url)
+        url = product.main_image.url
+        self.assertIn('/media/derivatives/products/ring-1500-320w.jpeg 320w', html)
+        self.assertIn(f'{url} 1500w"', html)
+        self.assertIn('sizes="50vw"', html)
+
+    def test_small_and_remote_images_render_plain(self):
+        product = self.upload(500)
+        self.assertEqual(derivatives.info(product.main_image.name)['widths'], [320])
+        self.assertEqual(self.render('https://lh3.googleusercontent.com/d/x'), '<img>')
+        self.assertEqual(self.render(''), '<img>')
+
+    def test_command_backfills_missing_copies(self):
+        import shutil
+
+        product = self.upload(800, fmt='PNG')
+        shutil.rmtree(os.path.join(self.media, 'derivatives'))
+        cache.clear()
+        self.assertEqual(self.render(product.main_image.url), '<img>')
+
+        call_command('build_derivatives', stdout=StringIO())
+        self.assertIn('-640w.png 640w', self.render(product.main_image.url))
+
+    def test_modern_siblings_and_savings_report(self):
+        from catalog import imaging
+
+        product = self.upload(1500)
+        name = product.main_image.name
+        for stored in (name, derivatives.derivative_name(name, 640)):
+            source = os.path.join(self.media, stored)
+            for fmt in imaging.modern_formats():
+                sibling = os.path.join(self.media, imaging.sibling_name(stored, fmt))
+                self.assertLess(os.path.getsize(sibling), os.path.getsize(source))
+
+        report = imaging.savings_report(self.media)
+        source, served = report['products']
+        self.assertEqual(source, os.path.getsize(os.path.join(self.media, name)))
+        self.assertLess(served, source)
+        self.assertIn('derivatives/products', report)
+
+
+class ImageOptimizerTests(TestCase):
+    """optimize_images.py, the script the entrypoint runs in the background."""
+
+    def setUp(self):
+        import importlib
+        import sys
+        from pathlib import Path
+
+        from django.conf import settings
+
+        self.media = Path(temp_media(self))
+        # Imported by name: the worker processes unpickle its functions from there
+        with mock.patch.object(sys, 'path', [str(settings.BASE_DIR.parent), *sys.path]):
+            self.optimizer = importlib.import_module('optimize_images')
+        roots = [self.media / 'images']
+        for name in ('ROOTS', 'SIBLING_ROOTS'):
+            patcher = mock.patch.object(self.optimizer, name, roots)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        roots[0].mkdir()
+        self.originals = [roots[0] / 'ring.jpg', roots[0] / 'chain.png']
+        for path, fmt in zip(self.originals, ('JPEG', 'PNG')):
+            path.write_bytes(image_bytes(900, 1200, fmt))
+
+    def run_optimizer(self):
+        from contextlib import redirect_stdout
+
+        out = StringIO()
+        with redirect_stdout(out):
+            self.optimizer.main(['--workers', '1', '--manifest', str(self.media / 'manifest.json'), '--no-report'])
+        return out.getvalue()
+
+    def test_siblings_are_written_once(self):
+        from catalog import imaging
+
+        formats = imaging.modern_formats()
+        if not formats:
+            self.skipTest('Pillow has no WebP/AVIF support')
+        self.assertIn('processed=2,', self.run_optimizer())
+        siblings = [path.with_name(imaging.sibling_name(path.name, fmt)) for path in self.originals for fmt in formats]
+        for sibling in siblings:
+            self.assertTrue(sibling.exists(), sibling)
+        written = {sibling: sibling.stat().st_mtime_ns for sibling in siblings}
+
+        # The manifest remembers the originals, so nothing is encoded again
+        self.assertIn('processed=0,', self.run_optimizer())
+        self.assertEqual({sibling: sibling.stat().st_mtime_ns for sibling in siblings}, written)
+
+        # A changed original is the only one processed
+        self.originals[0].write_bytes(image_bytes(1000, 1200, 'JPEG'))
+        self.assertIn('processed=1,', self.run_optimizer())
+
+
+class PlaceholderTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = temp_media(self)
+
+        self.base, self.hits = image_server(self, {
+            '/ring.jpg': ('image/jpeg', image_bytes(600, 800, 'JPEG')),
+        })
+
+    def render(self, obj):
+        from django.template import Context, Template
+
+        return Template('{% load catalog_tags %}<img{% placeholder obj %}>').render(Context({'obj': obj}))
+
+    def test_upload_is_described_on_save(self):
+        from django.core.files.base import ContentFile
+
+        product = make_product('Ring')
+        product.main_image.save('ring.png', ContentFile(image_bytes(300, 200)))
+        product.refresh_from_db()
+        self.assertEqual((product.image_width, product.image_height), (300, 200))
+        self.assertEqual(product.image_color, '#c8a05a')
+        self.assertTrue(product.image_ok)
+        self.assertTrue(product.image_placeholder.startswith('data:image/'))
+        self.assertLess(len(product.image_placeholder), 1000)
+
+        html = self.render(product)
+        self.assertIn('width="300" height="200"', html)
+        self.assertIn('background: #c8a05a url(data:image/', html)
+
+    def test_command_describes_remote_and_broken_urls_once(self):
+        ring = make_product('Ring', main_image_url=f'{self.base}/ring.jpg')
+        ring.images.create(image_url=f'{self.base}/ring.jpg')
+        broken = make_product('Broken', main_image_url=f'{self.base}/gone.jpg')
+        # Remote URLs are not fetched while saving
+        self.assertEqual(self.hits, [])
+        self.assertEqual(self.render(ring), '<img>')
+
+        out = StringIO()
+        call_command('describe_images', stdout=out)
+        self.assertIn('Images described: 1, broken: 1, unreachable: 0, rows updated: 3.', out.getvalue())
+        self.assertEqual(sorted(self.hits), ['/gone.jpg', '/ring.jpg'])
+
+        ring.refresh_from_db()
+        self.assertEqual((ring.image_width, ring.image_height), (600, 800))
+        self.assertEqual(ring.images.get().image_width, 600)
+        broken.refresh_from_db()
+        self.assertIs(broken.image_ok, False)
+        self.assertEqual(self.render(broken), '<img>')
+
+        # Nothing changed, nothing fetched
+        self.hits.clear()
+        call_command('describe_images', stdout=StringIO())
+        self.assertEqual(self.hits, [])
+
+        # A changed URL drops the old metadata until it is described again
+        ring.main_image_url = f'{self.base}/gone.jpg'
+        ring.save()
+        ring.refresh_from_db()
+        self.assertIsNone(ring.image_ok)
+        self.assertIsNone(ring.image_width)
+
+    @PLAIN_STATIC
+    def test_listing_skips_known_broken_images(self):
+        make_product('Broken', main_image_url=f'{self.base}/gone.jpg', image_ok=False, image_key=f'{self.base}/gone.jpg')
+        response = self.client.get(reverse('catalog:home'))
+        self.assertNotContains(response, f'{self.base}/gone.jpg')
+
+    def test_reimport_reuses_known_metadata(self):
+        url = f'{self.base}/ring.jpg'
+        call_command('import_catalog', csv_file(self, sheet(f'кольцо,A1,La2L,,Кольцо,,,,100,1,,{url},{url}')), stdout=StringIO())
+        call_command('describe_images', stdout=StringIO())
+        call_command('import_catalog', csv_file(self, sheet(f'кольцо,A1,La2L,,Кольцо,,,,200,1,,{url},{url}')), stdout=StringIO())
+
+        product = Product.objects.get(article='A1')
+        self.assertEqual(product.price, 200)
+        self.assertEqual(product.image_width, 600)
+        self.assertEqual(product.images.get().image_width, 600)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.brand = Brand.objects.create(name='La2L', slug='la2l')
+        self.ring = make_product('Кольцо Лилия', brand_ref=self.brand, article='R-100', metal='Серебро')
+        self.earrings = make_product('Серьги Змейка', article='E-200', material='Кольцо-конго')
+        make_product('Кольцо скрытое', is_active=False)
+
+    def titles(self, query):
+        from catalog.search import search
+
+        return [p.title for p in search(query)]
+
+    def test_prefix_ranked_and_inactive_hidden(self):
+        # Title matches rank above matches in the details
+        self.assertEqual(self.titles('коль'), ['Кольцо Лилия', 'Серьги Змейка'])
+        self.assertEqual(self.titles('кольцо лил'), ['Кольцо Лилия'])
+        self.assertEqual(self.titles('серебро'), ['Кольцо Лилия'])
+        self.assertEqual(self.titles('r-100'), ['Кольцо Лилия'])
+        self.assertEqual(self.titles('браслет'), [])
+
+    def test_transliteration_and_keyboard_layout(self):
+        self.assertEqual(self.titles('koltso lil'), ['Кольцо Лилия'])
+        self.assertEqual(self.titles('ЗМЕЙ'), ['Серьги Змейка'])
+        self.assertEqual(self.titles('cthmub'), ['Серьги Змейка'])  # "серьги" typed in the Latin layout
+        self.assertEqual(self.titles('la2'), ['Кольцо Лилия'])
+
+    def test_index_follows_brand_and_collection_changes(self):
+        self.brand.name = 'Mireille'
+        self.brand.save()
+        self.assertEqual(self.titles('mirei'), ['Кольцо Лилия'])
+        self.assertEqual(self.titles('la2l'), [])
+
+        collection = Collection.objects.create(name='Весна', slug='vesna')
+        self.earrings.collections.add(collection)
+        self.assertEqual(self.titles('vesna'), ['Серьги Змейка'])
+        collection.products.clear()
+        self.assertEqual(self.titles('весна'), [])
+
+    def test_import_indexes_written_products(self):
+        call_command('import_catalog', csv_file(self, sheet('кольцо,A1,Misaki,,Кольцо Мисаки,,,,100,1,Лето,,')), stdout=StringIO())
+        self.assertEqual(self.titles('misaki лет'), ['Кольцо Мисаки'])
+
+    @PLAIN_STATIC
+    def test_suggestions_view(self):
+        # Metals are only in the database index (catalog.autocomplete covers names)
+        response = self.client.get(reverse('catalog:search_suggestions'), {'q': 'serebr'})
+        results = response.json()['results']
+        self.assertEqual([r['title'] for r in results], ['Кольцо Лилия'])
+        self.assertEqual(results[0]['brand'], 'La2L')
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        brand = Brand.objects.create(name='La2L', slug='la2l')
+        make_product('Серьги Кольцевые', article='E-1')
+        make_product('Кольцо Лилия', brand_ref=brand, article='R-100', price=15000)
+        make_product('Кольцо скрытое', is_active=False)
+
+    def get(self, query):
+        response = self.client.get(reverse('catalog:search_suggestions'), {'q': query})
+        return [r['title'] for r in response.json()['results']]
+
+    def test_lookups_are_served_from_memory(self):
+        from catalog import autocomplete
+
+        autocomplete.get_index()
+        with self.assertNumQueries(0):
+            # Leading title words first, then newest first
+            self.assertEqual([s['title'] for s in autocomplete.lookup('коль')], ['Кольцо Лилия', 'Серьги Кольцевые'])
+            self.assertEqual([s['title'] for s in autocomplete.lookup('la2 lil')], ['Кольцо Лилия'])
+            self.assertEqual([s['title'] for s in autocomplete.lookup('koltso')], ['Кольцо Лилия'])
+            self.assertEqual([s['title'] for s in autocomplete.lookup('r-10')], ['Кольцо Лилия'])
+            self.assertEqual([s['title'] for s in autocomplete.lookup('rjkmwj')], ['Кольцо Лилия'])
+            self.assertEqual(len(autocomplete.sample(5)), 2)
+
+        suggestion = autocomplete.lookup('лилия')[0]
+        self.assertEqual(suggestion['price'], '15000')
+        self.assertEqual(suggestion['brand'], 'La2L')
+
+    @PLAIN_STATIC
+    def test_index_follows_catalog_changes(self):
+        self.assertEqual(self.get('браслет'), [])
+        make_product('Браслет Лилия')
+        self.assertEqual(self.get('браслет'), ['Браслет Лилия'])
+        Product.objects.filter(title='Браслет Лилия').update(is_active=False)
+        catalog_cache.bump('catalog')
+        self.assertEqual(self.get('браслет'), [])
+
+    @PLAIN_STATIC
+    def test_misses_fall_back_to_the_database_search(self):
+        # Metals are not in the in-memory index, but catalog.search has them
+        make_product('Цепь', metal='Золото')
+        self.assertEqual(self.get('золото'), ['Цепь'])
+        self.assertEqual(len(self.get('')), 3)
+
+
+class SamplingTests(TestCase):
+    def setUp(self):
+        self.brand = Brand.objects.create(name='La2L', slug='la2l')
+        rings = Category.objects.create(name='Кольца', slug='rings')
+        self.products = [
+            make_product(f'Ring {i}', category=rings, brand_ref=self.brand if i < 3 else None) for i in range(8)
+        ]
+        make_product('Hidden', is_active=False)
+
+    def test_draws_come_from_the_cached_pool(self):
+        from catalog.sampling import random_products, sample_ids
+
+        sample_ids(1)
+        with self.assertNumQueries(0):
+            ids = sample_ids(5, exclude=[self.products[0].pk])
+        self.assertEqual(len(set(ids)), 5)
+        self.assertNotIn(self.products[0].pk, ids)
+
+        with self.assertNumQueries(1):
+            picked = random_products(20)
+        self.assertEqual(sorted(p.title for p in picked), sorted(p.title for p in self.products))
+
+        brand_pool = {p.pk for p in random_products(10, within={'brand_ref_id': self.brand.pk})}
+        self.assertEqual(brand_pool, {p.pk for p in self.products[:3]})
+
+    def test_pool_follows_catalog_changes(self):
+        from catalog.sampling import random_products
+
+        random_products(1)
+        self.products[0].is_active = False
+        self.products[0].save()
+        self.assertEqual(len(random_products(20)), 7)
+
+        # Hidden by a bulk write nobody bumped for: skipped when fetching the rows
+        Product.objects.filter(pk=self.products[1].pk).update(is_active=False)
+        self.assertEqual(len(random_products(20)), 6)
+
+    @PLAIN_STATIC
+    def test_profile_recommendations(self):
+        response = self.client.get(reverse('catalog:profile'))
+        self.assertEqual(len(response.context['recommended_products']), 4)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.rings = Category.objects.create(name='Кольца', slug='rings')
+        self.earrings = Category.objects.create(name='Серьги', slug='earrings')
+        self.brand = Brand.objects.create(name='La2L', slug='la2l')
+        self.ring = make_product('Ring', category=self.rings, brand_ref=self.brand, metal='Серебро', price=20000)
+        self.same_brand = make_product('Ring La2L', category=self.rings, brand_ref=self.brand, price=90000)
+        self.same_price = make_product('Ring Silver', category=self.rings, metal='Серебро', price=25000)
+        self.plain = make_product('Ring Plain', category=self.rings, price=500)
+        self.studs = make_product('Studs', category=self.earrings, price=900)
+        self.hoops = make_product('Hoops', category=self.earrings, brand_ref=self.brand, metal='Серебро', price=21000)
+
+    def titles(self, pks):
+        titles = dict(Product.objects.values_list('pk', 'title'))
+        return [titles[pk] for pk in pks]
+
+    def test_ranking_by_shared_traits_and_orders(self):
+        from catalog.copurchase import mine_copurchases
+        from catalog.models import ProductRecommendation
+        from catalog.recommendations import build_recommendations
+        from orders.models import Order, OrderItem
+
+        self.assertEqual(build_recommendations(), 6)
+        row = ProductRecommendation.objects.get(product=self.ring)
+        self.assertEqual(self.titles(row.related), ['Ring Silver', 'Ring La2L', 'Ring Plain'])
+        self.assertEqual(self.titles(row.complementary), ['Hoops', 'Studs'])
+
+        # Bought together outweighs the rest; cancelled orders do not count
+        for status in ('new', 'cancelled', 'cancelled'):
+            order = Order.objects.create(status=status)
+            OrderItem.objects.create(order=order, product=self.ring, price=20000)
+            OrderItem.objects.create(order=order, product=self.plain, price=500)
+        mine_copurchases(settle=timedelta(0))
+        build_recommendations()
+        row = ProductRecommendation.objects.get(product=self.ring)
+        self.assertEqual(self.titles(row.related), ['Ring Plain', 'Ring Silver', 'Ring La2L'])
+
+    def test_saving_a_product_updates_its_neighbours(self):
+        from catalog.models import ProductRecommendation
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bracelet = make_product('Bracelet', category=self.earrings, brand_ref=self.brand, metal='Серебро', price=20000)
+        self.assertEqual(self.titles(ProductRecommendation.objects.get(product=bracelet).related), ['Hoops', 'Studs'])
+        # The ring's row was recomputed too and now leads with the new product
+        self.assertEqual(self.titles(ProductRecommendation.objects.get(product=self.ring).complementary)[0], 'Bracelet')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bracelet.is_active = False
+            bracelet.save()
+        self.assertFalse(ProductRecommendation.objects.filter(product=bracelet).exists())
+
+    @PLAIN_STATIC
+    def test_detail_page_reads_the_precomputed_lists(self):
+        from catalog.recommendations import build_recommendations
+
+        url = reverse('catalog:detail', args=[self.ring.slug])
+        fallback = self.client.get(url)
+        self.assertEqual(len(fallback.context['related_products']), 3)
+
+        build_recommendations()
+        Product.objects.filter(pk=self.same_brand.pk).update(is_active=False)
+        response = self.client.get(url)
+        self.assertEqual([p.title for p in response.context['related_products']], ['Ring Silver', 'Ring Plain'])
+        self.assertEqual([p.title for p in response.context['complementary_products']], ['Hoops', 'Studs'])
+
+    def test_update_matches_the_full_build(self):
+        from catalog.models import ProductRecommendation
+        from catalog.recommendations import build_recommendations, listing, update_recommendations
+
+        build_recommendations()
+        built = {row.product_id: (row.related, row.complementary) for row in ProductRecommendation.objects.all()}
+        ProductRecommendation.objects.all().delete()
+        self.assertEqual(update_recommendations([self.ring.pk], neighbours=False), 1)
+        self.assertEqual(ProductRecommendation.objects.values_list('related', 'complementary').get(), built[self.ring.pk])
+
+        build_recommendations()
+        for wanted in ({self.plain.pk}, {self.plain.pk, self.studs.pk}):
+            expected = {pk for pk, lists in built.items() if wanted & set(lists[0] + lists[1])}
+            self.assertEqual(listing(wanted), expected)
+
+    def test_import_updates_the_recommendations_it_affects(self):
+        from catalog.models import ProductRecommendation
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_catalog', csv_file(self, sheet('кольцо,A1,La2L,,Кольцо,,,,100,1,,,')), stdout=StringIO())
+        imported = Product.objects.get(article='A1')
+        self.assertTrue(ProductRecommendation.objects.filter(product=imported).exists())
+        # Its lists hold every other product, and each of them was recomputed
+        self.assertEqual(ProductRecommendation.objects.count(), 7)
+        self.assertIn(imported.pk, ProductRecommendation.objects.get(product=self.ring).related)
+
+        # An unchanged re-import writes nothing, so nothing is scheduled
+        with self.captureOnCommitCallbacks() as callbacks:
+            call_command('import_catalog', csv_file(self, sheet('кольцо,A1,La2L,,Кольцо,,,,100,1,,,')), stdout=StringIO())
+        self.assertEqual(callbacks, [])
+
+
+class CoPurchaseTests(TestCase):
+    def setUp(self):
+        self.ring, self.studs, self.chain, self.hoops = (
+            make_product(title) for title in ('Ring', 'Studs', 'Chain', 'Hoops')
+        )
+
+    def order(self, *products, status='new', days_ago=0):
+        from orders.models import Order, OrderItem
+
+        order = Order.objects.create(status=status)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, price=100)
+        return order
+
+    def neighbors(self, product):
+        from catalog.models import BoughtTogether
+
+        row = BoughtTogether.objects.filter(product=product).first()
+        titles = dict(Product.objects.values_list('pk', 'title'))
+        return [titles[pk] for pk, _ in row.neighbors] if row else []
+
+    def test_recent_orders_weigh_more(self):
+        from catalog.copurchase import HALF_LIFE, bought_together, mine_copurchases
+
+        # Two old orders of ring + studs lose to one recent order of ring + chain
+        self.order(self.ring, self.studs, days_ago=2 * HALF_LIFE.days)
+        self.order(self.ring, self.studs, days_ago=2 * HALF_LIFE.days)
+        self.order(self.ring, self.chain, self.chain)
+        self.order(self.ring, self.hoops, status='cancelled')
+        counts, product_ids = mine_copurchases(settle=timedelta(0))
+
+        self.assertEqual(counts, {'orders': 3, 'pairs': 4, 'products': 3})
+        self.assertEqual(product_ids, {self.ring.pk, self.studs.pk, self.chain.pk})
+        self.assertEqual(self.neighbors(self.ring), ['Chain', 'Studs'])
+        self.assertEqual(self.neighbors(self.chain), ['Ring'])
+        weights = bought_together()[self.ring.pk]
+        self.assertAlmostEqual(weights[self.chain.pk], 1, places=2)
+        self.assertAlmostEqual(weights[self.studs.pk], 0.5, places=2)
+
+    def test_incremental_runs_fold_only_new_orders(self):
+        from basket.models import Order as BasketOrder, OrderItem as BasketOrderItem
+        from catalog.copurchase import mine_copurchases
+        from catalog.models import CoPurchase
+
+        self.order(self.ring, self.studs)
+        self.order(self.ring, self.chain)
+        mine_copurchases(settle=timedelta(0))
+        # Too recent to be folded yet (it may still be cancelled)
+        self.order(self.ring, self.chain)
+        self.assertEqual(mine_copurchases()[0]['orders'], 0)
+
+        basket_order = BasketOrder.objects.create(full_name='Test', email='test@example.com')
+        for product in (self.ring, self.chain):
+            BasketOrderItem.objects.create(order=basket_order, product=product, title=product.title)
+        counts, product_ids = mine_copurchases(settle=timedelta(0))
+        self.assertEqual((counts['orders'], product_ids), (2, {self.ring.pk, self.chain.pk}))
+        self.assertEqual(self.neighbors(self.ring), ['Chain', 'Studs'])
+        self.assertEqual(CoPurchase.objects.get(product=self.ring, other=self.chain).orders, 3)
+        self.assertEqual(mine_copurchases(settle=timedelta(0))[0]['orders'], 0)
+
+        # A full run starts over and gives the same matrix
+        self.assertEqual(mine_copurchases(full=True, settle=timedelta(0))[0]['orders'], 4)
+        self.assertEqual(CoPurchase.objects.get(product=self.ring, other=self.chain).orders, 3)
+        self.assertEqual(CoPurchase.objects.count(), 4)
+
+    def test_command_refreshes_the_recommendations_it_changes(self):
+        from catalog.models import ProductRecommendation
+
+        self.order(self.ring, self.studs, days_ago=1)
+        out = StringIO()
+        call_command('mine_copurchases', '--top-k', '1', stdout=out)
+        self.assertIn('Folded 1 orders into 2 pairs', out.getvalue())
+        self.assertIn('Recommendations refreshed for 2 products', out.getvalue())
+        self.assertEqual(ProductRecommendation.objects.get(product=self.ring).related[0], self.studs.pk)
+
+        # Only the products of the new pairs are recomputed
+        self.order(self.chain, self.hoops, days_ago=1)
+        call_command('mine_copurchases', stdout=StringIO())
+        self.assertEqual(
+            set(ProductRecommendation.objects.values_list('product_id', flat=True)),
+            {self.ring.pk, self.studs.pk, self.chain.pk, self.hoops.pk},
+        )
+        self.assertEqual(ProductRecommendation.objects.get(product=self.ring).related[0], self.studs.pk)
@@ -1,10 +1,11 @@
 from django.urls import path
-from .views import CatalogView, ProductDetailView, ProfileView, SearchSuggestionsView
+from .views import CatalogProductsView, CatalogView, ProductDetailView, ProfileView, SearchSuggestionsView
 
 app_name = 'catalog'
 
 urlpatterns = [
 	path('', CatalogView.as_view(), name='home'),
+	path('products/', CatalogProductsView.as_view(), name='products'),
 	path('detail/<str:slug>/', ProductDetailView.as_view(), name='detail'),
     path('search/suggestions/', SearchSuggestionsView.as_view(), name='search_suggestions'),
 
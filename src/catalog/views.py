@@ -1,255 +1,121 @@
 from django.conf import settings
-from django.shortcuts import render
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views import View
 
 from basket.models import Order
 
+from catalog import autocomplete
+from catalog.cache import cached
 from catalog.models import Product, Category, Brand
+from catalog.pagination import CountedPaginator, InvalidCursor, encode_cursor, keyset_page
+from catalog.query import CACHE_NAMESPACES, CatalogQuery
+from catalog.recommendations import recommended
+from catalog.sampling import random_products
+from catalog.search import search
+
+CATALOG_PAGE_SIZE = 12
 
-from django.core.paginator import Paginator
 
 class CatalogView(View):
     def get(self, request):
-        products = Product.objects.filter(is_active=True).order_by('-created_at')
-        categories = Category.objects.all()
-        brands = Brand.objects.filter(is_active=True)
-
-        # Filters
-        # Filters
-        category_slugs = request.GET.getlist('category')
-        clean_cats = []
-        if category_slugs:
-            # Handle 'None' or empty strings if any
-            clean_cats = [c for c in category_slugs if c and c != 'None']
-            if clean_cats:
-                products = products.filter(category__slug__in=clean_cats)
-        
-        brand_names = request.GET.getlist('brand')
-        if brand_names:
-            clean_brands = [b for b in brand_names if b and b != 'None']
-            if clean_brands:
-                products = products.filter(brand_ref__name__in=clean_brands)
-
-        collections = request.GET.getlist('collection')
-        if collections:
-            clean_collections = [c for c in collections if c and c != 'None']
-            if clean_collections:
-                # Filter by collection slug (or name, but slug is safer for URLs)
-                # Model has 'slug' field. Let's assume URL param uses slug.
-                products = products.filter(collections__slug__in=clean_collections).distinct()
-        
-        # Gender Filter
-        genders = request.GET.getlist('gender')
-        if genders:
-            clean_genders = [g for g in genders if g and g != 'None']
-            if clean_genders:
-                products = products.filter(gender__in=clean_genders)
-
-        # Removed Metal, Coverage, Stones, Color filters as requested
-
-        available_sizes = set()
-        
-        # New filters collections
-        available_metals = set()
-        available_materials = set()
-        available_stone_options = set()
-        available_material_types = set()
-        available_coverages = set()
-        available_colors = set()
-
-        # Collect available values from ACTIVE products (before filtering by attributes, but after categories/brands if desired)
-        # However, typically we want facets to reflect current results or all possibilities.
-        # Let's collect from 'products' which is currently filtered by Category and Brand.
-        
-        # Efficiently get distinct non-empty values
-        # Note: We iterate once or use distinct() queries. For small DB iteration is fine, for large use individual queries.
-        # Given this is likely not huge yet:
-        
-        for p in products:
-             # Size
-            if p.size_stock_map:
-                for s, qty in p.size_stock_map.items():
-                    s_clean = str(s).strip()
-                    if s_clean and (qty is None or qty > 0):
-                        available_sizes.add(s_clean)
-            elif p.size:
-                for s in p.size.split(','):
-                    s_clean = s.strip()
-                    if s_clean: available_sizes.add(s_clean)
-            
-            # Other text fields (exact match)
-            if p.metal: available_metals.add(p.metal)
-            if p.material:
-                for m in p.material.split(','):
-                    m_clean = m.strip()
-                    if m_clean:
-                        available_materials.add(m_clean)
-            if p.stone_option:
-                available_stone_options.add(p.stone_option)
-            if p.material_type:
-                available_material_types.add(p.material_type)
-            if p.coverage:
-                for cov in p.coverage.split(','):
-                    cov_clean = cov.strip()
-                    if cov_clean:
-                        available_coverages.add(cov_clean)
-            if p.color: available_colors.add(p.color)
-
-        available_sizes = sorted(list(available_sizes))
-        available_metals = sorted(list(available_metals))
-        available_materials = sorted(list(available_materials))
-        available_stone_options = sorted(list(available_stone_options))
-        available_material_types = sorted(list(available_material_types))
-        available_coverages = sorted(list(available_coverages))
-        available_colors = sorted(list(available_colors))
-            
-        # --- Apply Filters ---
-
-        # Size
-        sizes = request.GET.getlist('size')
-        if sizes:
-             clean_sizes = [s for s in sizes if s and s != 'None']
-             if clean_sizes:
-                from django.db.models import Q
-                q_objs = Q()
-                for s in clean_sizes:
-                    q_objs |= Q(size__icontains=s)
-                products = products.filter(q_objs)
-
-        # Metal
-        metals = request.GET.getlist('metal')
-        if metals:
-            clean_metals = [v for v in metals if v and v != 'None']
-            if clean_metals:
-                products = products.filter(metal__in=clean_metals)
-
-        # Material
-        materials = request.GET.getlist('material')
-        if materials:
-            clean_vals = [v for v in materials if v and v != 'None']
-            if clean_vals:
-                from django.db.models import Q
-                q_objs = Q()
-                for v in clean_vals:
-                    q_objs |= Q(material__icontains=v)
-                products = products.filter(q_objs)
-
-        # Material type
-        material_types = request.GET.getlist('material_type')
-        if material_types:
-            clean_vals = [v for v in material_types if v and v != 'None']
-            if clean_vals:
-                products = products.filter(material_type__in=clean_vals)
-
-        # Stones presence
-        stone_options = request.GET.getlist('stone_option')
-        if stone_options:
-            clean_vals = [v for v in stone_options if v and v != 'None']
-            if clean_vals:
-                products = products.filter(stone_option__in=clean_vals)
-
-        # Coverage
-        coverage = request.GET.getlist('coverage')
-        if coverage:
-            clean_vals = [v for v in coverage if v and v != 'None']
-            if clean_vals:
-                from django.db.models import Q
-                q_objs = Q()
-                for v in clean_vals:
-                    q_objs |= Q(coverage__icontains=v)
-                products = products.filter(q_objs)
-
-        # Color
-        colors = request.GET.getlist('color')
-        if colors:
-             clean_vals = [v for v in colors if v and v != 'None']
-             if clean_vals:
-                products = products.filter(color__in=clean_vals)
-
-        # In stock
-        in_stock = request.GET.get('in_stock')
-        selected_in_stock = str(in_stock).lower() in ('1', 'true', 'yes', 'on')
-        if selected_in_stock:
-            products = products.filter(stock__gt=0)
-
-        # Price Range
-        # Calculate min and max prices from all available products (before price filtering)
-        price_min = None
-        price_max = None
-        if products.exists():
-            from django.db.models import Min, Max
-            price_range = products.aggregate(Min('price'), Max('price'))
-            price_min = int(price_range['price__min'] or 0)
-            price_max = int(price_range['price__max'] or 0)
-        
-        # Apply price filter if provided
-        min_price = request.GET.get('min_price')
-        max_price = request.GET.get('max_price')
-        
-        if min_price:
-            try:
-                products = products.filter(price__gte=float(min_price))
-            except ValueError:
-                pass
-        
-        if max_price:
-            try:
-                products = products.filter(price__lte=float(max_price))
-            except ValueError:
-                pass
-
-        products = products.prefetch_related('collections')
-
-        # Pagination
-        paginator = Paginator(products, 12) # 12 items per page
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        query = CatalogQuery.from_params(request.GET)
+        categories = list(Category.objects.all())
+        brands = list(Brand.objects.filter(is_active=True))
+
+        # Facet counts, price range and result count, shared by every visitor
+        # with the same filters until the catalog changes (see catalog.query)
+        summary = cached(CACHE_NAMESPACES, query.cache_name('summary'), query.summary)
+        counts = summary['counts']
+
+        for cat in categories:
+            cat.facet_count = counts['category'].get(cat.slug, 0)
+        for brand in brands:
+            brand.facet_count = counts['brand'].get(brand.name, 0)
+
+        def available(dimension):
+            # Keep selected values visible even when other filters leave them empty
+            return sorted(set(counts[dimension]) | set(query.selected(dimension)))
+
+        # Numbered pages for links and crawlers; "load more" continues from
+        # the last product shown through CatalogProductsView (keyset, no COUNT)
+        paginator = CountedPaginator(query.products(), CATALOG_PAGE_SIZE, count=summary['total'])
+        page_obj = paginator.get_page(request.GET.get('page'))
+        page_obj.object_list = cached(
+            CACHE_NAMESPACES, query.cache_name('page', str(page_obj.number)), lambda: list(page_obj.object_list),
+        )
+        next_cursor = encode_cursor(page_obj[-1]) if page_obj.has_next() else None
 
         return render(request, 'catalog/general.html', {
             'products': page_obj, 
             'page_obj': page_obj, 
             'categories': categories,
             'brands': brands,
-            'selected_categories': clean_cats,
-            'selected_brands': brand_names,
-            'selected_collections': collections,
-            'selected_genders': genders,
-            'selected_sizes': sizes,
-            'selected_metals': metals,
-            'selected_materials': materials,
-            'selected_stone_options': stone_options,
-            'selected_material_types': material_types,
-            'selected_coverage': coverage,
-            'selected_colors': colors,
-            'selected_in_stock': selected_in_stock,
+            'next_cursor': next_cursor,
+            'selected_categories': query.selected('category'),
+            'selected_brands': query.selected('brand'),
+            'selected_collections': query.selected('collection'),
+            'selected_genders': query.selected('gender'),
+            'selected_sizes': query.selected('size'),
+            'selected_metals': query.selected('metal'),
+            'selected_materials': query.selected('material'),
+            'selected_stone_options': query.selected('stone_option'),
+            'selected_material_types': query.selected('material_type'),
+            'selected_coverage': query.selected('coverage'),
+            'selected_colors': query.selected('color'),
+            'selected_in_stock': query.in_stock,
             
-            'available_sizes': available_sizes,
-            'available_metals': available_metals,
-            'available_materials': available_materials,
-            'available_stone_options': available_stone_options,
-            'available_material_types': available_material_types,
-            'available_coverages': available_coverages,
-            'available_colors': available_colors,
+            'available_sizes': available('size'),
+            'available_metals': available('metal'),
+            'available_materials': available('material'),
+            'available_stone_options': available('stone_option'),
+            'available_material_types': available('material_type'),
+            'available_coverages': available('coverage'),
+            'available_colors': available('color'),
+            'facet_counts': counts,
             
-            'price_min': price_min,
-            'price_max': price_max,
-            'selected_min_price': min_price,
-            'selected_max_price': max_price,
+            'price_min': summary['price_min'],
+            'price_max': summary['price_max'],
+            'selected_min_price': query.min_price,
+            'selected_max_price': query.max_price,
         })
 
 
-from django.shortcuts import get_object_or_404
-from django.urls import reverse
-from django.utils.http import url_has_allowed_host_and_scheme
+class CatalogProductsView(View):
+    """
+    The next product cards of a catalog listing as an HTML fragment, for
+    "load more" on the catalog page: takes the page's filters plus the
+    cursor of the last card shown and returns {'html', 'next'}.
+    """
+
+    def get(self, request):
+        query = CatalogQuery.from_params(request.GET)
+        cursor = request.GET.get('cursor') or ''
+        try:
+            products, next_cursor = cached(
+                CACHE_NAMESPACES, query.cache_name('after', cursor),
+                lambda: keyset_page(query.products(), cursor, CATALOG_PAGE_SIZE),
+            )
+        except InvalidCursor:
+            return JsonResponse({'error': 'invalid cursor'}, status=400)
+        html = render_to_string('catalog/product_cards.html', {'products': products}, request=request)
+        return JsonResponse({'html': html, 'next': next_cursor})
+
 
 class ProductDetailView(View):
     def get(self, request, slug):
         product = get_object_or_404(Product, slug=slug, is_active=True)
-        # Suggest related products (same category, exclude current)
-        related_products = Product.objects.filter(category=product.category, is_active=True).exclude(id=product.id).prefetch_related('collections')[:15]
-        
-        # Complementary products (different category, for "Complete the Look")
-        complementary_products = Product.objects.filter(is_active=True).exclude(category=product.category).exclude(id=product.id).prefetch_related('collections')[:15]
+        # Related (same category) and "Complete the Look" products, precomputed by catalog.recommendations
+        recommendations = recommended(product, queryset=Product.objects.prefetch_related('collections'))
+        if recommendations:
+            related_products, complementary_products = recommendations
+        else:
+            # Not built yet for this product
+            related_products = Product.objects.filter(category=product.category, is_active=True).exclude(id=product.id).prefetch_related('collections')[:15]
+            complementary_products = Product.objects.filter(is_active=True).exclude(category=product.category).exclude(id=product.id).prefetch_related('collections')[:15]
         
         sizes_list = []
         size_options = []
@@ -327,8 +193,8 @@ class ProfileView(View):
         orders_total = qs.count()
         orders = list(qs) # Show all orders
         
-        # Get recommended products (random active products)
-        recommended_products = Product.objects.filter(is_active=True).prefetch_related('collections').order_by('?')[:4]
+        # Get recommended products (random active products, see catalog.sampling)
+        recommended_products = random_products(4, queryset=Product.objects.prefetch_related('collections'))
 
         return render(request, 'catalog/profile.html', {
             'orders': orders,
@@ -337,41 +203,15 @@ class ProfileView(View):
         })
 
 
-from django.http import JsonResponse
-
 class SearchSuggestionsView(View):
     def get(self, request):
         query = request.GET.get('q', '').strip()
-        results = []
         if query:
-            from django.db.models import Q
-            products = Product.objects.filter(
-                Q(title__icontains=query) | Q(brand_ref__name__icontains=query),
-                is_active=True
-            ).select_related('brand_ref')[:5]
+            # In-memory prefix index; the database search only sees what it misses
+            results = autocomplete.lookup(query, limit=5)
+            if not results:
+                results = [autocomplete.suggestion(p) for p in search(query, limit=5)]
         else:
-            # Show random suggestions if no query
-            products = Product.objects.filter(is_active=True).order_by('?')[:5]
-
-        for p in products:
-            image_url = None
-            is_placeholder = False
-            
-            if p.main_image:
-                image_url = p.main_image.url
-            elif p.brand_ref and p.brand_ref.logo:
-                image_url = p.brand_ref.logo.url
-                is_placeholder = True
-            else:
-                image_url = '/static/images/zaglushka.png'
-                is_placeholder = True
-                
-            results.append({
-                'title': p.title,
-                'slug': p.slug,
-                'price': str(int(p.price)),
-                'image': image_url,
-                'is_placeholder': is_placeholder,
-                'brand': p.brand_ref.name if p.brand_ref else None
-            })
+            # Random suggestions from the index's precomputed sample
+            results = autocomplete.sample(5)
         return JsonResponse({'results': results})
@@ -1,40 +1,12 @@
 import requests
 import csv
-import re
 import json
 from io import StringIO
 
-SHEET_URL = "https://docs.google.com/spreadsheets/d/1KaysYxaB-0z897sifpycDDC68C1EFPqydp23QheD2lY/export?format=csv"
-
-def convert_gdrive_link(url):
-    if not url or 'drive.google.com' not in url:
-        return url
-    
-    # Extract file ID
-    match = re.search(r'/d/([^/]+)', url)
-    if match:
-        file_id = match.group(1)
-        return f"https://lh3.googleusercontent.com/d/{file_id}"
-    match = re.search(r'id=([^&]+)', url)
-    if match:
-        file_id = match.group(1)
-        return f"https://lh3.googleusercontent.com/d/{file_id}"
-    return url
+# Shared with the Django importers; the module itself does not need Django
+from catalog.importing.parsing import clean_price, clean_stock, convert_gdrive_link
 
-def clean_price(price_str):
-    if not price_str:
-        return 0
-    price_str = price_str.replace('\xa0', '').replace(' ', '')
-    digits = re.findall(r'\d+', price_str)
-    if digits:
-        return float(''.join(digits))
-    return 0
-
-def clean_stock(stock_str):
-    try:
-        return int(stock_str)
-    except (ValueError, TypeError):
-        return 0
+SHEET_URL = "https://docs.google.com/spreadsheets/d/1KaysYxaB-0z897sifpycDDC68C1EFPqydp23QheD2lY/export?format=csv"
 
 def extract():
     response = requests.get(SHEET_URL)
@@ -1,26 +1,53 @@
+from django.db import DatabaseError
+from django.db.models import Count
+from django.utils.functional import SimpleLazyObject
+
 from .models import TopBanner
-from catalog.models import SiteSettings, Brand
+from catalog.cache import cached
+from catalog.models import SiteSettings, Brand, Collection
+
+# These run on every rendered page. Values are lazy (nothing happens unless the
+# template touches them) and cached under versioned keys that catalog.signals
+# bumps whenever the underlying models change.
+
+
+def _top_banners():
+    return list(TopBanner.objects.filter(is_active=True))
+
+
+def _site_settings():
+    # Read-only: unlike SiteSettings.load() this never inserts on a cold table
+    return SiteSettings.objects.order_by('pk').first()
+
+
+def _cached_site_settings():
+    try:
+        return cached('site', 'site_settings', _site_settings)
+    except DatabaseError:
+        # Not cached, so the next page reads the settings again
+        return None
+
+
+def _brands():
+    return list(
+        Brand.objects.annotate(product_count=Count('products'))
+        .filter(is_active=True, product_count__gt=0)
+        .order_by('sort_order', 'name')
+    )
+
+
+def _collections():
+    return list(Collection.objects.all().order_by('name'))
+
 
 def top_banner(request):
-    banners = TopBanner.objects.filter(is_active=True)
-    return {'top_banners': banners}
+    return {'top_banners': SimpleLazyObject(lambda: cached('site', 'top_banners', _top_banners))}
 
 def site_settings(request):
-    try:
-        settings = SiteSettings.load()
-    except:
-        settings = None
-    return {'site_settings': settings}
+    return {'site_settings': SimpleLazyObject(_cached_site_settings)}
 
 def all_brands(request):
-    from django.db.models import Count
-    brands = Brand.objects.annotate(product_count=Count('products')).filter(is_active=True, product_count__gt=0).order_by('sort_order', 'name')
-    return {'all_brands': brands}
+    return {'all_brands': SimpleLazyObject(lambda: cached('catalog', 'menu_brands', _brands))}
 
 def all_collections(request):
-    from catalog.models import Collection
-    from django.db.models import Count
-    # Display collections that have at least one product? Or all? User didn't specify, but similar to brands is safer.
-    # But usually collections are curated, so maybe show all. Let's filter by having products to avoid empty pages.
-    collections = Collection.objects.all().order_by('name')
-    return {'all_collections': collections}
+    return {'all_collections': SimpleLazyObject(lambda: cached('catalog', 'menu_collections', _collections))}
@@ -1,3 +1,55 @@
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from catalog.models import Brand, Product, SiteSettings
+from main.models import TopBanner
+from marais.testing import PLAIN_STATIC
+
+
+@PLAIN_STATIC
+class ContextProcessorCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        brand = Brand.objects.create(name='La2L', slug='la2l')
+        Product.objects.create(title='Ring', slug='ring', brand_ref=brand)
+        TopBanner.objects.create(text='Бесплатная доставка')
+
+    def test_warm_static_page_runs_no_queries(self):
+        url = reverse('privacy_policy')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'La2L')
+        self.assertContains(response, 'БЕСПЛАТНАЯ ДОСТАВКА')
+
+    def test_site_settings_are_not_created_by_page_views(self):
+        self.client.get(reverse('privacy_policy'))
+        self.assertFalse(SiteSettings.objects.exists())
+
+    def test_database_errors_are_not_cached(self):
+        from unittest import mock
+
+        from django.db import DatabaseError
+
+        from main.context_processors import _cached_site_settings
+
+        settings = SiteSettings.objects.create()
+        with mock.patch('main.context_processors._site_settings', side_effect=DatabaseError):
+            self.assertIsNone(_cached_site_settings())
+        # The failure was not stored, so the row shows up on the next page
+        self.assertEqual(_cached_site_settings(), settings)
+
+    def test_admin_edits_are_visible_immediately(self):
+        url = reverse('privacy_policy')
+        self.client.get(url)
+
+        brand = Brand.objects.create(name='Marie Laure Chamorel', slug='mlc')
+        Product.objects.create(title='Earrings', slug='earrings', brand_ref=brand)
+        TopBanner.objects.update(is_active=False)
+        TopBanner.objects.create(text='Новая коллекция')
+
+        response = self.client.get(url)
+        self.assertContains(response, 'Marie Laure Chamorel')
+        self.assertContains(response, 'НОВАЯ КОЛЛЕКЦИЯ')
+        self.assertNotContains(response, 'БЕСПЛАТНАЯ ДОСТАВКА')
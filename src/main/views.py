@@ -2,6 +2,7 @@ from django.shortcuts import render
 from django.views import View
 
 from basket.models import Order
+from catalog.derivatives import srcset
 from catalog.models import Brand, Category, HomepageBlock, Review
 
 
@@ -14,7 +15,10 @@ class GeneralPageView(View):
         hero_images_data = []
         if hero_block:
             hero_images = list(hero_block.hero_images.filter(is_active=True).order_by('sort_order', 'id'))
-            hero_images_data = [{'url': img.image.url, 'link_url': img.link_url} for img in hero_images]
+            hero_images_data = [
+                {'url': img.image.url, 'srcset': srcset(img.image.url), 'link_url': img.link_url}
+                for img in hero_images
+            ]
         reviews = Review.objects.filter(status='approved').order_by('-created_at')[:6]
         return render(request, 'main/general.html', {
             'categories': categories,
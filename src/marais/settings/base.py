@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
@@ -35,6 +36,9 @@ INSTALLED_APPS = [
 
 WHATSAPP_NUMBER = "77772555348"  # Number without symbols for API
 
+# How long checkout holds stock for an order awaiting confirmation in WhatsApp
+STOCK_HOLD_HOURS = int(os.getenv('STOCK_HOLD_HOURS', 48))
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -86,6 +90,23 @@ DATABASES = {
     }
 }
 
+# Cache shared by all gunicorn workers. File-based by default so it works without
+# extra services; point CACHE_BACKEND/CACHE_LOCATION at a cache server to share it
+# across hosts, e.g. django.core.cache.backends.redis.RedisCache + redis://redis:6379/1
+# or django.core.cache.backends.memcached.PyMemcacheCache + memcached:11211.
+# Catalog data is invalidated through versioned keys, see catalog/cache.py.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'marais_cache')),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', 600)),
+        'KEY_PREFIX': 'marais',
+    }
+}
+if CACHES['default']['BACKEND'].endswith('FileBasedCache'):
+    # The default of 300 files is culled too eagerly for per-filter catalog pages
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 5000))}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
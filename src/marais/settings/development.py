@@ -28,6 +28,15 @@ CORS_ALLOWED_ORIGINS = CORS_ALLOWED_ORIGINS + [
     'http://localhost:8585',
 ]
 
+# Single-process runserver: keep the cache in memory unless a backend is configured
+if not os.getenv('CACHE_BACKEND'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'KEY_PREFIX': 'marais',
+        }
+    }
+
 # Relaxed security for development
 SECURE_SSL_REDIRECT = False
 
@@ -0,0 +1,8 @@
+"""Helpers shared by the apps' test modules."""
+from django.test import override_settings
+
+# Views render {% static %}; the manifest storage needs collectstatic, so tests use the plain one.
+PLAIN_STATIC = override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
@@ -1,16 +1,26 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from .models import Order, OrderItem, StockReservation
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     raw_id_fields = ['product']
     extra = 0
 
+class StockReservationInline(admin.TabularInline):
+    model = StockReservation
+    fields = ['product', 'size', 'quantity', 'status', 'expires_at']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'total_price', 'status', 'created_at']
     list_filter = ['status', 'created_at']
-    inlines = [OrderItemInline]
+    inlines = [OrderItemInline, StockReservationInline]
     readonly_fields = ['created_at']
 
     def user_info(self, obj):
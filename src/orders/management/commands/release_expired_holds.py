@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from orders.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Release stock holds of orders that were not confirmed in time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every', type=int, default=0,
+            help='Keep running and release expired holds every N seconds',
+        )
+
+    def handle(self, *args, **options):
+        every = options['every']
+        while True:
+            close_old_connections()
+            released = release_expired()
+            self.stdout.write(self.style.SUCCESS(f'Released {released} expired holds.'))
+            if not every:
+                break
+            time.sleep(every)
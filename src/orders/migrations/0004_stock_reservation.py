@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-17 20:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0029_product_size'),
+        ('orders', '0003_alter_order_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(blank=True, default='', max_length=50, verbose_name='Размер')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('status', models.CharField(choices=[('active', 'Активен'), ('consumed', 'Списан'), ('released', 'Снят')], default='active', max_length=10, verbose_name='Статус')),
+                ('expires_at', models.DateTimeField(verbose_name='Действует до')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='orders.order', verbose_name='Заказ')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='catalog.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Резерв',
+                'verbose_name_plural': 'Резервы',
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='orders_hold_expiry_idx'), models.Index(fields=['product', 'status', 'size'], name='orders_hold_product_idx')],
+            },
+        ),
+    ]
@@ -43,3 +43,36 @@ class OrderItem(models.Model):
     def get_cost(self):
         return self.price * self.quantity
 
+
+
+class StockReservation(models.Model):
+    """
+    Units held for an order between checkout and confirmation (see orders.reservations).
+    Active, unexpired holds are subtracted from stock to get the available-to-sell figure.
+    """
+    ACTIVE = 'active'
+    CONSUMED = 'consumed'
+    RELEASED = 'released'
+
+    order = models.ForeignKey(Order, related_name='reservations', on_delete=models.CASCADE, verbose_name="Заказ")
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE, verbose_name="Товар")
+    size = models.CharField("Размер", max_length=50, blank=True, default='')
+    quantity = models.PositiveIntegerField("Количество")
+    status = models.CharField("Статус", max_length=10, default=ACTIVE, choices=[
+        (ACTIVE, 'Активен'),
+        (CONSUMED, 'Списан'),
+        (RELEASED, 'Снят'),
+    ])
+    expires_at = models.DateTimeField("Действует до")
+    created_at = models.DateTimeField("Дата создания", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Резерв"
+        verbose_name_plural = "Резервы"
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='orders_hold_expiry_idx'),
+            models.Index(fields=['product', 'status', 'size'], name='orders_hold_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product} x {self.quantity} ({self.get_status_display()})"
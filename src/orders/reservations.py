@@ -0,0 +1,131 @@
+"""
+Stock holds for orders handed off to WhatsApp.
+
+Checkout does not take stock anymore: it places holds that expire after
+settings.STOCK_HOLD_HOURS. Available-to-sell is stock minus active holds
+(see catalog.stock). Confirming an order (status 'purchased') turns its
+holds into a real stock decrement; cancelling it or letting the holds
+expire simply releases them, so stock itself never has to be restored.
+
+Cached listings filter on available-to-sell, so placing or releasing holds
+bumps the 'stock' cache namespace, but only when it takes a product
+across the in-stock line (see availability_changed).
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from catalog.cache import bump
+from catalog.models import Product
+from catalog.stock import check_stock, take_stock
+from .models import StockReservation
+
+
+def active_holds(now=None):
+    return StockReservation.objects.filter(status=StockReservation.ACTIVE, expires_at__gt=now or timezone.now())
+
+
+def held_quantities(product_ids):
+    """Returns {(product_id, size): held units} for the given products."""
+    rows = (
+        active_holds().filter(product_id__in=product_ids)
+        .order_by().values_list('product_id', 'size').annotate(total=Sum('quantity'))
+    )
+    return Counter({(product_id, size): total for product_id, size, total in rows})
+
+
+def held_expression(product_ref, size_ref=None):
+    """Units held for OuterRef(product_ref) (and size, when given) as a subquery."""
+    holds = active_holds().filter(product_id=OuterRef(product_ref))
+    if size_ref:
+        holds = holds.filter(size=OuterRef(size_ref))
+    total = holds.order_by().values('product_id').annotate(total=Sum('quantity')).values('total')
+    return Coalesce(Subquery(total, output_field=IntegerField()), 0)
+
+
+def availability_changed(changes):
+    """
+    True when the hold changes just made ({product_id: units held, negative
+    when released}) moved some product across the line in_stock_filter
+    draws: stock greater than its active holds.
+    """
+    changes = {product_id: units for product_id, units in changes.items() if units}
+    if not changes:
+        return False
+    held = Counter()
+    for (product_id, _), units in held_quantities(list(changes)).items():
+        held[product_id] += units
+    stock = dict(Product.objects.filter(pk__in=list(changes)).values_list('pk', 'stock'))
+    return any(
+        (stock.get(product_id, 0) > held[product_id]) != (stock.get(product_id, 0) > held[product_id] - units)
+        for product_id, units in changes.items()
+    )
+
+
+def _released(holds):
+    """Marks the given active holds released; bumps 'stock' when a product comes back."""
+    holds = list(holds.values_list('pk', 'product_id', 'quantity'))
+    if not holds:
+        return 0
+    released = StockReservation.objects.filter(
+        pk__in=[pk for pk, _, _ in holds], status=StockReservation.ACTIVE,
+    ).update(status=StockReservation.RELEASED)
+    changes = Counter()
+    for _, product_id, quantity in holds:
+        changes[product_id] -= quantity
+    if released and availability_changed(changes):
+        bump('stock')
+    return released
+
+
+def hold_stock(order, lines):
+    """
+    Holds stock for an order: `lines` is a list of (product_id, size, quantity).
+    Must run inside transaction.atomic(); raises catalog.stock.InsufficientStock
+    when stock minus other holds does not cover every line.
+    """
+    lines = [(product_id, size or '', quantity) for product_id, size, quantity in lines]
+    check_stock(lines)
+    expires_at = timezone.now() + timedelta(hours=settings.STOCK_HOLD_HOURS)
+    StockReservation.objects.bulk_create([
+        StockReservation(order=order, product_id=product_id, size=size, quantity=quantity, expires_at=expires_at)
+        for product_id, size, quantity in lines
+    ])
+    changes = Counter()
+    for product_id, _, quantity in lines:
+        changes[product_id] += quantity
+    if availability_changed(changes):
+        bump('stock')
+
+
+def consume_holds(order):
+    """
+    Order confirmed: decrements stock for its items and closes its holds.
+    Orders without holds (placed before holds existed) already took their stock at checkout.
+    """
+    if not order.reservations.exclude(status=StockReservation.CONSUMED).exists():
+        return
+    with transaction.atomic():
+        take_stock([(item.product_id, item.size, item.quantity) for item in order.items.all() if item.product_id], clamp=True)
+        order.reservations.filter(status=StockReservation.ACTIVE).update(status=StockReservation.CONSUMED)
+
+
+def release_holds(order):
+    """Order cancelled: gives its held units back to the storefront."""
+    return _released(order.reservations.filter(status=StockReservation.ACTIVE))
+
+
+def release_expired(now=None):
+    """
+    Releases every expired hold; returns the number of holds released.
+    Expired holds already stopped counting against stock, but listings
+    cached before that still count them, hence the availability check.
+    """
+    return _released(StockReservation.objects.filter(
+        status=StockReservation.ACTIVE, expires_at__lte=now or timezone.now(),
+    ))
@@ -1,6 +1,7 @@
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
 from .models import Order
+from .reservations import consume_holds, release_holds
 
 @receiver(pre_save, sender=Order)
 def order_status_change_handler(sender, instance, **kwargs):
@@ -19,3 +20,8 @@ def order_status_change_handler(sender, instance, **kwargs):
             instance.user.loyalty_points += instance.bonuses_used
             instance.user.save()
             # Optionally note this somewhere, but simplifying for now
+        release_holds(instance)
+
+    # Confirmed: the held units leave the warehouse
+    if instance.status == 'purchased' and old_order.status != 'purchased':
+        consume_holds(instance)
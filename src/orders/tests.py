@@ -1,3 +1,164 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from basket.cart import add_item
+from basket.models import Cart, CartItem
+from catalog.models import Product
+from catalog.stock import available_quantity
+from marais.testing import PLAIN_STATIC
+from .models import Order, StockReservation
+
+
+@PLAIN_STATIC
+class CheckoutTests(TestCase):
+    def setUp(self):
+        session = self.client.session
+        session.save()
+        self.cart = Cart.objects.create(session_key=session.session_key)
+
+    def add(self, product, quantity, size=''):
+        return CartItem.objects.create(cart=self.cart, product=product, quantity=quantity, size=size, price=product.price)
+
+    def checkout(self):
+        return self.client.get(reverse('orders:checkout'))
+
+    def test_checkout_creates_order_and_holds_stock(self):
+        ring = Product.objects.create(title='Ring', slug='ring', price=1000, size_stock={'17': 2, '18': 1})
+        brooch = Product.objects.create(title='Brooch', slug='brooch', price=500, stock=3)
+        self.add(ring, 2, '17')
+        self.add(brooch, 1)
+
+        response = self.checkout()
+        self.assertTrue(response['Location'].startswith('https://wa.me/'))
+
+        order = Order.objects.get()
+        self.assertEqual(order.status, 'sent')
+        self.assertEqual(order.total_price, 2500)
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(order.reservations.filter(status=StockReservation.ACTIVE).count(), 2)
+        self.assertFalse(self.cart.items.exists())
+
+        # Stock itself waits for confirmation; the held units are just not for sale
+        ring.refresh_from_db()
+        brooch.refresh_from_db()
+        self.assertEqual(ring.stock, 3)
+        self.assertEqual(available_quantity(ring, '17'), 0)
+        self.assertEqual(available_quantity(ring, '18'), 1)
+        self.assertEqual(available_quantity(brooch, ''), 2)
+
+    def test_short_line_rejects_the_whole_order(self):
+        ring = Product.objects.create(title='Ring', slug='ring', price=1000, size_stock={'17': 1})
+        brooch = Product.objects.create(title='Brooch', slug='brooch', price=500, stock=3)
+        self.add(brooch, 1)
+        self.add(ring, 2, '17')
+
+        response = self.checkout()
+        self.assertRedirects(response, reverse('basket:detail'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+        brooch.refresh_from_db()
+        self.assertEqual(brooch.stock, 3)
+        self.assertEqual(self.cart.items.count(), 2)
+
+        response = self.client.get(reverse('basket:detail'))
+        self.assertContains(response, 'Ring (Размер: 17): в наличии 1 шт.')
+
+    def test_held_units_cannot_be_checked_out_twice(self):
+        ring = Product.objects.create(title='Ring', slug='ring', price=1000, size_stock={'17': 1})
+        self.add(ring, 1, '17')
+        self.checkout()
+        self.add(ring, 1, '17')
+        response = self.checkout()
+        self.assertRedirects(response, reverse('basket:detail'), fetch_redirect_response=False)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        def count_queries(lines):
+            self.cart.items.all().delete()
+            for i in range(lines):
+                product = Product.objects.create(title=f'Ring {lines}-{i}', slug=f'ring-{lines}-{i}', price=100, stock=5)
+                self.add(product, 1)
+            with CaptureQueriesContext(connection) as ctx:
+                self.checkout()
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(2), count_queries(10))
+
+
+@PLAIN_STATIC
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.ring = Product.objects.create(title='Ring', slug='ring', price=1000, size_stock={'17': 2})
+        self.order = Order.objects.create(status='sent')
+        self.order.items.create(product=self.ring, quantity=1, price=1000, size='17')
+        self.hold = StockReservation.objects.create(
+            order=self.order, product=self.ring, size='17', quantity=1,
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+
+    def test_confirming_the_order_takes_stock_once(self):
+        self.order.status = 'purchased'
+        self.order.save()
+        self.ring.refresh_from_db()
+        self.assertEqual(self.ring.size_stock, {'17': 1})
+        self.assertEqual(available_quantity(self.ring, '17'), 1)
+        self.hold.refresh_from_db()
+        self.assertEqual(self.hold.status, StockReservation.CONSUMED)
+
+    def test_cancelling_releases_the_hold(self):
+        self.order.status = 'cancelled'
+        self.order.save()
+        self.ring.refresh_from_db()
+        self.assertEqual(self.ring.stock, 2)
+        self.assertEqual(available_quantity(self.ring, '17'), 2)
+
+    def test_expired_holds_are_released_in_bulk(self):
+        for _ in range(3):
+            StockReservation.objects.create(
+                order=self.order, product=self.ring, size='17', quantity=1,
+                expires_at=timezone.now() - timedelta(minutes=1),
+            )
+        # Select, update, then held units and stock of the products involved: not one query per hold
+        with self.assertNumQueries(4):
+            call_command('release_expired_holds', stdout=StringIO())
+        self.assertEqual(StockReservation.objects.filter(status=StockReservation.RELEASED).count(), 3)
+        self.assertEqual(StockReservation.objects.filter(status=StockReservation.ACTIVE).count(), 1)
+
+    def test_stock_cache_is_bumped_only_when_availability_flips(self):
+        from catalog import cache as catalog_cache
+        from .reservations import hold_stock, release_holds
+
+        catalog_version = catalog_cache.version('catalog')
+        stock_version = catalog_cache.version('stock')
+        other = Order.objects.create(status='sent')
+        # 2 in stock, 1 held: holding the last unit takes the ring out of stock
+        hold_stock(other, [(self.ring.pk, '17', 1)])
+        self.assertGreater(catalog_cache.version('stock'), stock_version)
+
+        stock_version = catalog_cache.version('stock')
+        release_holds(self.order)  # one unit comes back: in stock again
+        self.assertGreater(catalog_cache.version('stock'), stock_version)
+
+        stock_version = catalog_cache.version('stock')
+        brooch = Product.objects.create(title='Brooch', slug='brooch', price=500, stock=5)
+        catalog_version = catalog_cache.version('catalog')
+        hold_stock(Order.objects.create(status='sent'), [(brooch.pk, '', 2)])  # 3 left: still in stock
+        self.assertEqual(catalog_cache.version('stock'), stock_version)
+        # Listings, autocomplete and sampling pools keep their catalog version
+        self.assertEqual(catalog_cache.version('catalog'), catalog_version)
+
+    def test_cart_and_catalog_see_available_to_sell(self):
+        cart = Cart.objects.create(session_key='s1')
+        self.assertTrue(add_item(cart, self.ring, '17'))
+        self.assertFalse(add_item(cart, self.ring, '17'))
 
-# Create your tests here.
+        self.hold.quantity = 2
+        self.hold.save()
+        in_stock = self.client.get(reverse('catalog:home'), {'in_stock': '1'}).context['products']
+        self.assertEqual(list(in_stock), [])
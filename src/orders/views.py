@@ -1,12 +1,18 @@
 from decimal import Decimal
 
 from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
 from django.shortcuts import redirect
 from django.utils.http import urlencode
 from django.views import View
 
-from basket.models import Cart
+from basket.models import Cart, remember_cart_quantity
+from catalog.stock import InsufficientStock
 from .models import Order, OrderItem
+from .reservations import hold_stock
 
 class WhatsAppCheckoutView(View):
     def get(self, request):
@@ -19,48 +25,28 @@ class WhatsAppCheckoutView(View):
             session_key = request.session.session_key
             cart = Cart.objects.filter(session_key=session_key).first()
 
-        if not cart or not cart.items.exists():
+        items = list(cart.items.select_related('product')) if cart else []
+        if not items:
             return redirect('basket:detail')
 
-        # Create Order
-        order = Order.objects.create(
-            user=user,
-            session_key=request.session.session_key,
-            total_price=0  # Will update after items
-        )
-
         # Create Items and Message
         message_lines = ["Здравствуйте! Хочу оформить заказ:"]
         total_price = Decimal('0')
+        order_items = []
 
-        for cart_item in cart.items.select_related('product').all():
+        for cart_item in items:
             # Always use the cart item's stored price to mirror cart totals
             item_price = Decimal(cart_item.price)
             cost = item_price * cart_item.quantity
             total_price += cost
-            
-            # Create OrderItem
-            OrderItem.objects.create(
-                order=order,
+
+            order_items.append(OrderItem(
                 product=cart_item.product,
                 quantity=cart_item.quantity,
                 price=item_price,
                 size=cart_item.size
-            )
-
-            # Decrease stock per size if tracked
-            product_obj = cart_item.product
-            if product_obj:
-                size_stock_map = product_obj.size_stock_map
-                if size_stock_map and cart_item.size:
-                    current_qty = size_stock_map.get(cart_item.size, 0)
-                    size_stock_map[cart_item.size] = max(current_qty - cart_item.quantity, 0)
-                    product_obj.size_stock = size_stock_map
-                    product_obj.stock = max(sum(size_stock_map.values()), 0)
-                else:
-                    product_obj.stock = max((product_obj.stock or 0) - cart_item.quantity, 0)
-                product_obj.save()
-            
+            ))
+
             # Add to message
             size_str = f" (Размер: {cart_item.size})" if cart_item.size else ""
             line = f"- {cart_item.product.title}{size_str} x{cart_item.quantity} — {cost} ₸"
@@ -93,19 +79,40 @@ class WhatsAppCheckoutView(View):
         if final_total < 0:
             final_total = Decimal('0')
         
-        # --- Update Order ---
-        order.total_price = total_price.quantize(Decimal('1.'))
-        order.discount_amount = Decimal(discount_amount)
-        order.bonuses_used = bonuses_used
-        order.final_price = final_total
-        order.status = 'sent'
-        order.save()
-        
-        # --- Update User Balance ---
+        try:
+            with transaction.atomic():
+                order = Order.objects.create(
+                    user=user,
+                    session_key=request.session.session_key,
+                    total_price=total_price.quantize(Decimal('1.')),
+                    discount_amount=Decimal(discount_amount),
+                    bonuses_used=bonuses_used,
+                    final_price=final_total,
+                    status='sent',
+                )
+                for order_item in order_items:
+                    order_item.order = order
+                OrderItem.objects.bulk_create(order_items)
+
+                # Locks the product/size rows and holds stock until the order is confirmed;
+                # rejects the whole order if any line is short
+                hold_stock(order, [(item.product_id, item.size, item.quantity) for item in items])
+
+                # --- Update User Balance ---
+                if user and bonuses_used > 0:
+                    get_user_model().objects.filter(pk=user.pk).update(loyalty_points=F('loyalty_points') - bonuses_used)
+
+                # Clear Cart
+                cart.items.all().delete() # Or cart.delete() if you want to remove the cart entirely
+        except InsufficientStock as exc:
+            for product, size, requested, available in exc.shortages:
+                size_str = f" (Размер: {size})" if size else ""
+                messages.error(request, f"{product.title}{size_str}: в наличии {available} шт.")
+            return redirect('basket:detail')
+
         if user and bonuses_used > 0:
-            user.loyalty_points -= bonuses_used
-            user.save()
             request.session['bonuses_to_use'] = 0 # Reset session
+        remember_cart_quantity(request, quantity=0)
 
         # --- Add details to message ---
         if discount_amount > 0:
@@ -116,9 +123,6 @@ class WhatsAppCheckoutView(View):
         message_lines.append(f"\nИтого к оплате: {int(final_total)} ₸")
         message_lines.append("\nПожалуйста, подтвердите заказ.")
         
-        # Clear Cart
-        cart.items.all().delete() # Or cart.delete() if you want to remove the cart entirely
-
         # Redirect to WhatsApp
         message_text = "\n".join(message_lines)
         base_url = f"https://wa.me/{settings.WHATSAPP_NUMBER}"
@@ -200,14 +200,15 @@ document.addEventListener('DOMContentLoaded', function () {
         const swapTo = (nextUrl, nextIndex) => {
           if (isTransitioning) return;
           isTransitioning = true;
+          const nextSrcset = (heroImages[nextIndex] && heroImages[nextIndex].srcset) || '';
+          nextImg.srcset = nextSrcset;
           nextImg.src = nextUrl;
-          nextImg.srcset = `${nextUrl} 1200w, ${nextUrl} 800w, ${nextUrl} 480w`;
           triggerSheen();
           media.classList.add('is-transitioning');
 
           window.setTimeout(() => {
+            mainImg.srcset = nextSrcset;
             mainImg.src = nextUrl;
-            mainImg.srcset = `${nextUrl} 1200w, ${nextUrl} 800w, ${nextUrl} 480w`;
             if (linkEl) {
               linkEl.setAttribute('href', getLinkByIndex(nextIndex));
             }
@@ -454,6 +455,55 @@ document.addEventListener('DOMContentLoaded', function () {
     }
   };
 
+  // Catalog "load more": next cards by cursor (keyset, see CatalogProductsView)
+  const loadMore = document.querySelector('[data-load-more]');
+  const productGrid = document.querySelector('[data-product-grid]');
+  if (loadMore && productGrid) {
+    let loading = false;
+    let observer = null;
+
+    const loadNext = async () => {
+      if (loading || !loadMore.dataset.cursor) return;
+      loading = true;
+      loadMore.disabled = true;
+      try {
+        const url = new URL(loadMore.dataset.url, window.location.origin);
+        url.searchParams.set('cursor', loadMore.dataset.cursor);
+        const res = await fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } });
+        if (!res.ok) throw new Error('Network response was not ok');
+        const data = await res.json();
+        productGrid.insertAdjacentHTML('beforeend', data.html);
+        // Numbered pages no longer match what is on screen
+        document.querySelector('[data-pagination]')?.remove();
+        if (data.next) {
+          loadMore.dataset.cursor = data.next;
+          // Still in view after a short page: observe again to keep loading
+          observer?.unobserve(loadMore);
+          observer?.observe(loadMore);
+        } else {
+          loadMore.dataset.cursor = '';
+          observer?.disconnect();
+          loadMore.parentElement.remove();
+        }
+      } catch (err) {
+        console.error(err);
+      } finally {
+        loading = false;
+        loadMore.disabled = false;
+      }
+    };
+
+    loadMore.addEventListener('click', loadNext);
+
+    // Infinite scroll: load as the button comes near the viewport
+    if ('IntersectionObserver' in window) {
+      observer = new IntersectionObserver((entries) => {
+        if (entries.some(entry => entry.isIntersecting)) loadNext();
+      }, { rootMargin: '600px 0px' });
+      observer.observe(loadMore);
+    }
+  }
+
   // Header Scroll Effect
   const header = document.querySelector('.site-header');
   if (header) {
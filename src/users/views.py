@@ -6,6 +6,9 @@ from django.shortcuts import redirect, render
 from django.urls import reverse
 from django.views import View
 
+from basket.cart import merge_carts
+from basket.models import Cart, remember_cart_quantity
+
 class LoginView(View):
     template_name = 'users/login.html'
 
@@ -30,7 +33,6 @@ class LoginView(View):
             session_key = request.session.session_key
             anon_cart = None
             if session_key:
-                from basket.models import Cart
                 anon_cart = Cart.objects.filter(session_key=session_key, user__isnull=True).first()
 
             login(request, user)
@@ -38,16 +40,9 @@ class LoginView(View):
             # Merge carts after login
             if anon_cart:
                 user_cart, _ = Cart.objects.get_or_create(user=user)
-                for item in anon_cart.items.all():
-                    # Check if item exists in user_cart
-                    existing_item = user_cart.items.filter(product=item.product, size=item.size).first()
-                    if existing_item:
-                        existing_item.quantity += item.quantity
-                        existing_item.save()
-                    else:
-                        item.cart = user_cart
-                        item.save()
-                anon_cart.delete()
+                merge_carts(anon_cart, user_cart)
+
+            remember_cart_quantity(request, Cart.objects.filter(user=user).first())
 
             # Attach anonymous orders to user
             from orders.models import Order
@@ -88,7 +83,6 @@ class RegisterView(View):
         session_key = request.session.session_key
         anon_cart = None
         if session_key:
-            from basket.models import Cart
             anon_cart = Cart.objects.filter(session_key=session_key, user__isnull=True).first()
 
         login(request, user)
@@ -96,16 +90,9 @@ class RegisterView(View):
         # Merge carts after login
         if anon_cart:
             user_cart, _ = Cart.objects.get_or_create(user=user)
-            for item in anon_cart.items.all():
-                # Check if item exists in user_cart
-                existing_item = user_cart.items.filter(product=item.product, size=item.size).first()
-                if existing_item:
-                    existing_item.quantity += item.quantity
-                    existing_item.save()
-                else:
-                    item.cart = user_cart
-                    item.save()
-            anon_cart.delete()
+            merge_carts(anon_cart, user_cart)
+
+        remember_cart_quantity(request, Cart.objects.filter(user=user).first())
 
         return redirect(reverse('catalog:profile'))
 